@@ -1,28 +1,169 @@
+# agent_api.py
+"""Ferramenta de consulta do IPCA acumulado anual (IBGE, agregado 1737).
+
+O IPCA de um ano já encerrado nunca muda, então cada valor buscado é gravado em
+um arquivo local (``IPCA_ARQUIVO``) e servido dali nas consultas seguintes, sem
+tocar a rede. As chamadas ao IBGE usam uma ``requests.Session`` compartilhada
+(pool de conexões, retentativas curtas) com timeouts de conexão e de leitura,
+para que um IBGE lento não trave o nó roteador; a versão assíncrona usa a mesma
+sessão numa thread. ``prefetch_ipca`` busca um intervalo de anos em uma única
+requisição.
+"""
+import asyncio
+import datetime
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable
+
 import requests
 from langchain_core.tools import Tool
 from pydantic import BaseModel, Field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metricas import DURACAO_FERRAMENTA, cronometrar
+
+CURRENT_DIR = Path(__file__).resolve().parent  # Agents-ia/agents
+
+# Aceita vários períodos separados por "|" (ex.: 2021|2022|2023)
+IPCA_URL = "https://servicodados.ibge.gov.br/api/v3/agregados/1737/periodos/{ano}/variaveis/2266?localidades=N1[all]"
+IPCA_CONNECT_TIMEOUT = float(os.getenv("IPCA_CONNECT_TIMEOUT", "3"))  # segundos
+IPCA_TIMEOUT = float(os.getenv("IPCA_TIMEOUT", "10"))  # segundos (leitura)
+IPCA_ARQUIVO = Path(os.getenv("IPCA_ARQUIVO", str(CURRENT_DIR.parent / "cache" / "ipca_anual.json")))
 
 
 class IpcaArgs(BaseModel):
     ano: str = Field(..., description="Ano no formato YYYY, ex: 2023")
 
 
+class ClienteIpca:
+    """Cliente do IBGE com sessão HTTP reutilizada e série anual persistida em disco."""
+
+    def __init__(self, arquivo: Path = IPCA_ARQUIVO, timeout=(IPCA_CONNECT_TIMEOUT, IPCA_TIMEOUT)):
+        self.arquivo = Path(arquivo)
+        self.timeout = timeout
+        self._serie: Dict[str, str] = self._carregar()
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                                  allowed_methods=("GET",))
+                    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=retry))
+                    self._session = session
+        return self._session
+
+    # --- Série local ---
+    def _carregar(self) -> Dict[str, str]:
+        try:
+            return json.loads(self.arquivo.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar(self, valores: Dict[str, str]):
+        """Persiste só anos encerrados: o acumulado do ano corrente ainda muda."""
+        ano_atual = datetime.date.today().year
+        novos = {ano: v for ano, v in valores.items() if int(ano) < ano_atual and _numerico(v)}
+        if not novos:
+            return
+        with self._lock:
+            self._serie.update(novos)
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.arquivo.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._serie, indent=2, sort_keys=True), encoding="utf-8")
+            tmp.replace(self.arquivo)
+
+    # --- Consulta ---
+    def valor(self, ano: str) -> str:
+        """IPCA acumulado do ano (do arquivo local ou, se ausente, do IBGE)."""
+        ano = _validar_ano(ano)
+        if ano in self._serie:
+            return self._serie[ano]
+        return self.prefetch([ano])[ano]
+
+    def prefetch(self, anos: Iterable) -> Dict[str, str]:
+        """Busca de uma vez os anos que ainda não estão no arquivo local."""
+        anos = [_validar_ano(a) for a in anos]
+        faltantes = [a for a in anos if a not in self._serie]
+        valores = {}
+        if faltantes:
+            response = self.session.get(IPCA_URL.format(ano="|".join(faltantes)), timeout=self.timeout)
+            response.raise_for_status()  # Lança um erro para respostas ruins (4xx ou 5xx)
+            valores = _extrair_serie(response.json())
+            self._guardar(valores)
+        return {a: self._serie.get(a, valores.get(a)) for a in anos}
+
+    async def avalor(self, ano: str) -> str:
+        """Versão assíncrona de ``valor``: a requisição usa a sessão compartilhada (pool e retentativas) numa thread."""
+        ano = _validar_ano(ano)
+        if ano in self._serie:
+            return self._serie[ano]
+        return await asyncio.to_thread(self.valor, ano)
+
+
+def _validar_ano(ano) -> str:
+    ano = str(ano).strip()
+    if not re.fullmatch(r"\d{4}", ano):
+        raise ValueError(f"ano inválido: '{ano}' (use o formato YYYY)")
+    return ano
+
+
+def _numerico(valor) -> bool:
+    # O IBGE usa "...", "-" ou "X" para valores indisponíveis
+    try:
+        float(valor)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _extrair_serie(data) -> Dict[str, str]:
+    return dict(data[0]['resultados'][0]['series'][0]['serie'])
+
+
+def _formatar(ano: str, resultado) -> str:
+    if not _numerico(resultado):
+        raise ValueError("valor ainda não divulgado pelo IBGE")
+    return f"O IPCA acumulado para o ano de {ano} foi de {resultado}%."
+
+
+# Instância compartilhada pelo processo
+cliente_ipca = ClienteIpca()
+
+
+def prefetch_ipca(ano_inicial: int, ano_final: int) -> Dict[str, str]:
+    """Pré-carrega no arquivo local o IPCA de um intervalo de anos (inclusive)."""
+    return cliente_ipca.prefetch(range(int(ano_inicial), int(ano_final) + 1))
+
+
 def buscar_dados_ipca(ano: str) -> str:
     """Busca o acumulado do IPCA (inflação) para um ano específico na API do IBGE."""
     try:
-        url = f"https://servicodados.ibge.gov.br/api/v3/agregados/1737/periodos/{ano}/variaveis/2266?localidades=N1[all]"
-        response = requests.get(url)
-        response.raise_for_status()  # Lança um erro para respostas ruins (4xx ou 5xx)
-        data = response.json()
-        resultado = data[0]['resultados'][0]['series'][0]['serie'][ano]
-        return f"O IPCA acumulado para o ano de {ano} foi de {resultado}%."
+        return _formatar(ano, cliente_ipca.valor(ano))
+    except Exception as e:
+        return f"Não foi possível buscar os dados para o ano {ano}. Erro: {e}"
+
+
+async def abuscar_dados_ipca(ano: str) -> str:
+    """Versão assíncrona de ``buscar_dados_ipca`` (não bloqueia o event loop)."""
+    try:
+        return _formatar(ano, await cliente_ipca.avalor(ano))
     except Exception as e:
         return f"Não foi possível buscar os dados para o ano {ano}. Erro: {e}"
 
 
 ferramenta_api_ipca = Tool.from_function(
     name="consultor_inflacao_ipca",
-    func=buscar_dados_ipca,
+    func=cronometrar(DURACAO_FERRAMENTA, ferramenta="consultor_inflacao_ipca")(buscar_dados_ipca),
+    coroutine=cronometrar(DURACAO_FERRAMENTA, ferramenta="consultor_inflacao_ipca")(abuscar_dados_ipca),
     description=(
         "Use esta ferramenta para obter o valor acumulado do IPCA (Índice de Preços ao Consumidor Amplo) "
         "para um determinado ano (YYYY)."
@@ -1,20 +1,25 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client.http.models import Distance, VectorParams, SparseVectorParams
-from qdrant_client import QdrantClient, models
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.tools import Tool
-from langchain_qdrant import QdrantVectorStore, FastEmbedSparse, RetrievalMode
 from pathlib import Path
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
+import asyncio
 import os
 import sys
+import threading
+import time
+from typing import List
+
+from metricas import DURACAO_FERRAMENTA, cronometrar
+from rag_cache import cache_recuperacao, registrar_nova_versao, versao_colecao
+from rag_embeddings import ServicoEmbeddings, EmbeddingDensoServico, criar_adaptador_esparso
+from indice_local import IndiceLocal
+from ingestao import Checkpoint, DestinoQdrant, ingerir, iterar_pdfs, iterar_trechos
 
 # --- AJUSTE 1: Chamar load_dotenv() no início ---
 load_dotenv()
 
-# LangChain, Qdrant e HuggingFace
+# LangChain, Qdrant e HuggingFace são importados sob demanda (ver _carregar_embeddings e
+# obter_retriever): importar este módulo não carrega modelos nem abre conexões.
 
 
 # --- 1. CONFIGURAÇÃO CONSISTENTE ---
@@ -28,125 +33,325 @@ BASE_AGENTS_DIR = CURRENT_DIR.parent  # Agents-ia
 
 # Configuração do Qdrant, PDF, e credenciais do .env
 RAG_COLLECTION_NAME = "documentos_marketing"
-PDF_PATH_PARA_INGESTAO = str(BASE_AGENTS_DIR / "documentos_marketing" / "livro.pdf")
+DOCUMENTOS_DIR = BASE_AGENTS_DIR / "documentos_marketing"  # todos os PDFs são ingeridos
+PDF_PATH_PARA_INGESTAO = str(DOCUMENTOS_DIR / "livro.pdf")
+INGESTAO_CHECKPOINT = DOCUMENTOS_DIR / ".ingestao_checkpoint.json"
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Intervalo antes de tentar conectar de novo após uma falha de inicialização
+RAG_RETRY_SEGUNDOS = 60
+# Índice vetorial local: usado sem credenciais do Qdrant e como reserva se ele falhar
+RAG_INDICE_LOCAL_DIR = Path(os.getenv(
+    "RAG_INDICE_LOCAL_DIR", str(BASE_AGENTS_DIR / "documentos_marketing" / "indice_local")))
 
 
-# --- 2. LÓGICA DE INGESTÃO DE DADOS ---
-def executar_ingestao():
-    """Cria a coleção no Qdrant Cloud e a popula com os dados do PDF."""
-    print("--- INICIANDO PROCESSO DE INGESTÃO DE DADOS NA NUVEM ---")
+# --- 1.1 INICIALIZAÇÃO SOB DEMANDA ---
+_lock_rag = threading.Lock()
+_embeddings = None
+_retriever = None
+_falha_em = None
+_indice_local = (None, None)  # (versão da coleção, IndiceLocal)
+
+
+def _carregar_embeddings():
+    """Carrega (uma única vez) os modelos de embedding denso e esparso, já envolvidos pelo serviço de consultas."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock_rag:
+            if _embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                from langchain_qdrant import FastEmbedSparse
+
+                print(
+                    f"Carregando modelo de embedding '{MODELO_EMBEDDING}'... Pode demorar na primeira vez.")
+                # Consultas passam pelo serviço de embeddings (memoização + micro-lotes)
+                servico = ServicoEmbeddings(
+                    HuggingFaceEmbeddings(model_name=MODELO_EMBEDDING),
+                    FastEmbedSparse(model_name="Qdrant/bm25"),
+                )
+                _embeddings = (EmbeddingDensoServico(servico), criar_adaptador_esparso(servico))
+    return _embeddings
+
+
+def vetorizar_consultas(textos: List[str]) -> List[List[float]]:
+    """Embeddings densos de textos curtos (consultas) com o modelo do RAG."""
+    dense_embeddings, _ = _carregar_embeddings()
+    if len(textos) == 1:
+        return [dense_embeddings.embed_query(textos[0])]
+    return dense_embeddings.embed_documents(textos)
 
+
+def obter_indice_local():
+    """Retorna o índice local, (re)carregado quando a versão da coleção muda; None se não existir."""
+    global _indice_local
+    versao = versao_colecao()
+    carregada, indice = _indice_local
+    if indice is not None and carregada == versao:
+        return indice
+    if not IndiceLocal.existe(RAG_INDICE_LOCAL_DIR):
+        return None
+    dense_embeddings, sparse_embeddings = _carregar_embeddings()
+    with _lock_rag:
+        carregada, indice = _indice_local
+        if indice is None or carregada != versao:
+            indice = IndiceLocal(RAG_INDICE_LOCAL_DIR, dense_embeddings, sparse_embeddings)
+            _indice_local = (versao, indice)
+            print(f"✅ Índice RAG local carregado ({len(indice.documentos)} trechos).")
+    return indice
+
+
+def obter_retriever():
+    """Retorna o retriever de consulta, criado no primeiro uso (thread-safe).
+
+    Usa o Qdrant Cloud quando há credenciais; sem elas, ou se a conexão falhar, usa
+    o índice local (se já tiver sido construído). Retorna None se nada estiver
+    disponível; após uma falha do Qdrant, nova tentativa só após ``RAG_RETRY_SEGUNDOS``.
+    """
+    global _retriever, _falha_em
+    if _retriever is not None:
+        return _retriever
     if not QDRANT_URL or not QDRANT_API_KEY:
-        print("❌ ERRO: Variáveis de ambiente QDRANT_URL ou QDRANT_API_KEY não encontradas.")
-        print("   Verifique seu arquivo .env.")
-        return
+        indice = obter_indice_local()
+        if indice is None and _falha_em is None:
+            _falha_em = time.monotonic()
+            print("⚠️ AVISO: Credenciais do Qdrant Cloud não encontradas no .env e não há índice local.")
+        return indice
+    if _falha_em is not None and time.monotonic() - _falha_em < RAG_RETRY_SEGUNDOS:
+        return obter_indice_local()
+
+    dense_embeddings_query, sparse_embeddings_query = _carregar_embeddings()
+    with _lock_rag:
+        if _retriever is not None:
+            return _retriever
+        try:
+            from qdrant_client import QdrantClient
+            from langchain_qdrant import QdrantVectorStore, RetrievalMode
+
+            client_query = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+            # --- AJUSTE 2: Usar o mesmo modelo de embedding da ingestão ---
+            _retriever = QdrantVectorStore(
+                client=client_query,
+                collection_name=RAG_COLLECTION_NAME,
+                embedding=dense_embeddings_query,
+                sparse_embedding=sparse_embeddings_query,
+                retrieval_mode=RetrievalMode.HYBRID,
+                vector_name="dense",
+                sparse_vector_name="sparse"
+            )
+            _falha_em = None
+            print("✅ Conectado ao banco de dados RAG na nuvem.")
+        except Exception as e:
+            _falha_em = time.monotonic()
+            print(
+                f"⚠️ AVISO: Não foi possível conectar ao banco RAG na nuvem. Erro: {e}")
+    return _retriever or obter_indice_local()
+
+
+def aquecer_rag(em_segundo_plano: bool = False):
+    """Hook opcional de warm-up: carrega os modelos e conecta ao Qdrant antes da primeira pesquisa."""
+    if em_segundo_plano:
+        threading.Thread(target=obter_retriever, name="rag-warmup", daemon=True).start()
+        return None
+    return obter_retriever()
+
+
+# --- 2. LÓGICA DE INGESTÃO DE DADOS ---
+def executar_ingestao(caminhos=None, local: bool = False, recriar: bool = False):
+    """Ingere os PDFs (arquivos ou diretórios) na coleção do Qdrant Cloud de forma incremental.
+
+    Só trechos novos ou alterados recebem embeddings; arquivos sem mudança desde o
+    último checkpoint são pulados e a coleção segue disponível durante o processo.
+    ``recriar=True`` apaga a coleção antes (comportamento antigo). Sem credenciais do
+    Qdrant (ou com ``local=True``) constrói o índice local.
+    """
+    caminhos = list(caminhos or [DOCUMENTOS_DIR])
+    if local or not QDRANT_URL or not QDRANT_API_KEY:
+        if not local:
+            print("⚠️ AVISO: QDRANT_URL/QDRANT_API_KEY não encontradas; usando o índice local.")
+        return executar_ingestao_local(caminhos)
+
+    print("--- INICIANDO PROCESSO DE INGESTÃO DE DADOS NA NUVEM ---")
 
     try:
-        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+        from qdrant_client import QdrantClient, models
+        from qdrant_client.http.models import Distance, VectorParams, SparseVectorParams
+        from langchain_qdrant import QdrantVectorStore, RetrievalMode
 
-        print(
-            f"Carregando modelo de embedding '{MODELO_EMBEDDING}'... Pode demorar na primeira vez.")
-        dense_embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDING)
-        sparse_embeddings = FastEmbedSparse(model_name="Qdrant/bm25")
+        client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
-        print(f"Criando/Recriando a coleção: '{RAG_COLLECTION_NAME}'")
-        client.recreate_collection(
-            collection_name=RAG_COLLECTION_NAME,
-            vectors_config={"dense": VectorParams(
-                size=TAMANHO_VETOR, distance=Distance.COSINE)},
-            sparse_vectors_config={"sparse": SparseVectorParams(
-                index=models.SparseIndexParams(on_disk=False))},
-        )
+        dense_embeddings, sparse_embeddings = _carregar_embeddings()
 
-        print(f"Carregando PDF de: '{PDF_PATH_PARA_INGESTAO}'")
-        loader = PyPDFLoader(PDF_PATH_PARA_INGESTAO, extract_images=False)
-        documents = loader.load_and_split(
-            text_splitter=RecursiveCharacterTextSplitter(
-                chunk_size=1000, chunk_overlap=200)
-        )
-        print(f"PDF dividido em {len(documents)} trechos.")
+        if recriar and client.collection_exists(RAG_COLLECTION_NAME):
+            print(f"Apagando a coleção: '{RAG_COLLECTION_NAME}'")
+            client.delete_collection(RAG_COLLECTION_NAME)
+            INGESTAO_CHECKPOINT.unlink(missing_ok=True)
+        if not client.collection_exists(RAG_COLLECTION_NAME):
+            print(f"Criando a coleção: '{RAG_COLLECTION_NAME}'")
+            client.create_collection(
+                collection_name=RAG_COLLECTION_NAME,
+                vectors_config={"dense": VectorParams(
+                    size=TAMANHO_VETOR, distance=Distance.COSINE)},
+                sparse_vectors_config={"sparse": SparseVectorParams(
+                    index=models.SparseIndexParams(on_disk=False), modifier=models.Modifier.IDF)},
+            )
+        else:
+            # O Qdrant/bm25 gera só a frequência dos termos; o IDF é aplicado pela coleção
+            # (como no índice local). Coleções antigas, criadas sem ele, são atualizadas.
+            esparso = client.get_collection(RAG_COLLECTION_NAME).config.params.sparse_vectors or {}
+            if "sparse" in esparso and esparso["sparse"].modifier != models.Modifier.IDF:
+                print(f"Ativando o IDF dos vetores esparsos da coleção '{RAG_COLLECTION_NAME}'")
+                client.update_collection(RAG_COLLECTION_NAME, sparse_vectors_config={
+                    "sparse": SparseVectorParams(modifier=models.Modifier.IDF)})
 
-        print("Iniciando a adição de documentos ao Qdrant Cloud...")
-        QdrantVectorStore.from_documents(
-            documents,
+        store = QdrantVectorStore(
+            client=client,
+            collection_name=RAG_COLLECTION_NAME,
             embedding=dense_embeddings,
             sparse_embedding=sparse_embeddings,
-            url=QDRANT_URL,
-            api_key=QDRANT_API_KEY,
-            collection_name=RAG_COLLECTION_NAME,
+            retrieval_mode=RetrievalMode.HYBRID,
             vector_name="dense",
             sparse_vector_name="sparse"
         )
+        stats = ingerir(caminhos, DestinoQdrant(store), Checkpoint(INGESTAO_CHECKPOINT))
+        print(f"Arquivos ingeridos: {stats['arquivos']} (sem alterações: {stats['pulados']}); "
+              f"trechos: {stats['trechos']}, novos/alterados: {stats['inseridos']}.")
+        if stats["arquivos"]:
+            # Invalida os resultados de pesquisa cacheados para a versão anterior da coleção
+            registrar_nova_versao()
         print("--- ✅ INGESTÃO NA NUVEM CONCLUÍDA COM SUCESSO! ---")
 
-    except FileNotFoundError:
+    except FileNotFoundError as e:
         print(
-            f"\n--- ❌ ERRO: Arquivo PDF não encontrado! Verifique o caminho: '{PDF_PATH_PARA_INGESTAO}'")
+            f"\n--- ❌ ERRO: Arquivo PDF não encontrado! Verifique o caminho: '{e.filename}'")
     except Exception as e:
-        print(f"\n--- ❌ ERRO DURANTE A INGESTÃO: {e}")
-
+        print(f"\n--- ❌ ERRO DURANTE A INGESTÃO (execute novamente para retomar): {e}")
 
-# --- 3. LÓGICA DE PESQUISA (PARA USO EM TEMPO REAL) ---
-try:
-    if QDRANT_URL and QDRANT_API_KEY:
-        client_query = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-
-        # --- AJUSTE 2: Usar o mesmo modelo de embedding da ingestão ---
-        dense_embeddings_query = HuggingFaceEmbeddings(
-            model_name=MODELO_EMBEDDING)
-        sparse_embeddings_query = FastEmbedSparse(model_name="Qdrant/bm25")
 
-        qdrant_retriever = QdrantVectorStore(
-            client=client_query,
-            collection_name=RAG_COLLECTION_NAME,
-            embedding=dense_embeddings_query,
-            sparse_embedding=sparse_embeddings_query,
-            retrieval_mode=RetrievalMode.HYBRID,
-            vector_name="dense",
-            sparse_vector_name="sparse"
+def executar_ingestao_local(caminhos=None, diretorio: Path = RAG_INDICE_LOCAL_DIR):
+    """Constrói o índice vetorial local (denso + BM25) em disco a partir dos PDFs."""
+    print(f"--- INICIANDO INGESTÃO NO ÍNDICE LOCAL ({diretorio}) ---")
+    try:
+        dense_embeddings, sparse_embeddings = _carregar_embeddings()
+        textos, metadados = [], []
+        for arquivo in iterar_pdfs(caminhos or [DOCUMENTOS_DIR]):
+            print(f"Carregando PDF de: '{arquivo}'")
+            for _, texto, meta in iterar_trechos(arquivo):
+                textos.append(texto)
+                metadados.append(meta)
+        if not textos:
+            print("⚠️ Nenhum trecho encontrado nos PDFs; o índice local ficará vazio.")
+        total = IndiceLocal.salvar(
+            diretorio,
+            textos,
+            metadados,
+            dense_embeddings.embed_documents(textos),
+            sparse_embeddings.embed_documents(textos),
         )
-        print("✅ Conectado ao banco de dados RAG na nuvem.")
-    else:
-        qdrant_retriever = None
-        print("⚠️ AVISO: Credenciais do Qdrant Cloud não encontradas no .env.")
-
-except Exception as e:
-    qdrant_retriever = None
-    print(
-        f"⚠️ AVISO: Não foi possível conectar ao banco RAG na nuvem. Erro: {e}")
+        registrar_nova_versao()
+        print(f"--- ✅ ÍNDICE LOCAL CONCLUÍDO: {total} trechos. ---")
+    except FileNotFoundError as e:
+        print(
+            f"\n--- ❌ ERRO: Arquivo PDF não encontrado! Verifique o caminho: '{e.filename}'")
+    except Exception as e:
+        print(f"\n--- ❌ ERRO DURANTE A INGESTÃO LOCAL: {e}")
 
 
+# --- 3. LÓGICA DE PESQUISA (PARA USO EM TEMPO REAL) ---
 # --- O RESTO DO SCRIPT (4 e 5) ESTÁ CORRETO ---
 class PesquisaArgs(BaseModel):
     query: str = Field(..., description="Consulta de pesquisa para a base RAG")
 
 
+def _formatar_resultado(query: str, trechos: List[str]) -> str:
+    if not trechos:
+        return "Nenhuma informação relevante foi encontrada."
+    contexto = "\n\n---\n\n".join(trechos)
+    return f"De acordo com a base de conhecimento, aqui estão os trechos mais relevantes sobre '{query}':\n\n{contexto}"
+
+
+def _buscar_trechos(qdrant_retriever, query: str) -> List[str]:
+    """Busca no cache (exato e, se habilitado, por similaridade) antes de consultar o Qdrant (ou o índice local)."""
+    trechos = cache_recuperacao.obter(query)
+    if trechos is not None:
+        return trechos
+    vetor = None
+    if cache_recuperacao.usa_similaridade:
+        vetor = _carregar_embeddings()[0].embed_query(query)
+        trechos = cache_recuperacao.obter_similar(vetor)
+        if trechos is not None:
+            return trechos
+    found_docs = qdrant_retriever.similarity_search(query, k=3)
+    trechos = [doc.page_content for doc in found_docs]
+    cache_recuperacao.guardar(query, trechos, vetor)
+    return trechos
+
+
+async def _abuscar_trechos(qdrant_retriever, query: str) -> List[str]:
+    trechos = cache_recuperacao.obter(query)
+    if trechos is not None:
+        return trechos
+    vetor = None
+    if cache_recuperacao.usa_similaridade:
+        vetor = await asyncio.to_thread(_carregar_embeddings()[0].embed_query, query)
+        trechos = cache_recuperacao.obter_similar(vetor)
+        if trechos is not None:
+            return trechos
+    found_docs = await qdrant_retriever.asimilarity_search(query, k=3)
+    trechos = [doc.page_content for doc in found_docs]
+    cache_recuperacao.guardar(query, trechos, vetor)
+    return trechos
+
+
 def pesquisar_conteudo(query: str) -> str:
     """Pesquisa na base de conhecimento e retorna os trechos mais relevantes."""
+    qdrant_retriever = obter_retriever()
     if not qdrant_retriever:
         return "Erro: A ferramenta de pesquisa não está disponível."
-    found_docs = qdrant_retriever.similarity_search(query, k=3)
-    if not found_docs:
-        return "Nenhuma informação relevante foi encontrada."
-    contexto = "\n\n---\n\n".join([doc.page_content for doc in found_docs])
-    return f"De acordo com a base de conhecimento, aqui estão os trechos mais relevantes sobre '{query}':\n\n{contexto}"
+    try:
+        trechos = _buscar_trechos(qdrant_retriever, query)
+    except Exception as e:
+        # Qdrant indisponível no meio da operação: tenta o índice local
+        indice = obter_indice_local()
+        if indice is None or indice is qdrant_retriever:
+            raise
+        print(f"⚠️ AVISO: Falha na busca do Qdrant ({e}); usando o índice local.")
+        trechos = _buscar_trechos(indice, query)
+    return _formatar_resultado(query, trechos)
+
+
+async def apesquisar_conteudo(query: str) -> str:
+    """Versão assíncrona de ``pesquisar_conteudo``."""
+    # A primeira chamada carrega modelos e conecta: faz isso fora do event loop
+    qdrant_retriever = await asyncio.to_thread(obter_retriever)
+    if not qdrant_retriever:
+        return "Erro: A ferramenta de pesquisa não está disponível."
+    try:
+        trechos = await _abuscar_trechos(qdrant_retriever, query)
+    except Exception as e:
+        indice = await asyncio.to_thread(obter_indice_local)
+        if indice is None or indice is qdrant_retriever:
+            raise
+        print(f"⚠️ AVISO: Falha na busca do Qdrant ({e}); usando o índice local.")
+        trechos = await _abuscar_trechos(indice, query)
+    return _formatar_resultado(query, trechos)
 
 
 ferramenta_pesquisa = Tool.from_function(
     name="ferramenta_pesquisa",
-    func=pesquisar_conteudo,
+    func=cronometrar(DURACAO_FERRAMENTA, ferramenta="ferramenta_pesquisa")(pesquisar_conteudo),
+    coroutine=cronometrar(DURACAO_FERRAMENTA, ferramenta="ferramenta_pesquisa")(apesquisar_conteudo),
     description="Use para pesquisar em uma base de conhecimento especializada sobre estratégias de marketing e vendas.",
     args_schema=PesquisaArgs,
 )
 
 if __name__ == "__main__":
     if "--ingest" in sys.argv:
-        executar_ingestao()
+        # Uso: python agent_rag.py --ingest [--local] [--recriar] [arquivo.pdf|diretorio ...]
+        caminhos = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        executar_ingestao(caminhos or None, local="--local" in sys.argv, recriar="--recriar" in sys.argv)
     else:
         print("\n--- MODO DE TESTE DE PESQUISA ---")
-        if qdrant_retriever:
+        if obter_retriever():
             while True:
                 query_teste = input(
                     "\nDigite sua pergunta para testar (ou 'sair'): ")
@@ -1,3 +1,8 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from types import SimpleNamespace
 from typing import Any, Dict, List
 
@@ -8,15 +13,49 @@ except ImportError:  # fallback
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from tools_registry import todas_as_ferramentas
+from agent_rag import vetorizar_consultas
+from classificador_intencao import PLANILHA, ClassificadorIntencao
 from langchain_groq import ChatGroq
+from metricas import contador_tokens
+from cache_llm import cache_llm
+
+# Execução das ferramentas: em paralelo, com limite de concorrência e timeout por ferramenta
+MAX_FERRAMENTAS_PARALELAS = 4
+# Threads do pool compartilhado pelas requisições síncronas (todas as requisições do processo)
+POOL_FERRAMENTAS = int(os.getenv("POOL_FERRAMENTAS", "16"))
+TIMEOUT_PADRAO_FERRAMENTA = 30  # segundos
+TIMEOUTS_FERRAMENTAS = {
+    "ferramenta_pesquisa": 20,
+    "consultor_inflacao_ipca": 15,
+    "Analisador_de_Planilhas": 90,
+}
+# Anexada à consulta enviada ao LLM quando há planilha (a entrada vem de payload["planilha"])
+INSTRUCAO_PLANILHA = "\n\nAdicionalmente, use a ferramenta Analisador_de_Planilhas com a seguinte entrada: '{}'"
+
+# Pool compartilhado pelo processo (uma ferramenta que estoura o timeout continua ocupando
+# sua thread até terminar, mas o roteador não espera por ela). O prazo de cada ferramenta conta
+# a partir do momento em que ela começa a rodar; a espera na fila tem o mesmo limite, à parte.
+_pool_ferramentas = ThreadPoolExecutor(max_workers=POOL_FERRAMENTAS, thread_name_prefix="ferramenta")
 
 
 class SimpleAgentExecutor:
-    """Executor simples que chama o agente para decidir a ferramenta e executa a tool, retornando intermediate_steps."""
+    """Executor simples que decide as ferramentas (localmente ou via agente) e as executa em paralelo, retornando intermediate_steps.
 
-    def __init__(self, agent, tools):
+    O payload traz ``input`` (texto do usuário) e, opcionalmente, ``planilha`` (entrada
+    ``caminho;pergunta`` já validada). O Analisador de Planilhas só recebe essa entrada,
+    mesmo que o LLM proponha outra. Com ``classificador``, o agente (LLM) só é chamado
+    quando a decisão local é ambígua."""
+
+    def __init__(self, agent, tools, max_concorrencia: int = MAX_FERRAMENTAS_PARALELAS, timeouts: Dict[str, float] | None = None,
+                 classificador: ClassificadorIntencao | None = None):
         self.agent = agent
+        self.classificador = classificador
         self.tools = {t.name: t for t in tools}
+        self.max_concorrencia = max_concorrencia
+        self.timeouts = {**TIMEOUTS_FERRAMENTAS, **(timeouts or {})}
+
+    def _timeout(self, name: str) -> float:
+        return self.timeouts.get(name, TIMEOUT_PADRAO_FERRAMENTA)
 
     def _extract_tool_calls(self, ai_msg) -> List[Dict[str, Any]]:
         calls = getattr(ai_msg, "tool_calls", None)
@@ -24,43 +63,147 @@ class SimpleAgentExecutor:
             return calls
         return ai_msg.additional_kwargs.get("tool_calls", []) if hasattr(ai_msg, "additional_kwargs") else []
 
-    def invoke(self, payload: Dict[str, Any]):
+    @staticmethod
+    def _montar_inputs(payload: Dict[str, Any]) -> Dict[str, Any]:
         # Garantir que o prompt receba todas as variáveis esperadas
-        inputs = {
-            "input": payload.get("input", ""),
+        entrada = payload.get("input", "")
+        if payload.get("planilha"):
+            entrada += INSTRUCAO_PLANILHA.format(payload["planilha"])
+        return {
+            "input": entrada,
             "agent_scratchpad": payload.get("agent_scratchpad", []),
         }
-        ai_msg = self.agent.invoke(inputs)
-        tool_calls = self._extract_tool_calls(ai_msg)
-        steps = []
-        for call in tool_calls:
-            name = getattr(call, "name", None) or (call.get("name") if isinstance(call, dict) else None)
-            args = getattr(call, "args", None) or (call.get("args") if isinstance(call, dict) else None) or {}
-            if isinstance(args, dict) and len(args) == 1:
-                arg_val = next(iter(args.values()))
-            elif isinstance(args, dict) and "input" in args:
-                arg_val = args["input"]
+
+    @staticmethod
+    def _argumentos(call) -> tuple:
+        name = getattr(call, "name", None) or (call.get("name") if isinstance(call, dict) else None)
+        args = getattr(call, "args", None) or (call.get("args") if isinstance(call, dict) else None) or {}
+        if isinstance(args, dict) and len(args) == 1:
+            arg_val = next(iter(args.values()))
+        elif isinstance(args, dict) and "input" in args:
+            arg_val = args["input"]
+        else:
+            arg_val = args if isinstance(args, str) else str(args)
+        return name, arg_val
+
+    def _executar(self, name: str, arg_val, inicio: Dict[str, float] | None = None,
+                  iniciada: threading.Event | None = None) -> str:
+        if iniciada is not None:
+            inicio["t"] = time.monotonic()
+            iniciada.set()
+        try:
+            return self.tools[name].func(arg_val)
+        except Exception as e:
+            return f"Erro ao executar a ferramenta '{name}': {e}"
+
+    def _aguardar(self, name: str, futuro, inicio: Dict[str, float], iniciada: threading.Event) -> str:
+        """Resultado da ferramenta, com o prazo contado do início da execução (não do ``submit``)."""
+        timeout = self._timeout(name)
+        if not iniciada.wait(timeout=timeout):
+            # Ainda na fila do pool: cancela se não tiver começado nesse meio-tempo
+            if futuro.cancel():
+                return f"Erro: a ferramenta '{name}' não iniciou em {timeout}s (pool de ferramentas ocupado)."
+            iniciada.wait()
+        restante = max(0.0, inicio["t"] + timeout - time.monotonic())
+        try:
+            return futuro.result(timeout=restante)
+        except FuturesTimeoutError:
+            return f"Erro: a ferramenta '{name}' excedeu o tempo limite de {timeout}s."
+
+    async def _aexecutar(self, name: str, arg_val, semaforo: asyncio.Semaphore) -> str:
+        tool = self.tools[name]
+        async with semaforo:
+            try:
+                if getattr(tool, "coroutine", None):
+                    coro = tool.coroutine(arg_val)
+                else:
+                    coro = asyncio.to_thread(tool.func, arg_val)
+                return await asyncio.wait_for(coro, timeout=self._timeout(name))
+            except asyncio.TimeoutError:
+                return f"Erro: a ferramenta '{name}' excedeu o tempo limite de {self._timeout(name)}s."
+            except Exception as e:
+                return f"Erro ao executar a ferramenta '{name}': {e}"
+
+    def _chamadas_do_agente(self, payload: Dict[str, Any], ai_msg) -> List[tuple]:
+        """Chamadas propostas pelo LLM; o caminho da planilha é sempre o do payload (ou a chamada sai)."""
+        chamadas = []
+        for name, arg_val in (self._argumentos(call) for call in self._extract_tool_calls(ai_msg)):
+            if name == PLANILHA:
+                if not payload.get("planilha"):
+                    continue
+                arg_val = payload["planilha"]
+            chamadas.append((name, arg_val))
+        return chamadas
+
+    def _decidir(self, payload: Dict[str, Any]):
+        """Retorna (chamadas, mensagem do agente); a mensagem é None quando a decisão foi local."""
+        if self.classificador is not None:
+            chamadas = self.classificador.classificar(payload.get("input", ""), payload.get("planilha"))
+            if chamadas is not None:
+                return chamadas, None
+        ai_msg = self.agent.invoke(self._montar_inputs(payload))
+        chamadas = self._chamadas_do_agente(payload, ai_msg)
+        if self.classificador is not None:
+            self.classificador.registrar(payload.get("input", ""), [name for name, _ in chamadas])
+        return chamadas, ai_msg
+
+    async def _adecidir(self, payload: Dict[str, Any]):
+        consulta, planilha = payload.get("input", ""), payload.get("planilha")
+        if self.classificador is not None:
+            if self.classificador.usa_knn:
+                # O kNN calcula embeddings: fora do event loop
+                chamadas = await asyncio.to_thread(self.classificador.classificar, consulta, planilha)
             else:
-                arg_val = args if isinstance(args, str) else str(args)
+                chamadas = self.classificador.classificar(consulta, planilha)
+            if chamadas is not None:
+                return chamadas, None
+        ai_msg = await self.agent.ainvoke(self._montar_inputs(payload))
+        chamadas = self._chamadas_do_agente(payload, ai_msg)
+        if self.classificador is not None and self.classificador.usa_knn:
+            # Grava no arquivo de decisões: fora do event loop
+            await asyncio.to_thread(self.classificador.registrar, consulta, [name for name, _ in chamadas])
+        return chamadas, ai_msg
+
+    def invoke(self, payload: Dict[str, Any]):
+        chamadas, ai_msg = self._decidir(payload)
 
-            tool = self.tools.get(name)
-            if not tool:
+        # Dispara todas as ferramentas de uma vez; cada uma tem seu próprio prazo
+        execucoes = []
+        for name, arg_val in chamadas:
+            if name not in self.tools:
+                execucoes.append(None)
+                continue
+            inicio, iniciada = {}, threading.Event()
+            execucoes.append((_pool_ferramentas.submit(self._executar, name, arg_val, inicio, iniciada), inicio, iniciada))
+        steps = []
+        for (name, _), execucao in zip(chamadas, execucoes):
+            if execucao is None:
                 steps.append((SimpleNamespace(tool=name), f"Erro: ferramenta '{name}' não encontrada."))
                 continue
+            steps.append((SimpleNamespace(tool=name), self._aguardar(name, *execucao)))
 
-            try:
-                result = tool.func(arg_val)
-            except Exception as e:
-                result = f"Erro ao executar a ferramenta '{name}': {e}"
+        return {"intermediate_steps": steps, "output": getattr(ai_msg, "content", None)}
 
-            steps.append((SimpleNamespace(tool=name), result))
+    async def ainvoke(self, payload: Dict[str, Any]):
+        """Versão assíncrona: usa a coroutine da ferramenta quando existir, senão roda a versão síncrona em thread."""
+        chamadas, ai_msg = await self._adecidir(payload)
 
-        return {"intermediate_steps": steps, "output": getattr(ai_msg, "content", None)}
+        semaforo = asyncio.Semaphore(self.max_concorrencia)
+
+        async def _nao_encontrada(name):
+            return f"Erro: ferramenta '{name}' não encontrada."
 
+        resultados = await asyncio.gather(*[
+            self._aexecutar(name, arg_val, semaforo) if name in self.tools else _nao_encontrada(name)
+            for name, arg_val in chamadas
+        ])
+        steps = [(SimpleNamespace(tool=name), result) for (name, _), result in zip(chamadas, resultados)]
+
+        return {"intermediate_steps": steps, "output": getattr(ai_msg, "content", None)}
 
 def criar_agente_roteador():
     """Cria e retorna o agente roteador com suas ferramentas (executor simples)."""
-    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.3)
+    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.3, callbacks=[contador_tokens], cache=cache_llm)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", (
@@ -82,4 +225,5 @@ def criar_agente_roteador():
     else:
         agent = prompt | llm.bind_tools(todas_as_ferramentas)
 
-    return SimpleAgentExecutor(agent, todas_as_ferramentas)
+    classificador = ClassificadorIntencao(vetorizar=vetorizar_consultas)
+    return SimpleAgentExecutor(agent, todas_as_ferramentas, classificador=classificador)
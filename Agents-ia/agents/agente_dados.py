@@ -1,14 +1,28 @@
+import asyncio
 import os
 import pandas as pd
 from langchain_core.tools import Tool
 from langchain_groq import ChatGroq
+from runnables_registry import registry
+from cache_planilhas import cache_planilhas
+from leitor_csv import ler_csv, otimizar_tipos
+from analise_dados import MotorAnalitico
+from metricas import DURACAO_FERRAMENTA, contador_tokens, cronometrar
+from cache_llm import cache_llm
+from orcamento_prompt import PROMPT_ORCAMENTO_DADOS, TOKENS_PROMPT, contar_tokens, cortar
+
+
+def criar_llm_dados():
+    """Cria o LLM usado pelo Agente de Dados."""
+    return ChatGroq(model="llama-3.1-8b-instant", temperature=0.2, callbacks=[contador_tokens], cache=cache_llm)
 
 
 class AgenteDados:
     """Agente de análise de dados simplificado baseado em Pandas + LLM (sem langchain_experimental)."""
 
-    def __init__(self):
-        self.llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.2)
+    def __init__(self, llm=None):
+        # Reutiliza o LLM compartilhado quando disponível
+        self.llm = llm or criar_llm_dados()
         self.df = None
         print("📊 Instância do Agente de Dados criada.")
 
@@ -16,42 +30,144 @@ class AgenteDados:
         self.df = dataframe
         print("DataFrame carregado na memória do Agente de Dados.")
 
-    def _construir_contexto(self, max_rows: int = 5, include_describe: bool = True) -> str:
+    def _construir_contexto(self, max_rows: int = 5, include_describe: bool = True,
+                            max_tokens: int = PROMPT_ORCAMENTO_DADOS) -> str:
+        """Contexto da planilha para o LLM, dentro de ``max_tokens``.
+
+        Acima do orçamento, reduz nesta ordem: linhas de amostra, estatísticas
+        numéricas, lista de tipos (compactada) e, por fim, corta o texto."""
         if self.df is None:
             return "Sem dados carregados."
         df = self.df
-        info = []
-        info.append(f"Dimensões: {df.shape[0]} linhas x {df.shape[1]} colunas")
-        info.append("Colunas e tipos:")
-        info.append(str(df.dtypes))
-        info.append("\nAmostra (topo):")
-        info.append(df.head(max_rows).to_string(index=False))
+        cabecalho = f"Dimensões: {df.shape[0]} linhas x {df.shape[1]} colunas"
+        tipos = "Colunas e tipos:\n" + str(df.dtypes)
+        # Métricas calculadas no Pandas sobre todas as linhas (o LLM não deve recalcular)
+        try:
+            metricas = "\nMétricas pré-calculadas (todas as linhas):\n" + MotorAnalitico(df).como_texto()
+        except Exception as e:
+            metricas = f"(não foi possível pré-calcular métricas: {e})"
         # Estatísticas apenas para colunas numéricas para reduzir tamanho
+        estatisticas = ""
         if include_describe:
             try:
-                desc = df.describe(include=["number"]).transpose()
-                info.append("\nEstatísticas (numéricas):")
-                info.append(desc.to_string())
+                estatisticas = "\nEstatísticas (numéricas):\n" + df.describe(include=["number"]).transpose().to_string()
             except Exception:
                 pass
-        return "\n".join(info)
 
-    def analisar(self, pergunta: str) -> str:
-        if self.df is None:
-            return "Agente não foi criado. Por favor, carregue os dados primeiro."
+        linhas, tipos_compactos = max_rows, False
+        while True:
+            amostra = f"\nAmostra (topo):\n{df.head(linhas).to_string(index=False)}" if linhas else ""
+            contexto = "\n".join(p for p in (cabecalho, tipos, metricas, amostra, estatisticas) if p)
+            if contar_tokens(contexto) <= max_tokens:
+                break
+            if linhas:
+                linhas //= 2
+            elif estatisticas:
+                estatisticas = ""
+            elif not tipos_compactos:
+                tipos = "Colunas e tipos: " + ", ".join(f"{c} ({t})" for c, t in df.dtypes.items())
+                tipos_compactos = True
+            else:
+                contexto = cortar(contexto, max_tokens)
+                break
+        TOKENS_PROMPT.observar(contar_tokens(contexto), prompt="dados")
+        return contexto
+
+    def _montar_prompt(self, pergunta: str) -> str:
         contexto = self._construir_contexto()
-        prompt = (
+        return (
             "Você é um analista de dados. Responda à pergunta do usuário usando SOMENTE o contexto fornecido do DataFrame. "
-            "Se a resposta exigir cálculo simples, explique e apresente o resultado. Se não for possível responder, diga claramente.\n\n"
+            "Os números em 'Métricas pré-calculadas' foram calculados sobre todas as linhas: use-os como estão, "
+            "sem refazer contas, e apenas interprete-os. Se a resposta exigir um número que não está no contexto, "
+            "diga claramente que ele não pode ser obtido.\n\n"
             f"Pergunta do usuário:\n{pergunta}\n\n"
             f"Contexto dos dados (Pandas):\n{contexto}\n"
         )
-        msg = self.llm.invoke(prompt)
+
+    def analisar(self, pergunta: str) -> str:
+        if self.df is None:
+            return "Agente não foi criado. Por favor, carregue os dados primeiro."
+        msg = self.llm.invoke(self._montar_prompt(pergunta))
+        return getattr(msg, "content", str(msg)) or "Não foi possível obter uma resposta."
+
+    async def aanalisar(self, pergunta: str) -> str:
+        if self.df is None:
+            return "Agente não foi criado. Por favor, carregue os dados primeiro."
+        msg = await self.llm.ainvoke(self._montar_prompt(pergunta))
         return getattr(msg, "content", str(msg)) or "Não foi possível obter uma resposta."
 
 
 # Função "ponte" usada pelo roteador
 
+class EntradaPlanilhaInvalida(Exception):
+    """Erro de validação da entrada do Analisador; a mensagem é devolvida ao roteador."""
+
+
+def _separar_entrada(entrada_string: str):
+    if not entrada_string or ';' not in entrada_string:
+        raise EntradaPlanilhaInvalida("Erro: entrada inválida. Use o formato 'caminho/arquivo;pergunta'.")
+    caminho_arquivo, pergunta = entrada_string.split(';', 1)
+    return caminho_arquivo.strip(), (pergunta or '').strip()
+
+
+def _ler_arquivo(caminho_arquivo: str) -> pd.DataFrame:
+    ext = os.path.splitext(caminho_arquivo)[1].lower()
+    if ext == '.csv':
+        return ler_csv(caminho_arquivo)
+    try:
+        return otimizar_tipos(pd.read_excel(caminho_arquivo))
+    except ImportError:
+        raise EntradaPlanilhaInvalida("Erro: pacote 'openpyxl' não instalado. Instale para ler arquivos Excel.")
+
+
+def ler_planilha(caminho_arquivo: str, sha: str = None) -> pd.DataFrame:
+    """Valida o caminho e carrega o arquivo em um DataFrame do Pandas (com cache)."""
+    if not caminho_arquivo:
+        raise EntradaPlanilhaInvalida("Erro: caminho do arquivo não informado.")
+    if not os.path.exists(caminho_arquivo):
+        raise EntradaPlanilhaInvalida(f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado. Verifique o caminho.")
+    if not os.path.isfile(caminho_arquivo):
+        raise EntradaPlanilhaInvalida(f"Erro: O caminho '{caminho_arquivo}' não é um arquivo válido.")
+
+    ext = os.path.splitext(caminho_arquivo)[1].lower()
+    if ext not in {'.csv', '.xlsx', '.xls'}:
+        raise EntradaPlanilhaInvalida("Erro: formato de arquivo não suportado. Use CSV, XLSX ou XLS.")
+
+    # Carrega o arquivo em um DataFrame do Pandas (reaproveitando a leitura anterior se o arquivo não mudou)
+    df = cache_planilhas.obter(caminho_arquivo, _ler_arquivo, sha=sha)
+
+    if df is None or df.empty:
+        raise EntradaPlanilhaInvalida("Erro: não foi possível carregar dados do arquivo ou ele está vazio.")
+    return df
+
+
+def _carregar_planilha(caminho_arquivo: str, pergunta: str) -> pd.DataFrame:
+    """Valida a entrada do Analisador e carrega a planilha."""
+    if not caminho_arquivo:
+        raise EntradaPlanilhaInvalida("Erro: caminho do arquivo não informado.")
+    if not pergunta:
+        raise EntradaPlanilhaInvalida("Erro: pergunta sobre o arquivo não informada.")
+    print(f"Analisando planilha: '{caminho_arquivo}' com a pergunta: '{pergunta}'")
+    return ler_planilha(caminho_arquivo)
+
+
+def _criar_analisador(df: pd.DataFrame) -> AgenteDados:
+    llm = registry.get("llm_dados") if registry.has("llm_dados") else None
+    analisador = AgenteDados(llm)
+    analisador.carregar_dataframe(df)
+    return analisador
+
+
+def _mensagem_erro(e: Exception, caminho_arquivo) -> str:
+    if isinstance(e, EntradaPlanilhaInvalida):
+        return str(e)
+    if isinstance(e, FileNotFoundError):
+        return f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado. Verifique o caminho."
+    if isinstance(e, ValueError):
+        return f"Erro de valor: {e}"
+    return f"Erro ao processar a análise da planilha: {e}. Verifique se a entrada está no formato 'caminho;pergunta'."
+
+
 def analisar_planilha(entrada_string: str) -> str:
     """
     Recebe uma string no formato 'caminho/arquivo;pergunta' e retorna a análise.
@@ -59,60 +175,31 @@ def analisar_planilha(entrada_string: str) -> str:
     """
     caminho_arquivo = None
     try:
-        if not entrada_string or ';' not in entrada_string:
-            return "Erro: entrada inválida. Use o formato 'caminho/arquivo;pergunta'."
-
-        caminho_arquivo, pergunta = entrada_string.split(';', 1)
-        caminho_arquivo = caminho_arquivo.strip()
-        pergunta = (pergunta or '').strip()
-
-        if not caminho_arquivo:
-            return "Erro: caminho do arquivo não informado."
-        if not pergunta:
-            return "Erro: pergunta sobre o arquivo não informada."
-        if not os.path.exists(caminho_arquivo):
-            return f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado. Verifique o caminho."
-        if not os.path.isfile(caminho_arquivo):
-            return f"Erro: O caminho '{caminho_arquivo}' não é um arquivo válido."
-
-        ext = os.path.splitext(caminho_arquivo)[1].lower()
-        if ext not in {'.csv', '.xlsx', '.xls'}:
-            return "Erro: formato de arquivo não suportado. Use CSV, XLSX ou XLS."
-
-        print(f"Analisando planilha: '{caminho_arquivo}' com a pergunta: '{pergunta}'")
-
-        # Carrega o arquivo em um DataFrame do Pandas
-        if ext == '.csv':
-            try:
-                df = pd.read_csv(caminho_arquivo)
-            except Exception:
-                df = pd.read_csv(caminho_arquivo, sep=';')
-        else:
-            try:
-                df = pd.read_excel(caminho_arquivo)
-            except ImportError:
-                return "Erro: pacote 'openpyxl' não instalado. Instale para ler arquivos Excel."
+        caminho_arquivo, pergunta = _separar_entrada(entrada_string)
+        df = _carregar_planilha(caminho_arquivo, pergunta)
+        resultado = _criar_analisador(df).analisar(pergunta)
+        return f"Análise do arquivo '{caminho_arquivo}': {resultado}"
+    except Exception as e:
+        return _mensagem_erro(e, caminho_arquivo)
 
-        if df is None or df.empty:
-            return "Erro: não foi possível carregar dados do arquivo ou ele está vazio."
 
-        analisador = AgenteDados()
-        analisador.carregar_dataframe(df)
-        resultado = analisador.analisar(pergunta)
+async def aanalisar_planilha(entrada_string: str) -> str:
+    """Versão assíncrona de ``analisar_planilha``: a leitura do arquivo roda em thread e o LLM é aguardado."""
+    caminho_arquivo = None
+    try:
+        caminho_arquivo, pergunta = _separar_entrada(entrada_string)
+        df = await asyncio.to_thread(_carregar_planilha, caminho_arquivo, pergunta)
+        resultado = await _criar_analisador(df).aanalisar(pergunta)
         return f"Análise do arquivo '{caminho_arquivo}': {resultado}"
-
-    except FileNotFoundError:
-        return f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado. Verifique o caminho."
-    except ValueError as ve:
-        return f"Erro de valor: {ve}"
     except Exception as e:
-        return f"Erro ao processar a análise da planilha: {e}. Verifique se a entrada está no formato 'caminho;pergunta'."
+        return _mensagem_erro(e, caminho_arquivo)
 
 
 # Tool exposta ao roteador
 ferramenta_analise_dados = Tool(
     name="Analisador_de_Planilhas",
-    func=analisar_planilha,
+    func=cronometrar(DURACAO_FERRAMENTA, ferramenta="Analisador_de_Planilhas")(analisar_planilha),
+    coroutine=cronometrar(DURACAO_FERRAMENTA, ferramenta="Analisador_de_Planilhas")(aanalisar_planilha),
     description=(
         "Essencial para quando o usuário precisa de análises sobre dados em arquivos específicos (CSV, Excel). "
         "Use esta ferramenta sempre que precisar realizar analises de dados contidos no arquivo (CSV, Excel). "
@@ -0,0 +1,190 @@
+# analise_dados.py
+"""Cálculos determinísticos (pandas) sobre a planilha do usuário.
+
+O LLM não faz conta: recebe os números já calculados aqui e só os interpreta.
+``MotorAnalitico`` identifica as colunas de data, valor, canal e cliente pelo
+nome e pelo conteúdo e calcula, de forma vetorizada:
+
+- totais, ticket médio e quantidade de registros;
+- série mensal do valor e variação do último mês contra o anterior;
+- participação e ranking por canal e os maiores clientes;
+- clientes distintos e novos clientes no último mês.
+"""
+import re
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+TOP_N = 5
+MESES_SERIE = 12
+# Fração mínima de valores convertidos para aceitar uma coluna de texto como data
+FRACAO_DATAS_VALIDAS = 0.8
+
+_PALAVRAS = {
+    "data": r"data|date|dia|dt_|_dt|emiss|venc|periodo|mes\b|month|created|criad",
+    "valor": r"valor|receita|fatur|total|pre[cç]o|amount|price|revenue|venda|vl_|montante|ticket",
+    "canal": r"canal|channel|origem|source|plataforma|m[ií]dia|marketplace|fonte",
+    "cliente": r"cliente|customer|comprador|consumidor|e-?mail|cpf|cnpj|buyer",
+}
+_IGNORAR_VALOR = re.compile(r"\bid\b|^id|_id$|c[oó]d|cep|telefone|ano|year|qtd|quant", re.I)
+
+
+def _nome_casa(coluna, tipo: str) -> bool:
+    return re.search(_PALAVRAS[tipo], str(coluna), re.I) is not None
+
+
+def _para_datas(serie: pd.Series) -> Optional[pd.Series]:
+    """Converte a coluna em datas se a maior parte dos valores for uma data válida."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    if pd.api.types.is_numeric_dtype(serie):
+        return None
+    amostra = serie.dropna().astype(str).head(200)
+    if amostra.empty:
+        return None
+    # Datas brasileiras (dd/mm/aaaa) têm o dia primeiro
+    dia_primeiro = amostra.str.contains(r"^\d{1,2}/\d{1,2}/\d{2,4}").mean() > 0.5
+    if pd.to_datetime(amostra, errors="coerce", dayfirst=dia_primeiro, format="mixed").notna().mean() < FRACAO_DATAS_VALIDAS:
+        return None
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Converte só as categorias (poucas) e reaproveita os códigos
+        categorias = pd.to_datetime(serie.cat.categories.astype(str), errors="coerce",
+                                    dayfirst=dia_primeiro, format="mixed")
+        return pd.Series(categorias.take(serie.cat.codes.to_numpy(), allow_fill=True),
+                         index=serie.index)
+    return pd.to_datetime(serie.astype(str), errors="coerce", dayfirst=dia_primeiro, format="mixed")
+
+
+def detectar_colunas(df: pd.DataFrame) -> Dict[str, Optional[str]]:
+    """Identifica as colunas de data, valor, canal e cliente (``None`` quando ausentes)."""
+    colunas = {"data": None, "valor": None, "canal": None, "cliente": None}
+
+    candidatas_data = sorted(df.columns, key=lambda c: not _nome_casa(c, "data"))
+    for coluna in candidatas_data:
+        if (_nome_casa(coluna, "data") or pd.api.types.is_datetime64_any_dtype(df[coluna])) \
+                and _para_datas(df[coluna]) is not None:
+            colunas["data"] = coluna
+            break
+
+    numericas = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])
+                 and not pd.api.types.is_bool_dtype(df[c])]
+    por_nome = [c for c in numericas if _nome_casa(c, "valor")]
+    if por_nome:
+        colunas["valor"] = por_nome[0]
+    else:
+        restantes = [c for c in numericas if not _IGNORAR_VALOR.search(str(c))]
+        if restantes:
+            colunas["valor"] = max(restantes, key=lambda c: float(df[c].abs().sum()))
+
+    textos = [c for c in df.columns if c not in (colunas["data"], colunas["valor"])
+              and not pd.api.types.is_numeric_dtype(df[c])]
+    for tipo in ("canal", "cliente"):
+        colunas[tipo] = next((c for c in textos if _nome_casa(c, tipo)), None)
+    return colunas
+
+
+def _delta(atual: float, anterior: float) -> Optional[float]:
+    return round((atual - anterior) / abs(anterior) * 100, 2) if anterior else None
+
+
+class MotorAnalitico:
+    """Pré-calcula as métricas da planilha para o LLM apenas narrar."""
+
+    def __init__(self, df: pd.DataFrame, top_n: int = TOP_N):
+        self.df = df
+        self.top_n = top_n
+        self.colunas = detectar_colunas(df)
+        self.datas = _para_datas(df[self.colunas["data"]]) if self.colunas["data"] else None
+        self.valores = pd.to_numeric(df[self.colunas["valor"]], errors="coerce") if self.colunas["valor"] else None
+
+    def metricas(self) -> Dict:
+        m = {"linhas": int(len(self.df)), "colunas_detectadas": self.colunas}
+        if self.valores is not None:
+            m["total"] = round(float(self.valores.sum()), 2)
+            m["media"] = round(float(self.valores.mean()), 2) if self.valores.notna().any() else None
+            m["mediana"] = round(float(self.valores.median()), 2) if self.valores.notna().any() else None
+        if self.datas is not None:
+            validas = self.datas.dropna()
+            if not validas.empty:
+                m["periodo"] = {"inicio": validas.min().date().isoformat(), "fim": validas.max().date().isoformat()}
+                m.update(self._metricas_mensais())
+        if self.colunas["canal"]:
+            m["por_canal"] = self.ranking(self.colunas["canal"])
+        if self.colunas["cliente"]:
+            clientes = self.df[self.colunas["cliente"]]
+            m["clientes_distintos"] = int(clientes.nunique(dropna=True))
+            m["top_clientes"] = self.ranking(self.colunas["cliente"])
+            novos = self.novos_clientes()
+            if novos is not None:
+                m["novos_clientes_ultimo_mes"] = novos
+        return m
+
+    # --- Séries temporais ---
+    def _metricas_mensais(self) -> Dict:
+        mensal = pd.DataFrame({"data": self.datas, "registros": 1})
+        if self.valores is not None:
+            mensal["valor"] = self.valores.to_numpy()
+        mensal = mensal.dropna(subset=["data"]).set_index("data").resample("MS").sum().tail(MESES_SERIE)
+        serie = [
+            {"mes": idx.strftime("%Y-%m"), "registros": int(linha["registros"]),
+             **({"valor": round(float(linha["valor"]), 2)} if "valor" in linha else {})}
+            for idx, linha in mensal.iterrows()
+        ]
+        resultado = {"serie_mensal": serie}
+        if len(serie) >= 2:
+            coluna = "valor" if self.valores is not None else "registros"
+            atual, anterior = serie[-1][coluna], serie[-2][coluna]
+            resultado["ultimo_mes"] = {
+                "mes": serie[-1]["mes"], coluna: atual,
+                "mes_anterior": serie[-2]["mes"], f"{coluna}_anterior": anterior,
+                "variacao_pct": _delta(atual, anterior),
+            }
+        return resultado
+
+    def novos_clientes(self) -> Optional[int]:
+        if self.datas is None:
+            return None
+        base = pd.DataFrame({"cliente": self.df[self.colunas["cliente"]].to_numpy(), "data": self.datas}).dropna()
+        if base.empty:
+            return None
+        primeira = base.groupby("cliente", observed=True)["data"].min()
+        ultimo_mes = base["data"].max().to_period("M")
+        return int((primeira.dt.to_period("M") == ultimo_mes).sum())
+
+    # --- Agrupamentos ---
+    def ranking(self, coluna: str) -> List[Dict]:
+        chaves = self.df[coluna]
+        if self.valores is not None:
+            agrupado = self.valores.groupby(chaves, observed=True).agg(["sum", "count"])
+            agrupado.columns = ["valor", "registros"]
+            base = agrupado["valor"]
+        else:
+            agrupado = chaves.value_counts().to_frame("registros")
+            base = agrupado["registros"]
+        total = float(base.sum()) or 1.0
+        top = agrupado.loc[base.sort_values(ascending=False).index[:self.top_n]]
+        return [
+            {"nome": str(nome), **{k: (int(v) if k == "registros" else round(float(v), 2)) for k, v in linha.items()},
+             "participacao_pct": round(float(base[nome]) / total * 100, 2)}
+            for nome, linha in top.iterrows()
+        ]
+
+    def como_texto(self) -> str:
+        """Resumo compacto das métricas para o prompt."""
+        m = self.metricas()
+        linhas = [f"Registros: {m['linhas']}", f"Colunas identificadas: {m['colunas_detectadas']}"]
+        for chave, rotulo in (("total", "Soma do valor"), ("media", "Valor médio (ticket médio)"),
+                              ("mediana", "Mediana do valor"), ("periodo", "Período"),
+                              ("ultimo_mes", "Último mês x anterior"),
+                              ("clientes_distintos", "Clientes distintos"),
+                              ("novos_clientes_ultimo_mes", "Novos clientes no último mês")):
+            if chave in m:
+                linhas.append(f"{rotulo}: {m[chave]}")
+        if m.get("serie_mensal"):
+            linhas.append("Série mensal:")
+            linhas.extend(f"  {p}" for p in m["serie_mensal"])
+        for chave, rotulo in (("por_canal", "Por canal (top)"), ("top_clientes", "Maiores clientes")):
+            if m.get(chave):
+                linhas.append(f"{rotulo}:")
+                linhas.extend(f"  {p}" for p in m[chave])
+        return "\n".join(linhas)
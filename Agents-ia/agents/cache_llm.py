@@ -0,0 +1,202 @@
+# cache_llm.py
+"""Cache persistente das respostas do LLM (roteador, estrategista e agente de dados).
+
+Implementa o ``BaseCache`` do LangChain: a chave é o SHA-256 das mensagens já
+renderizadas junto com a configuração do modelo (nome, temperatura, ferramentas
+vinculadas, stop), exatamente o par que o LangChain entrega a ``lookup``. As
+respostas ficam num SQLite local em modo WAL, compartilhado pelos processos do
+servidor, com expiração por TTL e descarte das menos acessadas acima de
+``LLM_CACHE_MAX_ENTRADAS``.
+
+``astream`` dos modelos de chat não passa pelo cache do LangChain; para a resposta
+transmitida do estrategista, ``astream_com_cache`` consulta a mesma chave antes de
+abrir o stream (um acerto vira um único trecho) e grava o texto completo no fim.
+
+``sem_cache_llm()`` desativa o cache para as chamadas feitas dentro do bloco
+(inclusive em tarefas assíncronas e threads do LangChain, via contextvars); o
+chat o usa quando o cliente pede uma resposta nova (``no_cache``).
+Respostas vindas do cache são marcadas para não serem contadas de novo como
+tokens consumidos.
+"""
+import contextlib
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, Generation
+
+from metricas import registrar_cache
+
+CURRENT_DIR = Path(__file__).resolve().parent  # Agents-ia/agents
+
+LLM_CACHE_ATIVO = os.getenv("LLM_CACHE_ATIVO", "1") == "1"
+LLM_CACHE_ARQUIVO = Path(os.getenv("LLM_CACHE_ARQUIVO", str(CURRENT_DIR.parent / "cache" / "llm_cache.sqlite3")))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))  # segundos
+LLM_CACHE_MAX_ENTRADAS = int(os.getenv("LLM_CACHE_MAX_ENTRADAS", "20000"))
+# Gravações entre duas limpezas (expiradas e excesso de entradas)
+_LIMPEZA_A_CADA = 200
+# Marca gravada em response_metadata das respostas servidas pelo cache
+MARCA_CACHE = "cache_llm"
+
+_desativado = contextvars.ContextVar("cache_llm_desativado", default=False)
+
+
+@contextlib.contextmanager
+def sem_cache_llm():
+    """Ignora o cache (sem ler nem gravar) nas chamadas ao LLM feitas dentro do bloco."""
+    token = _desativado.set(True)
+    try:
+        yield
+    finally:
+        _desativado.reset(token)
+
+
+def veio_do_cache(mensagem) -> bool:
+    return bool((getattr(mensagem, "response_metadata", None) or {}).get(MARCA_CACHE))
+
+
+def _carregar(valor: str):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", LangChainBetaWarning)
+        return loads(valor, allowed_objects=[ChatGeneration, Generation, AIMessage])
+
+
+class CacheLLM(BaseCache):
+    """Respostas do LLM em SQLite, endereçadas pelo conteúdo da chamada."""
+
+    def __init__(self, caminho: Path = LLM_CACHE_ARQUIVO, ttl: float = LLM_CACHE_TTL,
+                 max_entradas: int = LLM_CACHE_MAX_ENTRADAS):
+        self.caminho = Path(caminho)
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._local = threading.local()
+        self._gravacoes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.ignoradas = 0
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.caminho), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS respostas ("
+                "chave TEXT PRIMARY KEY, valor TEXT NOT NULL, criado REAL NOT NULL, acessado REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS respostas_acessado ON respostas (acessado)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _chave(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        if _desativado.get():
+            self.ignoradas += 1
+            return None
+        chave = self._chave(prompt, llm_string)
+        agora = time.time()
+        try:
+            conn = self._conexao()
+            linha = conn.execute("SELECT valor, criado FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if linha is not None and agora - linha[1] > self.ttl:
+                conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                linha = None
+            if linha is None:
+                self.faltas += 1
+                return None
+            conn.execute("UPDATE respostas SET acessado = ? WHERE chave = ?", (agora, chave))
+            geracoes = _carregar(linha[0])
+        except Exception as e:
+            print(f"⚠️ Cache do LLM indisponível na leitura: {e}")
+            self.faltas += 1
+            return None
+        self.acertos += 1
+        return geracoes
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+        if _desativado.get():
+            return
+        agora = time.time()
+        marcadas = []
+        for geracao in return_val:
+            mensagem = getattr(geracao, "message", None)
+            if mensagem is not None:
+                metadata = {**(mensagem.response_metadata or {}), MARCA_CACHE: True}
+                geracao = geracao.model_copy(update={"message": mensagem.model_copy(update={"response_metadata": metadata})})
+            marcadas.append(geracao)
+        try:
+            conn = self._conexao()
+            conn.execute(
+                "INSERT OR REPLACE INTO respostas (chave, valor, criado, acessado) VALUES (?, ?, ?, ?)",
+                (self._chave(prompt, llm_string), dumps(marcadas), agora, agora),
+            )
+            self._gravacoes += 1
+            if self._gravacoes % _LIMPEZA_A_CADA == 0:
+                self._limpar(conn, agora)
+        except Exception as e:
+            print(f"⚠️ Cache do LLM indisponível na gravação: {e}")
+
+    def _limpar(self, conn: sqlite3.Connection, agora: float):
+        conn.execute("DELETE FROM respostas WHERE criado < ?", (agora - self.ttl,))
+        # Acima do limite, descarta as menos acessadas
+        conn.execute(
+            "DELETE FROM respostas WHERE chave IN ("
+            "SELECT chave FROM respostas ORDER BY acessado DESC LIMIT -1 OFFSET ?)",
+            (self.max_entradas,),
+        )
+
+    def clear(self, **kwargs: Any) -> None:
+        self._conexao().execute("DELETE FROM respostas")
+
+
+async def astream_com_cache(cadeia, entrada) -> AsyncIterator[str]:
+    """Transmite o texto de ``prompt | llm`` usando o cache do LLM com a mesma chave de ``invoke``."""
+    mensagens = (await cadeia.first.ainvoke(entrada)).to_messages()
+    llm = cadeia.last
+    cache = llm.cache if isinstance(llm.cache, CacheLLM) else None
+    if cache is not None:
+        # Mesma chave que BaseChatModel._agenerate_with_cache (mensagens sem id + configuração do modelo)
+        prompt = dumps([m.model_copy(update={"id": None}) if getattr(m, "id", None) else m for m in mensagens])
+        llm_string = llm._get_llm_string()
+        # SQLite síncrono: alookup/aupdate rodam num executor, fora do event loop (com os contextvars)
+        geracoes = await cache.alookup(prompt, llm_string)
+        if geracoes:
+            yield "".join(g.text for g in geracoes)
+            return
+
+    completa: Optional[AIMessageChunk] = None
+    async for chunk in llm.astream(mensagens):
+        completa = chunk if completa is None else completa + chunk
+        if chunk.content:
+            yield chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+
+    # Só respostas completas vão para o cache (stream interrompido levanta antes daqui)
+    if cache is not None and completa is not None:
+        mensagem = AIMessage(content=completa.content, response_metadata=completa.response_metadata,
+                             usage_metadata=completa.usage_metadata)
+        await cache.aupdate(prompt, llm_string, [ChatGeneration(message=mensagem)])
+
+
+# Instância compartilhada pelo processo (None com LLM_CACHE_ATIVO=0)
+cache_llm = CacheLLM() if LLM_CACHE_ATIVO else None
+if cache_llm is not None:
+    registrar_cache("llm", lambda: {
+        "hit": cache_llm.acertos,
+        "miss": cache_llm.faltas,
+        "bypass": cache_llm.ignoradas,
+    })
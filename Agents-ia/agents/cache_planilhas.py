@@ -0,0 +1,148 @@
+# cache_planilhas.py
+"""Cache dos DataFrames já lidos pelo Analisador de Planilhas.
+
+O mesmo arquivo enviado pelo usuário é analisado várias vezes (chat e cada
+atualização do dashboard). Em vez de reler e converter o CSV/Excel a cada vez:
+
+- os DataFrames ficam em memória, indexados por (caminho, mtime, tamanho), com
+  descarte LRU limitado pelo uso de memória (``PLANILHA_CACHE_MAX_MB``);
+- a versão convertida também é gravada em disco em formato colunar (Feather /
+  Arrow IPC, sem compressão) identificada pelo SHA-256 do conteúdo; leituras
+  seguintes, inclusive em outros processos, mapeiam o arquivo direto na memória.
+
+Os DataFrames devolvidos são compartilhados: quem os recebe não deve alterá-los.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+
+from metricas import registrar_cache
+
+CURRENT_DIR = Path(__file__).resolve().parent  # Agents-ia/agents
+
+PLANILHA_CACHE_MAX_MB = float(os.getenv("PLANILHA_CACHE_MAX_MB", "256"))
+PLANILHA_CACHE_DIR = Path(os.getenv("PLANILHA_CACHE_DIR", str(CURRENT_DIR.parent / "cache" / "planilhas")))
+# Incrementar quando a forma de ler/converter as planilhas mudar (invalida as cópias em disco)
+VERSAO_LEITURA = 2
+
+
+def _hash_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _tamanho_em_memoria(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class CachePlanilhas:
+    """LRU de DataFrames limitado em bytes, com cópia colunar em disco."""
+
+    def __init__(self, max_bytes: float = PLANILHA_CACHE_MAX_MB * 1024 * 1024,
+                 diretorio: Optional[Path] = PLANILHA_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.diretorio = Path(diretorio) if diretorio else None
+        self._entradas: "OrderedDict[Tuple, tuple]" = OrderedDict()  # chave -> (df, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.acertos_disco = 0
+        self.faltas = 0
+
+    def obter(self, caminho: str, ler: Callable[[str], pd.DataFrame], sha: Optional[str] = None) -> pd.DataFrame:
+        """Retorna o DataFrame do arquivo, usando ``ler(caminho)`` só quando não há cópia válida.
+        ``sha`` evita recalcular o hash quando ele já é conhecido (ex.: calculado no upload)."""
+        caminho = os.path.abspath(caminho)
+        st = os.stat(caminho)
+        chave = (caminho, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[0]
+
+        if self.diretorio and not sha:
+            sha = _hash_arquivo(caminho)
+        df = self._ler_copia(sha)
+        if df is not None:
+            self.acertos_disco += 1
+        else:
+            self.faltas += 1
+            df = ler(caminho)
+            if df is not None and not df.empty:
+                self._gravar_copia(sha, df)
+        if df is not None and not df.empty:
+            self._guardar(chave, df)
+        return df
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    # --- Memória ---
+    def _guardar(self, chave: Tuple, df: pd.DataFrame):
+        tamanho = _tamanho_em_memoria(df)
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            # Versões antigas do mesmo arquivo não serão mais pedidas
+            for antiga in [c for c in self._entradas if c[0] == chave[0]]:
+                self._bytes -= self._entradas.pop(antiga)[1]
+            self._entradas[chave] = (df, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes:
+                _, (_, liberado) = self._entradas.popitem(last=False)
+                self._bytes -= liberado
+
+    # --- Cópia colunar em disco ---
+    def _caminho_copia(self, sha: str) -> Path:
+        return self.diretorio / f"{sha}-v{VERSAO_LEITURA}.feather"
+
+    def copia_em_disco(self, sha: str) -> Optional[Path]:
+        """Caminho da cópia colunar do conteúdo ``sha``, se ela existir."""
+        if not self.diretorio or not sha:
+            return None
+        caminho = self._caminho_copia(sha)
+        return caminho if caminho.exists() else None
+
+    def _ler_copia(self, sha: Optional[str]) -> Optional[pd.DataFrame]:
+        if not sha or not self._caminho_copia(sha).exists():
+            return None
+        try:
+            import pyarrow.feather as feather
+            return feather.read_table(self._caminho_copia(sha), memory_map=True).to_pandas()
+        except Exception as e:  # pyarrow ausente ou arquivo corrompido: relê a planilha original
+            print(f"⚠️ Cópia colunar da planilha ignorada: {e}")
+            return None
+
+    def _gravar_copia(self, sha: Optional[str], df: pd.DataFrame):
+        if not sha:
+            return
+        try:
+            import pyarrow.feather as feather
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+            destino = self._caminho_copia(sha)
+            tmp = destino.with_suffix(".tmp")
+            feather.write_feather(df, tmp, compression="uncompressed")
+            tmp.replace(destino)
+        except Exception as e:  # pyarrow ausente ou tipos não suportados pelo Arrow
+            print(f"⚠️ Não foi possível gravar a cópia colunar da planilha: {e}")
+
+
+# Instância compartilhada pelo processo
+cache_planilhas = CachePlanilhas()
+registrar_cache("planilhas", lambda: {
+    "hit": cache_planilhas.acertos,
+    "hit_disco": cache_planilhas.acertos_disco,
+    "miss": cache_planilhas.faltas,
+})
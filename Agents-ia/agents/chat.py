@@ -1,10 +1,11 @@
 
 from langchain_core.runnables import RunnablePassthrough, RunnableWithMessageHistory
-from langchain_community.chat_message_histories import SQLChatMessageHistory
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
+from metricas import contador_tokens
+from historico_sql import CHAT_JANELA, HistoricoJanelado
 
 # Carrega as variáveis de ambiente (onde sua OPENAI_API_KEY deve estar)
 load_dotenv()
@@ -16,7 +17,8 @@ class ChatbotEmpresarial:
         # 1. Inicializa o modelo de linguagem
         self.llm = ChatGroq(
             model="llama-3.1-8b-instant",
-            temperature=0.2)
+            temperature=0.2,
+            callbacks=[contador_tokens])
 
         # 2. Define o template do prompt
         prompt = ChatPromptTemplate.from_messages([
@@ -60,13 +62,13 @@ class ChatbotEmpresarial:
 
     # Retornar historico de conversa
 
-    def get_session_history(self, session_id: str) -> SQLChatMessageHistory:
-
-        return SQLChatMessageHistory(session_id, connection_string=self.db_connection)
+    def get_session_history(self, session_id: str) -> HistoricoJanelado:
+        # Só as últimas CHAT_JANELA mensagens são lidas do banco (engine compartilhado por conexão)
+        return HistoricoJanelado(session_id, self.db_connection, k=CHAT_JANELA)
 
     @staticmethod
     def memory_window(data: dict):
-        k = 10
+        k = CHAT_JANELA
         messages = data.get("history", [])
         return messages[-k:]
 
@@ -0,0 +1,241 @@
+# classificador_intencao.py
+"""Decisão local das ferramentas do roteador, antes de recorrer ao LLM.
+
+As regras do prompt do roteador são, na prática, palavras-chave. Este módulo as
+aplica localmente:
+
+- planilha anexada -> ``Analisador_de_Planilhas``, com a entrada ``caminho;pergunta``
+  recebida à parte (campo ``entrada_planilha`` do estado, validado por ``AIService``);
+  caminhos nunca são lidos do texto do usuário;
+- IPCA/inflação com ano explícito -> ``consultor_inflacao_ipca`` (um ano por chamada);
+- vocabulário de marketing, vendas e estratégia -> ``ferramenta_pesquisa``.
+
+Quando algum sinal é ambíguo (IPCA sem ano, planilha sem arquivo) ou nada casa,
+o kNN opcional compara o embedding da consulta com as decisões anteriores do LLM
+(registradas em ``ROTEAMENTO_LOG``); se os vizinhos não concordarem, retorna
+``None`` e o roteador chama o LLM normalmente. As decisões só são gravadas com o
+kNN ativo, e o arquivo é rotacionado a cada ``ROTEADOR_KNN_MAX_EXEMPLOS`` linhas
+(o anterior fica em ``<log>.1``).
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metricas import registro_metricas
+
+CURRENT_DIR = Path(__file__).resolve().parent  # Agents-ia/agents
+
+# Decisões do LLM (consulta -> ferramentas), usadas pelo kNN; vazio desativa o registro.
+# Só é gravado com o kNN ativo (ROTEADOR_KNN_SIMILARIDADE > 0)
+ROTEAMENTO_LOG = os.getenv("ROTEAMENTO_LOG", str(CURRENT_DIR.parent / "cache" / "roteamento.jsonl"))
+# 0 desativa o kNN; caso contrário, similaridade de cosseno mínima dos vizinhos
+ROTEADOR_KNN_SIMILARIDADE = float(os.getenv("ROTEADOR_KNN_SIMILARIDADE", "0"))
+ROTEADOR_KNN_K = int(os.getenv("ROTEADOR_KNN_K", "5"))
+# Vizinhos acima do limiar, todos concordando, para aceitar a decisão
+ROTEADOR_KNN_MINIMO = int(os.getenv("ROTEADOR_KNN_MINIMO", "3"))
+ROTEADOR_KNN_MAX_EXEMPLOS = int(os.getenv("ROTEADOR_KNN_MAX_EXEMPLOS", "5000"))
+
+PLANILHA = "Analisador_de_Planilhas"
+IPCA = "consultor_inflacao_ipca"
+PESQUISA = "ferramenta_pesquisa"
+
+# Padrões aplicados ao texto sem acentos e em minúsculas
+_PLANILHA = re.compile(r"\b(planilha|arquivo|csv|excel|xlsx?)\b")
+_IPCA = re.compile(r"\b(ipca|inflacao|inflacionari[oa]|indice de precos)\b")
+_ANO = re.compile(r"\b(19[89]\d|20\d\d)\b")
+_PESQUISA = re.compile(
+    r"\b(marketing|estrategi\w*|venda\w*|vender|client\w*|conteud\w*|campanha\w*|anuncio\w*|trafego|"
+    r"instagram|tiktok|facebook|linkedin|youtube|whatsapp|redes? sociai?s|seo|funil|lead\w*|conversao|"
+    r"branding|marca|posicionamento|public\w* alvo|persona\w*|fideliza\w*|engajamento|crescimento|crescer|"
+    r"precific\w*|preco\w*|concorr\w*|mercado|negocio\w*|divulga\w*|promoc\w*|e-?commerce|loja|"
+    r"faturamento|receita|lucr\w*|ticket medio|retencao|churn|cac|roi)\b")
+
+DECISOES = registro_metricas.contador(
+    "marttin_router_decisions_total", "Decisões do roteador por origem.", ("origem",))
+
+Chamada = Tuple[str, str]  # (ferramenta, entrada)
+
+
+def normalizar(texto: str) -> str:
+    s = unicodedata.normalize("NFKD", texto or "").lower()
+    return "".join(c for c in s if not unicodedata.combining(c))
+
+
+class ClassificadorIntencao:
+    """Escolhe as ferramentas por palavras-chave e, opcionalmente, por kNN sobre decisões passadas."""
+
+    def __init__(self, vetorizar: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+                 log: Optional[str] = ROTEAMENTO_LOG, similaridade: float = ROTEADOR_KNN_SIMILARIDADE,
+                 k: int = ROTEADOR_KNN_K, minimo: int = ROTEADOR_KNN_MINIMO,
+                 max_exemplos: int = ROTEADOR_KNN_MAX_EXEMPLOS):
+        self.vetorizar = vetorizar
+        self.log = Path(log) if log else None
+        self.similaridade = similaridade
+        self.k = k
+        self.minimo = min(minimo, k)
+        self.max_exemplos = max_exemplos
+        self._exemplos: List[Tuple[str, Tuple[str, ...]]] = []
+        self._vetores: Optional[np.ndarray] = None  # linhas normalizadas, na ordem de _exemplos
+        self._linhas_log = 0  # linhas do arquivo atual (antes da rotação)
+        self._carregado = False
+        self._lock = threading.Lock()
+
+    @property
+    def usa_knn(self) -> bool:
+        return self.vetorizar is not None and self.similaridade > 0
+
+    # --- Decisão ---
+    def classificar(self, consulta: str, planilha: Optional[str] = None) -> Optional[List[Chamada]]:
+        """Chamadas de ferramenta para a consulta, ou ``None`` se a decisão deve ficar com o LLM.
+
+        ``planilha`` é a entrada ``caminho;pergunta`` do arquivo já validado (ou ``None``)."""
+        consulta = consulta or ""
+        texto = normalizar(consulta)
+        anos = _ANO.findall(texto)
+
+        chamadas: List[Chamada] = []
+        ambigua = False
+        if planilha:
+            chamadas.append((PLANILHA, planilha))
+        elif _PLANILHA.search(texto):
+            ambigua = True  # fala de planilha, mas nenhum arquivo foi anexado
+        if _IPCA.search(texto):
+            if anos:
+                chamadas.extend((IPCA, ano) for ano in dict.fromkeys(anos))
+            else:
+                ambigua = True
+        if _PESQUISA.search(texto):
+            chamadas.append((PESQUISA, consulta))
+
+        if chamadas and not ambigua:
+            DECISOES.inc(origem="palavras_chave")
+            return chamadas
+
+        vizinhos = self._knn(consulta) if self.usa_knn and consulta.strip() else None
+        if vizinhos is not None:
+            decisao = self._montar(vizinhos, consulta, planilha, anos)
+            if decisao is not None:
+                DECISOES.inc(origem="knn")
+                return decisao
+        DECISOES.inc(origem="llm")
+        return None
+
+    @staticmethod
+    def _montar(ferramentas: Tuple[str, ...], consulta: str, planilha: Optional[str],
+                anos: List[str]) -> Optional[List[Chamada]]:
+        """Transforma as ferramentas dos vizinhos em chamadas; ``None`` se faltar a entrada de alguma."""
+        chamadas: List[Chamada] = []
+        for nome in ferramentas:
+            if nome == PLANILHA:
+                if not planilha:
+                    return None
+                chamadas.append((PLANILHA, planilha))
+            elif nome == IPCA:
+                if not anos:
+                    return None
+                chamadas.extend((IPCA, ano) for ano in dict.fromkeys(anos))
+            elif nome == PESQUISA:
+                chamadas.append((PESQUISA, consulta))
+            else:
+                return None
+        return chamadas
+
+    # --- Decisões passadas (kNN) ---
+    def registrar(self, consulta: str, ferramentas: Sequence[str]):
+        """Guarda a decisão tomada pelo LLM para esta consulta (só com o kNN ativo; faz I/O de arquivo)."""
+        if not self.usa_knn or not (consulta or "").strip():
+            return
+        exemplo = (consulta, tuple(sorted(set(ferramentas))))
+        with self._lock:
+            self._carregar()
+            # O vetor do novo exemplo é calculado na próxima consulta ao kNN
+            self._exemplos.append(exemplo)
+            self._descartar_antigos()
+            if self.log is None:
+                return
+            try:
+                self.log.parent.mkdir(parents=True, exist_ok=True)
+                if self._linhas_log >= self.max_exemplos:
+                    self.log.replace(self._log_anterior)
+                    self._linhas_log = 0
+                with self.log.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({"consulta": exemplo[0], "ferramentas": list(exemplo[1])}, ensure_ascii=False) + "\n")
+                self._linhas_log += 1
+            except OSError as e:
+                print(f"⚠️ Não foi possível registrar a decisão do roteador: {e}")
+
+    @property
+    def _log_anterior(self) -> Path:
+        return self.log.with_name(self.log.name + ".1")
+
+    @staticmethod
+    def _ler_log(caminho: Path) -> List[Tuple[str, Tuple[str, ...]]]:
+        exemplos = []
+        if not caminho.exists():
+            return exemplos
+        with caminho.open(encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    item = json.loads(linha)
+                    exemplos.append((item["consulta"], tuple(item["ferramentas"])))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return exemplos
+
+    def _carregar(self):
+        if self._carregado:
+            return
+        exemplos = []
+        if self.log is not None:
+            atuais = self._ler_log(self.log)
+            self._linhas_log = len(atuais)
+            exemplos = self._ler_log(self._log_anterior) + atuais
+        self._exemplos = exemplos
+        self._descartar_antigos()
+        self._carregado = True
+
+    def _descartar_antigos(self):
+        excesso = len(self._exemplos) - self.max_exemplos
+        if excesso > 0:
+            del self._exemplos[:excesso]
+            if self._vetores is not None:
+                self._vetores = self._vetores[min(excesso, len(self._vetores)):]
+
+    def _matriz(self) -> Tuple[Optional[np.ndarray], List[Tuple[str, ...]]]:
+        """Vetores normalizados dos exemplos e suas decisões (só os exemplos novos são vetorizados)."""
+        with self._lock:
+            self._carregar()
+            prontos = 0 if self._vetores is None else len(self._vetores)
+            novos = [c for c, _ in self._exemplos[prontos:]]
+            if novos:
+                matriz = np.asarray(self.vetorizar(novos), dtype=np.float32)
+                normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+                matriz = matriz / np.where(normas == 0, 1, normas)
+                self._vetores = matriz if self._vetores is None else np.vstack([self._vetores, matriz])
+            return self._vetores, [f for _, f in self._exemplos]
+
+    def _knn(self, consulta: str) -> Optional[Tuple[str, ...]]:
+        try:
+            matriz, decisoes_exemplos = self._matriz()
+            if not decisoes_exemplos:
+                return None
+            alvo = np.asarray(self.vetorizar([consulta])[0], dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ kNN do roteador indisponível: {e}")
+            return None
+        norma = np.linalg.norm(alvo)
+        if not norma:
+            return None
+        scores = matriz @ (alvo / norma)
+        melhores = np.argsort(scores)[::-1][:self.k]
+        decisoes = {decisoes_exemplos[i] for i in melhores if scores[i] >= self.similaridade}
+        proximos = int((scores[melhores] >= self.similaridade).sum())
+        if proximos < self.minimo or len(decisoes) != 1:
+            return None
+        return decisoes.pop()
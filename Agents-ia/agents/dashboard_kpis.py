@@ -0,0 +1,194 @@
+# dashboard_kpis.py
+"""Dados do dashboard calculados direto da planilha do usuário.
+
+As seções numéricas (``kpis``, ``cashflow``, ``channels`` e ``latest_sales``)
+saem do pandas, em milissegundos e sempre no mesmo formato. O LLM é usado só
+para os ``insights`` (``gerar_insights``), a partir dos números já calculados;
+sem LLM, ``insights_basicos`` produz observações simples a partir dos mesmos
+números.
+"""
+import json
+import re
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from analise_dados import MotorAnalitico
+
+DIAS_FLUXO_CAIXA = 30
+ULTIMAS_VENDAS = 10
+ICONES_INSIGHTS = ("lightbulb", "graph-up", "cash")
+
+_COLUNA_CUSTO = re.compile(r"custo|gasto|investimento|spend|cost|despesa|sa[ií]da|cac", re.I)
+_COLUNA_STATUS = re.compile(r"status|situa[cç][aã]o|pagamento|state", re.I)
+_COLUNA_ID = re.compile(r"^id$|^id_|_id$|pedido|order|n[uú]mero|c[oó]digo", re.I)
+
+
+def _coluna(df: pd.DataFrame, padrao: re.Pattern, numerica: Optional[bool] = None,
+            excluir=()) -> Optional[str]:
+    for coluna in df.columns:
+        if coluna in excluir or not padrao.search(str(coluna)):
+            continue
+        if numerica is not None and pd.api.types.is_numeric_dtype(df[coluna]) != numerica:
+            continue
+        return coluna
+    return None
+
+
+def _redondo(valor) -> float:
+    return round(float(valor), 2) if pd.notna(valor) else 0.0
+
+
+class DashboardPlanilha:
+    """Calcula as seções numéricas do dashboard a partir de um DataFrame."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.motor = MotorAnalitico(df)
+        self.colunas = self.motor.colunas
+        usadas = [c for c in self.colunas.values() if c]
+        self.coluna_custo = _coluna(df, _COLUNA_CUSTO, numerica=True, excluir=usadas)
+        self.coluna_status = _coluna(df, _COLUNA_STATUS, numerica=False, excluir=usadas)
+        self.coluna_id = _coluna(df, _COLUNA_ID, excluir=usadas)
+        self.datas = self.motor.datas
+        self.valores = self.motor.valores
+
+    def _mascara_ultimo_mes(self) -> Optional[pd.Series]:
+        if self.datas is None or self.datas.dropna().empty:
+            return None
+        ultimo = self.datas.max().to_period("M")
+        return self.datas.dt.to_period("M") == ultimo
+
+    def kpis(self) -> Dict:
+        mascara = self._mascara_ultimo_mes()
+        no_mes = (lambda s: s[mascara]) if mascara is not None else (lambda s: s)
+
+        faturamento = _redondo(no_mes(self.valores).clip(lower=0).sum()) if self.valores is not None else 0.0
+
+        novos = 0
+        if self.colunas["cliente"]:
+            novos = self.motor.novos_clientes()
+            if novos is None:
+                novos = int(self.df[self.colunas["cliente"]].nunique(dropna=True))
+
+        cac = None
+        if self.coluna_custo:
+            investimento = float(pd.to_numeric(no_mes(self.df[self.coluna_custo]), errors="coerce").sum())
+            cac = round(investimento / novos, 2) if novos else None
+        return {"faturamento_mes": faturamento, "novos_clientes": int(novos), "cac": cac}
+
+    def cashflow(self) -> Dict:
+        if self.valores is None or self.datas is None or self.datas.dropna().empty:
+            return {"labels": [], "entradas": [], "saidas": []}
+        base = pd.DataFrame({"data": self.datas.dt.normalize(), "valor": self.valores.to_numpy()})
+        base["entradas"] = base["valor"].clip(lower=0)
+        # Valores negativos são saídas; uma coluna de custo/despesa também conta como saída
+        base["saidas"] = -base["valor"].clip(upper=0)
+        if self.coluna_custo:
+            base["saidas"] += pd.to_numeric(self.df[self.coluna_custo], errors="coerce").fillna(0).abs().to_numpy()
+        fim = base["data"].max()
+        dias = pd.date_range(end=fim, periods=DIAS_FLUXO_CAIXA, freq="D")
+        diario = (base[base["data"] >= dias[0]].groupby("data")[["entradas", "saidas"]].sum()
+                  .reindex(dias, fill_value=0))
+        return {
+            "labels": [d.strftime("%d/%m") for d in diario.index],
+            "entradas": [_redondo(v) for v in diario["entradas"]],
+            "saidas": [_redondo(v) for v in diario["saidas"]],
+        }
+
+    def channels(self) -> Dict:
+        if not self.colunas["canal"]:
+            return {"labels": [], "values": []}
+        ranking = self.motor.ranking(self.colunas["canal"])
+        return {"labels": [r["nome"] for r in ranking], "values": [r["participacao_pct"] for r in ranking]}
+
+    def latest_sales(self, limite: int = ULTIMAS_VENDAS) -> List[Dict]:
+        if self.datas is not None:
+            posicoes = self.datas.reset_index(drop=True).dropna().sort_values(ascending=False).index[:limite]
+        else:
+            posicoes = range(max(len(self.df) - limite, 0), len(self.df))[::-1]
+        linhas = self.df.iloc[list(posicoes)]
+        vendas = []
+        for pos, (_, linha) in zip(posicoes, linhas.iterrows()):
+            vendas.append({
+                "id": _valor_json(linha[self.coluna_id]) if self.coluna_id else int(pos) + 1,
+                "data": self.datas.iloc[pos].date().isoformat() if self.datas is not None else "",
+                "cliente": _texto(linha, self.colunas["cliente"]),
+                "canal": _texto(linha, self.colunas["canal"]),
+                "valor": _redondo(self.valores.iloc[pos]) if self.valores is not None else 0.0,
+                "status": _texto(linha, self.coluna_status) or "—",
+            })
+        return vendas
+
+    def dados(self) -> Dict:
+        return {
+            "kpis": self.kpis(),
+            "cashflow": self.cashflow(),
+            "channels": self.channels(),
+            "latest_sales": self.latest_sales(),
+        }
+
+
+def _texto(linha, coluna) -> str:
+    if not coluna or pd.isna(linha[coluna]):
+        return ""
+    return str(linha[coluna])
+
+
+def _valor_json(valor):
+    if pd.isna(valor):
+        return None
+    return valor.item() if hasattr(valor, "item") else str(valor)
+
+
+# --- Insights ---
+def insights_basicos(dados: Dict) -> List[Dict]:
+    """Observações determinísticas a partir dos números (usadas sem LLM ou se ele falhar)."""
+    insights = []
+    canais = dados.get("channels") or {}
+    if canais.get("labels"):
+        insights.append({"icon": "lightbulb", "title": "Canal principal",
+                         "text": f"{canais['labels'][0]} responde por {canais['values'][0]}% do faturamento."})
+    cashflow = dados.get("cashflow") or {}
+    if cashflow.get("entradas"):
+        entradas, saidas = sum(cashflow["entradas"]), sum(cashflow["saidas"])
+        insights.append({"icon": "graph-up", "title": "Fluxo de caixa",
+                         "text": f"Nos últimos {len(cashflow['entradas'])} dias: entradas de R$ {entradas:,.2f} "
+                                 f"e saídas de R$ {saidas:,.2f}."})
+    cac = (dados.get("kpis") or {}).get("cac")
+    if cac:
+        insights.append({"icon": "cash", "title": "Custo de aquisição",
+                         "text": f"O CAC do último mês foi de R$ {cac:,.2f} por novo cliente."})
+    return insights
+
+
+def _prompt_insights(resumo: str, dados: Dict) -> str:
+    return (
+        "Você é o Estrategista do Marttin. A partir das métricas abaixo (já calculadas, não recalcule), "
+        "escreva de 2 a 4 insights acionáveis para o dono do negócio. Responda SOMENTE com uma lista JSON "
+        f"no formato [{{\"icon\": um de {list(ICONES_INSIGHTS)}, \"title\": string curta, \"text\": string}}].\n\n"
+        f"KPIs: {json.dumps(dados.get('kpis'), ensure_ascii=False)}\n"
+        f"Canais: {json.dumps(dados.get('channels'), ensure_ascii=False)}\n"
+        f"Métricas da planilha:\n{resumo}\n"
+    )
+
+
+def _ler_insights(texto: str) -> List[Dict]:
+    inicio, fim = texto.find("["), texto.rfind("]")
+    itens = json.loads(texto[inicio:fim + 1]) if inicio != -1 and fim > inicio else []
+    insights = []
+    for item in itens:
+        if isinstance(item, dict) and item.get("title") and item.get("text"):
+            icone = item.get("icon") if item.get("icon") in ICONES_INSIGHTS else "lightbulb"
+            insights.append({"icon": icone, "title": str(item["title"]), "text": str(item["text"])})
+    return insights
+
+
+def gerar_insights(llm, df: pd.DataFrame, dados: Dict) -> List[Dict]:
+    """Pede ao LLM os insights sobre os números já calculados; recai em ``insights_basicos``."""
+    try:
+        msg = llm.invoke(_prompt_insights(MotorAnalitico(df).como_texto(), dados))
+        return _ler_insights(getattr(msg, "content", str(msg))) or insights_basicos(dados)
+    except Exception as e:
+        print(f"⚠️ Insights do dashboard via LLM indisponíveis: {e}")
+        return insights_basicos(dados)
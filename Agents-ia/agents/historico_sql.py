@@ -0,0 +1,99 @@
+# historico_sql.py
+"""Histórico de conversa em SQL que lê apenas a janela recente.
+
+Substitui o ``SQLChatMessageHistory`` do ``ChatbotEmpresarial``, que criava um
+engine do SQLAlchemy a cada chamada e carregava a sessão inteira para depois
+manter só as últimas mensagens:
+
+- um engine (com pool de conexões) por string de conexão, reutilizado pelo processo;
+- leitura das últimas ``k`` mensagens com ``ORDER BY id DESC LIMIT k`` sobre o
+  índice ``(session_id, id)``;
+- gravação das mensagens de um turno numa única transação (``executemany``);
+- SQLite em modo WAL, para leituras não esperarem pelas gravações.
+
+Usa a mesma tabela (``message_store``) e o mesmo formato JSON do
+``SQLChatMessageHistory``, então bancos existentes continuam válidos.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from sqlalchemy import Column, Index, Integer, MetaData, Table, Text, create_engine, event, select
+from sqlalchemy.engine import Engine
+
+# Mensagens mais recentes da sessão entregues ao modelo
+CHAT_JANELA = int(os.getenv("CHAT_JANELA", "10"))
+
+_metadata = MetaData()
+message_store = Table(
+    "message_store", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("session_id", Text),
+    Column("message", Text),
+)
+_indice_sessao = Index("ix_message_store_session_id_id", message_store.c.session_id, message_store.c.id)
+
+_engines: Dict[str, Engine] = {}
+_lock_engines = threading.Lock()
+
+
+def _configurar_sqlite(dbapi_conn, _registro):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def obter_engine(conexao: str) -> Engine:
+    """Engine compartilhado da string de conexão (criado, com a tabela e o índice, no primeiro uso)."""
+    engine = _engines.get(conexao)
+    if engine is not None:
+        return engine
+    with _lock_engines:
+        engine = _engines.get(conexao)
+        if engine is None:
+            engine = create_engine(conexao, pool_pre_ping=True)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _configurar_sqlite)
+            _metadata.create_all(engine)
+            # Bancos criados pelo SQLChatMessageHistory não têm o índice
+            _indice_sessao.create(engine, checkfirst=True)
+            _engines[conexao] = engine
+    return engine
+
+
+class HistoricoJanelado(BaseChatMessageHistory):
+    """Histórico de uma sessão que expõe só as últimas ``k`` mensagens."""
+
+    def __init__(self, session_id: str, conexao: str, k: int = CHAT_JANELA):
+        self.session_id = session_id
+        self.k = k
+        self.engine = obter_engine(conexao)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        consulta = (
+            select(message_store.c.message)
+            .where(message_store.c.session_id == self.session_id)
+            .order_by(message_store.c.id.desc())
+            .limit(self.k)
+        )
+        with self.engine.connect() as conn:
+            linhas = conn.execute(consulta).scalars().all()
+        return messages_from_dict([json.loads(m) for m in reversed(linhas)])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(message_store.insert(), [
+                {"session_id": self.session_id, "message": json.dumps(message_to_dict(m), ensure_ascii=False)}
+                for m in messages
+            ])
+
+    def clear(self) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(message_store.delete().where(message_store.c.session_id == self.session_id))
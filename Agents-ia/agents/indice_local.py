@@ -0,0 +1,146 @@
+# indice_local.py
+"""Índice vetorial local (em processo) para o RAG, sem depender do Qdrant Cloud.
+
+Usado em dev/CI quando QDRANT_URL/QDRANT_API_KEY não existem e como reserva
+(hot-standby) quando o Qdrant está fora do ar. Guarda em disco:
+
+- ``densos.npy``: matriz float32 (N x D) de embeddings normalizados, aberta com
+  ``mmap_mode='r'`` (o SO carrega só as páginas usadas);
+- ``esparso_*.npy``: índice invertido dos termos BM25 em formato CSR
+  (termos ordenados, offsets, documentos e pesos);
+- ``documentos.jsonl``: texto e metadados de cada trecho.
+
+A busca híbrida segue o Qdrant: ranking denso (cosseno) e esparso (BM25, com o
+mesmo IDF que a coleção aplica via ``modifier=IDF``, ver ``agent_rag``)
+combinados por Reciprocal Rank Fusion. Um corpus vazio gera um índice vazio,
+cujas buscas não retornam nada.
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Iterable, List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+RRF_K = 60
+# Quantos candidatos cada ranking contribui para a fusão, por resultado pedido
+CANDIDATOS_POR_RESULTADO = 10
+
+_ARQUIVOS = ("densos.npy", "esparso_termos.npy", "esparso_offsets.npy",
+             "esparso_docs.npy", "esparso_pesos.npy", "documentos.jsonl")
+
+
+class IndiceLocal:
+    """Índice híbrido (denso + esparso) em disco, com a mesma interface de busca do QdrantVectorStore."""
+
+    def __init__(self, diretorio, embedding, sparse_embedding):
+        self.diretorio = Path(diretorio)
+        self.embedding = embedding
+        self.sparse_embedding = sparse_embedding
+        self.densos = np.load(self.diretorio / "densos.npy", mmap_mode="r")
+        self.termos = np.load(self.diretorio / "esparso_termos.npy")
+        self.offsets = np.load(self.diretorio / "esparso_offsets.npy")
+        self.docs = np.load(self.diretorio / "esparso_docs.npy", mmap_mode="r")
+        self.pesos = np.load(self.diretorio / "esparso_pesos.npy", mmap_mode="r")
+        with open(self.diretorio / "documentos.jsonl", encoding="utf-8") as f:
+            self.documentos = [json.loads(linha) for linha in f]
+        total = len(self.documentos)
+        df = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log(1.0 + (total - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    @staticmethod
+    def existe(diretorio) -> bool:
+        return all((Path(diretorio) / nome).exists() for nome in _ARQUIVOS)
+
+    # --- Construção ---
+    @staticmethod
+    def salvar(diretorio, textos: Sequence[str], metadados: Sequence[dict],
+               densos: Iterable[Sequence[float]], esparsos: Iterable) -> int:
+        """Grava o índice em ``diretorio`` (substituindo o anterior de forma atômica por arquivo)."""
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+
+        matriz = np.asarray(list(densos), dtype=np.float32)
+        if not len(textos) and matriz.size == 0:
+            matriz = np.zeros((0, 0), dtype=np.float32)  # corpus vazio: índice vazio
+        if matriz.ndim != 2 or matriz.shape[0] != len(textos):
+            raise ValueError("Quantidade de vetores densos diferente da de textos.")
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        matriz /= np.where(normas == 0, 1.0, normas)
+
+        # Índice invertido: (termo, doc, peso) ordenado por termo
+        termos, docs, pesos = [], [], []
+        for doc_id, vetor in enumerate(esparsos):
+            termos.extend(vetor.indices)
+            docs.extend([doc_id] * len(vetor.indices))
+            pesos.extend(vetor.values)
+        termos = np.asarray(termos, dtype=np.int64)
+        ordem = np.argsort(termos, kind="stable")
+        termos = termos[ordem]
+        docs_arr = np.asarray(docs, dtype=np.int32)[ordem]
+        pesos_arr = np.asarray(pesos, dtype=np.float32)[ordem]
+        unicos, inicios = np.unique(termos, return_index=True)
+        offsets = np.append(inicios, len(termos)).astype(np.int64)
+
+        arquivos = {
+            "densos.npy": matriz,
+            "esparso_termos.npy": unicos,
+            "esparso_offsets.npy": offsets,
+            "esparso_docs.npy": docs_arr,
+            "esparso_pesos.npy": pesos_arr,
+        }
+        for nome, arr in arquivos.items():
+            tmp = diretorio / f"{nome}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            tmp.replace(diretorio / nome)
+        tmp = diretorio / "documentos.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for texto, meta in zip(textos, metadados):
+                f.write(json.dumps({"page_content": texto, "metadata": meta}, ensure_ascii=False) + "\n")
+        tmp.replace(diretorio / "documentos.jsonl")
+        return len(textos)
+
+    # --- Busca ---
+    def _ranking_denso(self, query: str, limite: int) -> np.ndarray:
+        vetor = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        norma = float(np.linalg.norm(vetor))
+        if norma:
+            vetor /= norma
+        scores = self.densos @ vetor
+        return _top(scores, limite)
+
+    def _ranking_esparso(self, query: str, limite: int) -> np.ndarray:
+        consulta = self.sparse_embedding.embed_query(query)
+        scores = np.zeros(len(self.documentos), dtype=np.float32)
+        for termo, peso in zip(consulta.indices, consulta.values):
+            pos = int(np.searchsorted(self.termos, termo))
+            if pos >= len(self.termos) or self.termos[pos] != termo:
+                continue
+            ini, fim = self.offsets[pos], self.offsets[pos + 1]
+            np.add.at(scores, self.docs[ini:fim], peso * self.idf[pos] * self.pesos[ini:fim])
+        candidatos = _top(scores, limite)
+        return candidatos[scores[candidatos] > 0]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        if not self.documentos:
+            return []
+        limite = max(k * CANDIDATOS_POR_RESULTADO, k)
+        fusao = {}
+        for ranking in (self._ranking_denso(query, limite), self._ranking_esparso(query, limite)):
+            for posicao, doc_id in enumerate(ranking):
+                fusao[int(doc_id)] = fusao.get(int(doc_id), 0.0) + 1.0 / (RRF_K + posicao + 1)
+        melhores = sorted(fusao, key=fusao.get, reverse=True)[:k]
+        return [Document(**self.documentos[i]) for i in melhores]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return await asyncio.to_thread(self.similarity_search, query, k, **kwargs)
+
+
+def _top(scores: np.ndarray, limite: int) -> np.ndarray:
+    limite = min(limite, len(scores))
+    if limite <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidatos = np.argpartition(-scores, limite - 1)[:limite]
+    return candidatos[np.argsort(-scores[candidatos], kind="stable")]
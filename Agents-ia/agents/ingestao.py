@@ -0,0 +1,170 @@
+# ingestao.py
+"""Pipeline de ingestão incremental, paralela e retomável para a base RAG.
+
+Em vez de recriar a coleção e carregar um PDF inteiro na memória, o pipeline:
+
+- aceita vários PDFs e/ou diretórios (busca ``*.pdf`` recursivamente);
+- lê cada PDF página a página e divide em trechos sob demanda (streaming);
+- identifica cada trecho pelo hash SHA-256 de (arquivo, texto): trechos que já
+  estão na coleção são pulados e só os novos ou alterados recebem embeddings;
+- gera embeddings e faz upsert em lotes, em paralelo, com um número limitado de
+  lotes em andamento (memória limitada);
+- remove da coleção os trechos antigos de arquivos que mudaram;
+- grava um checkpoint por arquivo concluído, de modo que uma execução que caiu
+  possa ser retomada sem reprocessar o que já terminou.
+
+A coleção continua servindo consultas durante toda a ingestão.
+"""
+import hashlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+INGESTAO_LOTE = 64           # trechos por lote de embeddings/upsert
+INGESTAO_WORKERS = 4         # lotes processados em paralelo (no máximo o dobro fica em memória)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def iterar_pdfs(caminhos: Iterable) -> Iterator[Path]:
+    """Expande arquivos e diretórios em uma lista ordenada e sem repetição de PDFs."""
+    vistos = set()
+    for caminho in caminhos:
+        caminho = Path(caminho).resolve()
+        arquivos = sorted(caminho.rglob("*.pdf")) if caminho.is_dir() else [caminho]
+        for arquivo in arquivos:
+            if arquivo not in vistos:
+                vistos.add(arquivo)
+                yield arquivo
+
+
+def hash_arquivo(caminho: Path) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def id_trecho(fonte: str, texto: str) -> str:
+    """ID determinístico (UUID) do trecho, derivado do hash do conteúdo."""
+    digest = hashlib.sha256(f"{fonte}\0{texto}".encode("utf-8")).hexdigest()
+    return str(uuid.UUID(digest[:32]))
+
+
+def iterar_trechos(arquivo: Path) -> Iterator[tuple]:
+    """Gera (id, texto, metadados) de um PDF, página a página."""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    fonte = str(arquivo)
+    for pagina in PyPDFLoader(fonte, extract_images=False).lazy_load():
+        for doc in splitter.split_documents([pagina]):
+            doc.metadata["source"] = fonte
+            yield id_trecho(fonte, doc.page_content), doc.page_content, doc.metadata
+
+
+def _lotes(itens: Iterable, tamanho: int) -> Iterator[List]:
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class Checkpoint:
+    """Estado da ingestão por arquivo (hash do conteúdo), gravado de forma atômica em JSON."""
+
+    def __init__(self, caminho: Path):
+        self.caminho = Path(caminho)
+        try:
+            self.dados: Dict[str, str] = json.loads(self.caminho.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.dados = {}
+
+    def concluido(self, arquivo: Path, sha: str) -> bool:
+        return self.dados.get(str(arquivo)) == sha
+
+    def marcar(self, arquivo: Path, sha: str):
+        self.dados[str(arquivo)] = sha
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.caminho.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.dados, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.caminho)
+
+
+class DestinoQdrant:
+    """Operações de escrita na coleção do Qdrant usadas pelo pipeline."""
+
+    def __init__(self, vector_store):
+        self.store = vector_store
+        self.client = vector_store.client
+        self.colecao = vector_store.collection_name
+
+    def existentes(self, ids: Sequence[str]) -> set:
+        pontos = self.client.retrieve(self.colecao, ids=list(ids), with_payload=False, with_vectors=False)
+        return {str(p.id) for p in pontos}
+
+    def inserir(self, ids: Sequence[str], textos: Sequence[str], metadados: Sequence[dict]):
+        # add_texts gera os embeddings (denso + esparso) e faz o upsert
+        self.store.add_texts(list(textos), metadatas=list(metadados), ids=list(ids), batch_size=len(ids))
+
+    def remover_obsoletos(self, fonte: str, ids_validos: Sequence[str]) -> None:
+        from qdrant_client import models
+
+        self.client.delete(
+            collection_name=self.colecao,
+            points_selector=models.FilterSelector(filter=models.Filter(
+                must=[models.FieldCondition(key="metadata.source", match=models.MatchValue(value=fonte))],
+                must_not=[models.HasIdCondition(has_id=list(ids_validos))],
+            )),
+        )
+
+
+def _processar_lote(destino: DestinoQdrant, lote: List[tuple]) -> int:
+    ids = [item[0] for item in lote]
+    ja_existem = destino.existentes(ids)
+    novos = [item for item in lote if item[0] not in ja_existem]
+    if novos:
+        destino.inserir([n[0] for n in novos], [n[1] for n in novos], [n[2] for n in novos])
+    return len(novos)
+
+
+def ingerir(caminhos: Iterable, destino: DestinoQdrant, checkpoint: Checkpoint,
+            lote: int = INGESTAO_LOTE, workers: int = INGESTAO_WORKERS) -> Dict[str, int]:
+    """Ingere os PDFs de forma incremental. Retorna contadores da execução."""
+    stats = {"arquivos": 0, "pulados": 0, "trechos": 0, "inseridos": 0}
+    max_em_andamento = max(workers * 2, 1)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingestao") as pool:
+        for arquivo in iterar_pdfs(caminhos):
+            sha = hash_arquivo(arquivo)
+            if checkpoint.concluido(arquivo, sha):
+                print(f"↷ Sem alterações desde a última ingestão: {arquivo.name}")
+                stats["pulados"] += 1
+                continue
+
+            print(f"Ingerindo '{arquivo}'...")
+            ids_arquivo = []
+            em_andamento = set()
+            for itens in _lotes(iterar_trechos(arquivo), lote):
+                ids_arquivo.extend(item[0] for item in itens)
+                stats["trechos"] += len(itens)
+                # Limita os lotes em memória: espera algum terminar antes de enviar mais
+                if len(em_andamento) >= max_em_andamento:
+                    prontos, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+                    stats["inseridos"] += sum(f.result() for f in prontos)
+                em_andamento.add(pool.submit(_processar_lote, destino, itens))
+            stats["inseridos"] += sum(f.result() for f in em_andamento)
+
+            # Remove trechos de versões anteriores deste arquivo
+            destino.remover_obsoletos(str(arquivo), ids_arquivo)
+            checkpoint.marcar(arquivo, sha)
+            stats["arquivos"] += 1
+            print(f"✅ {arquivo.name}: {len(ids_arquivo)} trechos.")
+    return stats
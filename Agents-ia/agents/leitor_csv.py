@@ -0,0 +1,119 @@
+# leitor_csv.py
+"""Leitura de CSVs para o Analisador de Planilhas.
+
+Exportações brasileiras costumam vir em cp1252, com ``;`` como separador e
+vírgula decimal (``1.234,56``); ler com os padrões do pandas gera uma única
+coluna sem erro nenhum. Aqui o formato é detectado a partir de um pequeno
+trecho do início do arquivo e o arquivo é lido uma única vez:
+
+- codificação (UTF-8 com ou sem BOM, senão cp1252), separador (``csv.Sniffer``
+  com reserva pela contagem por linha), separadores decimal e de milhar;
+- tipos compactos: inteiros reduzidos ao menor tipo que comporta os valores e
+  textos repetitivos convertidos em ``category``; floats com casas decimais
+  ficam em float64 (float32 perderia centavos em somas de valores);
+- arquivos grandes são lidos em blocos (``LEITURA_CHUNK_LINHAS``), compactando
+  cada bloco antes de juntá-los, o que limita o pico de memória.
+"""
+import csv
+import os
+import re
+from typing import Dict, Iterator
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+AMOSTRA_BYTES = 64 * 1024
+LEITURA_CHUNK_BYTES = int(os.getenv("LEITURA_CHUNK_MB", "64")) * 1024 * 1024  # acima disso, lê em blocos
+LEITURA_CHUNK_LINHAS = 200_000
+# Colunas de texto com até esta fração de valores distintos viram "category"
+FRACAO_CATEGORIA = 0.5
+
+_DELIMITADORES = ";,\t|"
+_DECIMAL_VIRGULA = re.compile(r"(?<![\d.,])-?\d{1,3}(?:\.\d{3})*,\d+(?![\d,])")
+_MILHAR_PONTO = re.compile(r"\d{1,3}(?:\.\d{3})+,\d+")
+
+
+def _detectar_codificacao(amostra: bytes) -> str:
+    for codificacao in ("utf-8-sig", "cp1252"):
+        try:
+            amostra.decode(codificacao)
+            return codificacao
+        except UnicodeDecodeError as e:
+            # Caractere multibyte cortado no fim da amostra não conta como erro
+            if codificacao == "utf-8-sig" and e.start >= len(amostra) - 3:
+                return codificacao
+    return "latin-1"
+
+
+def _detectar_separador(texto: str) -> str:
+    linhas = [l for l in texto.splitlines()[:50] if l.strip()]
+    if not linhas:
+        return ","
+    try:
+        return csv.Sniffer().sniff("\n".join(linhas), delimiters=_DELIMITADORES).delimiter
+    except csv.Error:
+        # Escolhe o delimitador que aparece mais vezes, de forma constante, em todas as linhas
+        contagens = {d: [l.count(d) for l in linhas] for d in _DELIMITADORES}
+        candidatos = {d: min(c) for d, c in contagens.items() if min(c) > 0}
+        return max(candidatos, key=candidatos.get) if candidatos else ","
+
+
+def detectar_formato(caminho: str, amostra_bytes: int = AMOSTRA_BYTES) -> Dict[str, str]:
+    """Detecta codificação, separador e separadores decimal/milhar pelo início do arquivo."""
+    with open(caminho, "rb") as f:
+        amostra = f.read(amostra_bytes)
+    codificacao = _detectar_codificacao(amostra)
+    texto = amostra.decode(codificacao, errors="ignore")
+    sep = _detectar_separador(texto)
+    formato = {"encoding": codificacao, "sep": sep, "decimal": ".", "thousands": None}
+    if sep != "," and _DECIMAL_VIRGULA.search(texto):
+        formato["decimal"] = ","
+        if _MILHAR_PONTO.search(texto):
+            formato["thousands"] = "."
+    return formato
+
+
+def otimizar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduz o uso de memória do DataFrame sem perder informação."""
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_integer_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            df[coluna] = pd.to_numeric(serie, downcast="integer")
+        elif pd.api.types.is_float_dtype(serie):
+            # Floats sem parte fracionária e sem nulos são inteiros lidos como float
+            if len(serie) and serie.notna().all() and (serie % 1 == 0).all():
+                df[coluna] = pd.to_numeric(serie.astype("int64"), downcast="integer")
+        elif serie.dtype == object or pd.api.types.is_string_dtype(serie):
+            if len(serie) and serie.nunique(dropna=True) <= FRACAO_CATEGORIA * len(serie):
+                df[coluna] = serie.astype("category")
+    return df
+
+
+def iterar_csv(caminho: str, chunksize: int = LEITURA_CHUNK_LINHAS, formato: Dict = None) -> Iterator[pd.DataFrame]:
+    """Lê o CSV em blocos de ``chunksize`` linhas, já com os tipos compactados."""
+    formato = formato or detectar_formato(caminho)
+    with pd.read_csv(caminho, chunksize=chunksize, **formato) as leitor:
+        for bloco in leitor:
+            yield otimizar_tipos(bloco)
+
+
+def _concatenar(blocos) -> pd.DataFrame:
+    """Junta blocos preservando colunas ``category`` (com a união das categorias)."""
+    if len(blocos) == 1:
+        return blocos[0]
+    categoricas = {}
+    for coluna in blocos[0].columns:
+        if all(isinstance(b[coluna].dtype, pd.CategoricalDtype) for b in blocos):
+            categoricas[coluna] = union_categoricals([b[coluna] for b in blocos], ignore_order=True)
+    df = pd.concat(blocos, ignore_index=True)
+    for coluna, valores in categoricas.items():
+        df[coluna] = pd.Categorical(valores)
+    return otimizar_tipos(df)
+
+
+def ler_csv(caminho: str) -> pd.DataFrame:
+    """Lê o CSV inteiro uma única vez, detectando o formato e compactando os tipos."""
+    formato = detectar_formato(caminho)
+    if os.path.getsize(caminho) <= LEITURA_CHUNK_BYTES:
+        return otimizar_tipos(pd.read_csv(caminho, low_memory=False, **formato))
+    return _concatenar(list(iterar_csv(caminho, formato=formato)))
@@ -1,5 +1,6 @@
 from typing import List, TypedDict, Annotated
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 import operator
 
 # LangGraph
@@ -10,7 +11,12 @@ from dotenv import load_dotenv
 
 # Componentes do nosso sistema
 from agent_roteador import criar_agente_roteador
-from agent_estrategista import criar_cadeia_estrategista
+from agent_estrategista import criar_cadeia_estrategista, tokens_fixos_estrategista
+from agente_dados import criar_llm_dados
+from runnables_registry import registry
+from metricas import DURACAO_NO, cronometrar
+from orcamento_prompt import ajustar_entrada_estrategista
+from cache_llm import astream_com_cache
 
 load_dotenv()
 
@@ -19,6 +25,8 @@ load_dotenv()
 
 class AgentState(TypedDict):
     input: str
+    # Entrada "caminho;pergunta" do Analisador de Planilhas, já validada por quem monta o estado
+    entrada_planilha: str
     chat_history: Annotated[List[BaseMessage], operator.add]
     # Resultados das ferramentas
     dados_pesquisa: str
@@ -30,36 +38,58 @@ class AgentState(TypedDict):
 # 2. Defina os nós do grafo (agentes)
 
 
-def node_roteador(state: AgentState) -> AgentState:
-    """Invoca o roteador para executar uma ferramenta e atualiza o estado."""
-    print("--- NÓ ROTEADOR ---")
-    roteador = criar_agente_roteador()
-    resultado_roteador = roteador.invoke({"input": state["input"]})
+# Campo do estado que recebe o resultado de cada ferramenta
+CAMPO_POR_FERRAMENTA = {
+    "ferramenta_pesquisa": "dados_pesquisa",
+    "consultor_inflacao_ipca": "dados_api",
+    "Analisador_de_Planilhas": "dados_planilha",
+}
+
+
+def _aplicar_resultado_roteador(state: AgentState, resultado_roteador) -> dict:
+    """Junta os resultados de todas as ferramentas executadas e retorna a atualização do estado.
 
-    if 'intermediate_steps' in resultado_roteador and resultado_roteador['intermediate_steps']:
-        passo_intermediario = resultado_roteador['intermediate_steps'][0]
-        nome_ferramenta = passo_intermediario[0].tool
-        resultado_ferramenta = str(passo_intermediario[1])
+    Retorna apenas os campos alterados: devolver o estado inteiro faria o LangGraph
+    concatenar ``chat_history`` consigo mesmo (reducer ``operator.add``)."""
+    coletados = {}
+    for acao, resultado in resultado_roteador.get('intermediate_steps') or []:
+        nome_ferramenta = acao.tool
+        resultado_ferramenta = str(resultado)
 
         print(f"Ferramenta executada: {nome_ferramenta}")
         print(f"Resultado: {resultado_ferramenta}")
 
         # --- LÓGICA DE ATUALIZAÇÃO DO ESTADO ---
-        if nome_ferramenta == "ferramenta_pesquisa":
-            state['dados_pesquisa'] = resultado_ferramenta
-        elif nome_ferramenta == "consultor_inflacao_ipca":
-            state['dados_api'] = resultado_ferramenta
-        elif nome_ferramenta == "Analisador_de_Planilhas":
-            state['dados_planilha'] = resultado_ferramenta
+        campo = CAMPO_POR_FERRAMENTA.get(nome_ferramenta)
+        if campo:
+            coletados.setdefault(campo, []).append(resultado_ferramenta)
 
-    return state
+    return {campo: "\n\n".join(valores) for campo, valores in coletados.items()}
 
 
-def node_estrategista(state: AgentState) -> AgentState:
-    """Invoca o estrategista para gerar a resposta final com base no estado."""
-    print("--- NÓ ESTRATEGISTA ---")
-    estrategista = criar_cadeia_estrategista()
+def _entrada_roteador(state: AgentState) -> dict:
+    return {"input": state["input"], "planilha": state.get("entrada_planilha") or None}
+
 
+@cronometrar(DURACAO_NO, no="roteador")
+def node_roteador(state: AgentState) -> dict:
+    """Invoca o roteador para executar uma ferramenta e atualiza o estado."""
+    print("--- NÓ ROTEADOR ---")
+    roteador = registry.get("roteador")
+    resultado_roteador = roteador.invoke(_entrada_roteador(state))
+    return _aplicar_resultado_roteador(state, resultado_roteador)
+
+
+@cronometrar(DURACAO_NO, no="roteador")
+async def anode_roteador(state: AgentState) -> dict:
+    """Versão assíncrona do nó roteador (usada por ``ainvoke``)."""
+    print("--- NÓ ROTEADOR (async) ---")
+    roteador = registry.get("roteador")
+    resultado_roteador = await roteador.ainvoke(_entrada_roteador(state))
+    return _aplicar_resultado_roteador(state, resultado_roteador)
+
+
+def _entrada_estrategista(state: AgentState) -> dict:
     consulta_cliente = state.get("input", "")
     dados_pesquisa = state.get(
         "dados_pesquisa", "Nenhuma pesquisa sobre o tema foi realizada.")
@@ -69,29 +99,71 @@ def node_estrategista(state: AgentState) -> AgentState:
         "dados_planilha", "Nenhuma planilha foi fornecida para análise.")
     chat_history = state.get("chat_history", [])
 
-    solucao_final = estrategista.invoke({
+    # Cada seção dentro do seu orçamento de tokens (ver orcamento_prompt)
+    return ajustar_entrada_estrategista({
         "consulta_cliente": consulta_cliente,
         "dados_pesquisa": dados_pesquisa,
         "dados_api": dados_api,
         "dados_planilha": dados_planilha,
         "chat_history": chat_history,
-    })
-    state['resposta_final'] = getattr(solucao_final, 'content', str(solucao_final))
-    return state
+    }, fixo=tokens_fixos_estrategista())
+
+
+@cronometrar(DURACAO_NO, no="estrategista")
+def node_estrategista(state: AgentState) -> dict:
+    """Invoca o estrategista para gerar a resposta final com base no estado."""
+    print("--- NÓ ESTRATEGISTA ---")
+    estrategista = registry.get("estrategista")
+    solucao_final = estrategista.invoke(_entrada_estrategista(state))
+    return {'resposta_final': getattr(solucao_final, 'content', str(solucao_final))}
+
+
+@cronometrar(DURACAO_NO, no="estrategista")
+async def anode_estrategista(state: AgentState) -> dict:
+    """Versão assíncrona do nó estrategista (usada por ``ainvoke``)."""
+    print("--- NÓ ESTRATEGISTA (async) ---")
+    estrategista = registry.get("estrategista")
+    solucao_final = await estrategista.ainvoke(_entrada_estrategista(state))
+    return {'resposta_final': getattr(solucao_final, 'content', str(solucao_final))}
+
+
+@cronometrar(DURACAO_NO, no="estrategista")
+async def astream_estrategista(state: AgentState):
+    """Gera a resposta do estrategista token a token (``astream`` do LLM, com o cache de respostas)."""
+    print("--- NÓ ESTRATEGISTA (stream) ---")
+    estrategista = registry.get("estrategista")
+    async for texto in astream_com_cache(estrategista, _entrada_estrategista(state)):
+        yield texto
 
 
 # 3. Construa o grafo e exponha um factory para uso programático
 
-def get_graph_app():
+def _compilar_grafo():
     workflow = StateGraph(AgentState)
-    workflow.add_node("roteador", node_roteador)
-    workflow.add_node("estrategista", node_estrategista)
+    # Cada nó tem versão síncrona (invoke) e assíncrona (ainvoke)
+    workflow.add_node("roteador", RunnableLambda(node_roteador, afunc=anode_roteador))
+    workflow.add_node("estrategista", RunnableLambda(node_estrategista, afunc=anode_estrategista))
     workflow.set_entry_point("roteador")
     workflow.add_edge("roteador", "estrategista")
     workflow.add_edge("estrategista", END)
     return workflow.compile()
 
 
+def registrar_runnables():
+    """Registra as factories dos runnables compartilhados (construídos sob demanda, uma vez).
+    Factories já registradas (ex.: substituídas em testes) são preservadas."""
+    registry.register("roteador", criar_agente_roteador, replace=False)
+    registry.register("estrategista", criar_cadeia_estrategista, replace=False)
+    registry.register("llm_dados", criar_llm_dados, replace=False)
+    registry.register("grafo", _compilar_grafo, replace=False)
+
+
+def get_graph_app():
+    """Retorna o grafo compilado, reutilizado entre invocações."""
+    registrar_runnables()
+    return registry.get("grafo")
+
+
 # CLI interativo apenas quando executado diretamente
 if __name__ == "__main__":
     app = get_graph_app()
@@ -101,19 +173,17 @@ if __name__ == "__main__":
     caminho_arquivo = input(
         "Você gostaria de anexar um arquivo de dados (CSV/Excel) para análise? Se sim, digite o caminho do arquivo. Se não, apenas pressione Enter: ")
 
-    entrada_para_roteador = consulta_texto
+    entrada_planilha = ""
 
     if caminho_arquivo:
         pergunta_sobre_arquivo = input(
             f"Qual pergunta você gostaria de fazer sobre o arquivo '{caminho_arquivo}'? ")
-        entrada_para_roteador += (
-            f"\n\nAdicionalmente, use a ferramenta Analisador_de_Planilhas com a seguinte entrada: "
-            f"'{caminho_arquivo};{pergunta_sobre_arquivo}'"
-        )
+        entrada_planilha = f"{caminho_arquivo};{pergunta_sobre_arquivo}"
 
     print("\nIniciando fluxo de execução...")
     final_state = app.invoke({
-        "input": entrada_para_roteador,
+        "input": consulta_texto,
+        "entrada_planilha": entrada_planilha,
         "chat_history": [],
         "dados_pesquisa": "",
         "dados_api": "",
@@ -0,0 +1,267 @@
+# metricas.py
+"""Métricas do processo no formato de exposição de texto do Prometheus.
+
+Registro mínimo em memória (sem dependências nem serviços externos): contadores,
+histogramas com rótulos e coletores chamados na hora da exposição (usados para
+os acertos/faltas dos caches). ``cronometrar`` mede nós do grafo e ferramentas
+(funções síncronas, assíncronas e geradores assíncronos) e ``contador_tokens``
+é um callback do LangChain que soma os tokens de cada chamada ao LLM.
+
+Os valores são por processo: com vários workers, cada um expõe os seus e o
+Prometheus agrega.
+"""
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: Sequence[str], valores: Sequence, extra: Tuple = ()) -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos: Dict) -> Tuple:
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"Métrica '{self.nome}' espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}")
+        return tuple(str(rotulos[n]) for n in self.rotulos)
+
+    def cabecalho(self) -> List[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        return self._valores.get(self._chave(rotulos), 0)
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_numero(v)}" for chave, v in itens]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), buckets: Iterable[float] = BUCKETS_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple, list] = {}  # chave -> [contagens por bucket, soma, total]
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def contagem(self, **rotulos) -> int:
+        serie = self._series.get(self._chave(rotulos))
+        return serie[2] if serie else 0
+
+    def linhas(self) -> List[str]:
+        with self._lock:
+            itens = sorted((chave, [list(s[0]), s[1], s[2]]) for chave, s in self._series.items())
+        linhas = []
+        for chave, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, n in zip(self.buckets, contagens):
+                acumulado += n
+                rotulos = _formatar_rotulos(self.rotulos, chave, (("le", _numero(limite)),))
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto das métricas do processo e dos coletores de valores externos."""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._coletores: Dict[str, Tuple[str, str, Sequence[str], Callable]] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            # Reimportar o módulo que declara a métrica reaproveita a existente
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   buckets: Iterable[float] = BUCKETS_PADRAO) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def coletor(self, nome: str, ajuda: str, tipo: str, rotulos: Sequence[str],
+                funcao: Callable[[], Iterable[Tuple[Sequence, float]]]):
+        """Métrica lida na hora da exposição: ``funcao`` retorna pares (valores dos rótulos, valor).
+        Chamar de novo com o mesmo nome substitui a função (útil para acrescentar fontes)."""
+        with self._lock:
+            self._coletores[nome] = (ajuda, tipo, tuple(rotulos), funcao)
+
+    def expor(self) -> str:
+        linhas = []
+        with self._lock:
+            metricas = list(self._metricas.values())
+            coletores = list(self._coletores.items())
+        for metrica in metricas:
+            linhas += metrica.cabecalho() + metrica.linhas()
+        for nome, (ajuda, tipo, rotulos, funcao) in coletores:
+            try:
+                amostras = list(funcao())
+            except Exception as e:
+                print(f"⚠️ Coletor de métricas '{nome}' falhou: {e}")
+                continue
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+            linhas += [f"{nome}{_formatar_rotulos(rotulos, valores)} {_numero(v)}" for valores, v in amostras]
+        return "\n".join(linhas) + "\n"
+
+
+# Instância compartilhada pelo processo
+registro_metricas = RegistroMetricas()
+
+DURACAO_NO = registro_metricas.histograma(
+    "marttin_graph_node_seconds", "Duração dos nós do grafo de agentes.", ("no",))
+DURACAO_FERRAMENTA = registro_metricas.histograma(
+    "marttin_tool_seconds", "Duração das ferramentas chamadas pelo roteador.", ("ferramenta",))
+CHAMADAS_LLM = registro_metricas.contador(
+    "marttin_llm_requests_total", "Chamadas ao LLM.", ("modelo",))
+TOKENS_LLM = registro_metricas.contador(
+    "marttin_llm_tokens_total", "Tokens consumidos nas chamadas ao LLM.", ("modelo", "tipo"))
+
+# Fontes dos acertos/faltas de cache: nome do cache -> função que retorna {resultado: contagem}
+_FONTES_CACHE: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+
+def registrar_cache(nome: str, contagens: Callable[[], Dict[str, float]]):
+    """Expõe os acertos/faltas de um cache em ``marttin_cache_requests_total``."""
+    _FONTES_CACHE[nome] = contagens
+
+
+def _amostras_cache():
+    for nome, contagens in list(_FONTES_CACHE.items()):
+        for resultado, valor in contagens().items():
+            yield (nome, resultado), valor
+
+
+registro_metricas.coletor(
+    "marttin_cache_requests_total", "Consultas aos caches por resultado (hit/miss).", "counter",
+    ("cache", "resultado"), _amostras_cache)
+
+
+def cronometrar(histograma: Histograma, **rotulos):
+    """Decorador que observa a duração da função (sync, async ou gerador async) em ``histograma``."""
+    def decorador(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def gerador(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                finally:
+                    histograma.observar(time.perf_counter() - inicio, **rotulos)
+            return gerador
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def assincrona(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histograma.observar(time.perf_counter() - inicio, **rotulos)
+            return assincrona
+
+        @functools.wraps(func)
+        def sincrona(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histograma.observar(time.perf_counter() - inicio, **rotulos)
+        return sincrona
+    return decorador
+
+
+class ContadorTokens(BaseCallbackHandler):
+    """Callback do LangChain que soma chamadas e tokens (entrada/saída) por modelo."""
+
+    @staticmethod
+    def _uso(response) -> Tuple[Optional[str], int, int]:
+        saida = response.llm_output or {}
+        modelo = saida.get("model_name")
+        entrada = total_saida = 0
+        for geracoes in response.generations:
+            for geracao in geracoes:
+                mensagem = getattr(geracao, "message", None)
+                uso = getattr(mensagem, "usage_metadata", None)
+                if uso:
+                    entrada += uso.get("input_tokens", 0)
+                    total_saida += uso.get("output_tokens", 0)
+                modelo = modelo or (getattr(mensagem, "response_metadata", None) or {}).get("model_name")
+        if not (entrada or total_saida):
+            uso = saida.get("token_usage") or {}
+            entrada, total_saida = uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0)
+        return modelo, entrada, total_saida
+
+    def on_llm_end(self, response, **kwargs):
+        from cache_llm import veio_do_cache
+
+        mensagens = [getattr(g, "message", None) for geracoes in response.generations for g in geracoes]
+        if mensagens and all(veio_do_cache(m) for m in mensagens):
+            return  # resposta do cache: nada foi consumido do provedor
+        modelo, entrada, saida = self._uso(response)
+        modelo = modelo or "desconhecido"
+        CHAMADAS_LLM.inc(modelo=modelo)
+        if entrada:
+            TOKENS_LLM.inc(entrada, modelo=modelo, tipo="entrada")
+        if saida:
+            TOKENS_LLM.inc(saida, modelo=modelo, tipo="saida")
+
+
+contador_tokens = ContadorTokens()
@@ -0,0 +1,163 @@
+# orcamento_prompt.py
+"""Orçamento de tokens das seções dos prompts (estrategista e agente de dados).
+
+Os tokens são contados localmente: com ``PROMPT_TOKENIZER`` (caminho de um
+``tokenizer.json`` ou nome de um modelo no Hugging Face Hub) e o pacote
+``tokenizers`` instalado, usa o tokenizador do modelo; sem eles, uma estimativa
+por pedaços de palavra, próxima do BPE do Llama para textos em português.
+
+No estrategista cada seção tem um teto próprio e, se o total ainda passar do
+orçamento, as seções são reduzidas por prioridade: primeiro o histórico
+(mensagens mais antigas), depois os trechos extras da pesquisa e, por último,
+o corte do texto. No contexto da planilha do agente de dados saem primeiro as
+linhas de amostra (ver ``AgenteDados._construir_contexto``).
+"""
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from metricas import registro_metricas
+
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+# Orçamento das seções variáveis do prompt do estrategista (o texto fixo do prompt é descontado)
+PROMPT_ORCAMENTO_ESTRATEGISTA = int(os.getenv("PROMPT_ORCAMENTO_ESTRATEGISTA", "6000"))
+# Orçamento do contexto da planilha enviado ao agente de dados
+PROMPT_ORCAMENTO_DADOS = int(os.getenv("PROMPT_ORCAMENTO_DADOS", "3000"))
+
+# Teto de cada seção do estrategista, em tokens
+LIMITES_ESTRATEGISTA = {
+    "consulta_cliente": 1000,
+    "chat_history": 1500,
+    "dados_pesquisa": 1500,
+    "dados_planilha": 1500,
+    "dados_api": 300,
+}
+SEPARADOR_TRECHOS = "\n\n---\n\n"  # entre os trechos de ferramenta_pesquisa
+MARCA_CORTE = "\n[...]"
+
+TOKENS_PROMPT = registro_metricas.histograma(
+    "marttin_prompt_tokens", "Tokens estimados das seções variáveis de cada prompt, após o ajuste.", ("prompt",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+
+_PEDACOS = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_tokenizador = None
+_tokenizador_carregado = False
+_lock_tokenizador = threading.Lock()
+
+
+def _obter_tokenizador():
+    global _tokenizador, _tokenizador_carregado
+    if _tokenizador_carregado:
+        return _tokenizador
+    with _lock_tokenizador:
+        if not _tokenizador_carregado:
+            if PROMPT_TOKENIZER:
+                try:
+                    from tokenizers import Tokenizer
+
+                    if os.path.isfile(PROMPT_TOKENIZER):
+                        _tokenizador = Tokenizer.from_file(PROMPT_TOKENIZER)
+                    else:
+                        _tokenizador = Tokenizer.from_pretrained(PROMPT_TOKENIZER)
+                except Exception as e:
+                    print(f"⚠️ Tokenizador '{PROMPT_TOKENIZER}' indisponível ({e}); usando estimativa.")
+            _tokenizador_carregado = True
+    return _tokenizador
+
+
+def contar_tokens(texto: str) -> int:
+    if not texto:
+        return 0
+    tokenizador = _obter_tokenizador()
+    if tokenizador is not None:
+        return len(tokenizador.encode(texto, add_special_tokens=False).ids)
+    # Estimativa: palavras longas viram vários tokens; pontuação conta um token cada
+    return sum(math.ceil(len(p) / 4) for p in _PEDACOS.findall(texto))
+
+
+def tokens_mensagens(mensagens: Sequence[BaseMessage]) -> int:
+    # ~4 tokens de formatação por mensagem do chat
+    return sum(contar_tokens(str(m.content)) + 4 for m in mensagens)
+
+
+def cortar(texto: str, max_tokens: int) -> str:
+    """Mantém o começo do texto até ``max_tokens``."""
+    total = contar_tokens(texto)
+    if total <= max_tokens:
+        return texto
+    # A marca de corte também conta
+    max_tokens -= contar_tokens(MARCA_CORTE)
+    if max_tokens <= 0:
+        return ""
+    # Proporção de caracteres, refinada até caber
+    limite = int(len(texto) * max_tokens / total)
+    while limite > 0 and contar_tokens(texto[:limite]) > max_tokens:
+        limite = int(limite * 0.9)
+    return texto[:limite].rstrip() + MARCA_CORTE
+
+
+def podar_historico(mensagens: Sequence[BaseMessage], max_tokens: int) -> List[BaseMessage]:
+    """Descarta as mensagens mais antigas até caber; o resumo (``SystemMessage``) sai por último."""
+    mensagens = list(mensagens)
+    while mensagens and tokens_mensagens(mensagens) > max_tokens:
+        antigas = [i for i, m in enumerate(mensagens) if not isinstance(m, SystemMessage)]
+        mensagens.pop(antigas[0] if antigas else 0)
+    return mensagens
+
+
+def podar_trechos(texto: str, max_tokens: int, separador: str = SEPARADOR_TRECHOS, minimo: int = 1) -> str:
+    """Descarta os últimos trechos (os menos relevantes) até caber, mantendo pelo menos ``minimo``."""
+    trechos = texto.split(separador)
+    while len(trechos) > minimo and contar_tokens(separador.join(trechos)) > max_tokens:
+        trechos.pop()
+    return separador.join(trechos)
+
+
+def _tamanhos(entrada: Dict) -> Dict[str, int]:
+    return {
+        chave: tokens_mensagens(valor) if chave == "chat_history" else contar_tokens(valor or "")
+        for chave, valor in entrada.items() if chave in LIMITES_ESTRATEGISTA
+    }
+
+
+def ajustar_entrada_estrategista(entrada: Dict, orcamento: int = PROMPT_ORCAMENTO_ESTRATEGISTA,
+                                 fixo: int = 0, limites: Optional[Dict[str, int]] = None) -> Dict:
+    """Aplica o teto de cada seção e, se ainda passar de ``orcamento - fixo``, reduz por prioridade."""
+    limites = {**LIMITES_ESTRATEGISTA, **(limites or {})}
+    entrada = dict(entrada)
+    antes = sum(_tamanhos(entrada).values())
+
+    # 1. Teto de cada seção
+    entrada["chat_history"] = podar_historico(entrada.get("chat_history") or [], limites["chat_history"])
+    entrada["dados_pesquisa"] = cortar(
+        podar_trechos(entrada.get("dados_pesquisa") or "", limites["dados_pesquisa"]), limites["dados_pesquisa"])
+    for chave in ("consulta_cliente", "dados_planilha", "dados_api"):
+        entrada[chave] = cortar(entrada.get(chave) or "", limites[chave])
+
+    # 2. Acima do orçamento total: histórico, trechos extras da pesquisa e, por fim, corte do texto
+    disponivel = orcamento - fixo
+    excesso = sum(_tamanhos(entrada).values()) - disponivel
+    if excesso > 0:
+        historico = tokens_mensagens(entrada["chat_history"])
+        entrada["chat_history"] = podar_historico(entrada["chat_history"], max(0, historico - excesso))
+        excesso = sum(_tamanhos(entrada).values()) - disponivel
+    if excesso > 0:
+        pesquisa = contar_tokens(entrada["dados_pesquisa"])
+        entrada["dados_pesquisa"] = podar_trechos(entrada["dados_pesquisa"], max(0, pesquisa - excesso))
+        excesso = sum(_tamanhos(entrada).values()) - disponivel
+    for chave in ("dados_planilha", "dados_pesquisa", "dados_api"):
+        if excesso <= 0:
+            break
+        atual = contar_tokens(entrada[chave])
+        entrada[chave] = cortar(entrada[chave], max(0, atual - excesso))
+        excesso = sum(_tamanhos(entrada).values()) - disponivel
+
+    depois = sum(_tamanhos(entrada).values())
+    TOKENS_PROMPT.observar(depois, prompt="estrategista")
+    if depois < antes:
+        print(f"✂️ Prompt do estrategista ajustado: {antes} -> {depois} tokens (orçamento {disponivel}).")
+    return entrada
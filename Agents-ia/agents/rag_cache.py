@@ -0,0 +1,170 @@
+# rag_cache.py
+"""Cache dos resultados de recuperação do RAG (ferramenta_pesquisa).
+
+A coleção ``documentos_marketing`` só muda quando ``executar_ingestao`` roda, então
+os trechos recuperados para uma mesma pergunta podem ser reaproveitados:
+
+- busca exata pela consulta normalizada (minúsculas, espaços colapsados);
+- busca opcional por quase-duplicatas, comparando o embedding denso da consulta
+  com os já cacheados (similaridade de cosseno >= ``RAG_CACHE_SIMILARIDADE``);
+- expiração por TTL e descarte LRU;
+- resultados vazios não são guardados, então a busca volta ao Qdrant na consulta seguinte;
+- invalidação automática: cada ingestão grava uma nova versão da coleção em
+  ``RAG_VERSAO_ARQUIVO`` e entradas de outra versão são descartadas.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from metricas import registrar_cache
+
+CURRENT_DIR = Path(__file__).resolve().parent  # Agents-ia/agents
+
+RAG_CACHE_TAMANHO = int(os.getenv("RAG_CACHE_TAMANHO", "512"))
+RAG_CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", "86400"))  # segundos
+# 0 desativa a busca por quase-duplicatas
+RAG_CACHE_SIMILARIDADE = float(os.getenv("RAG_CACHE_SIMILARIDADE", "0"))
+RAG_VERSAO_ARQUIVO = Path(os.getenv("RAG_VERSAO_ARQUIVO", str(CURRENT_DIR.parent / "documentos_marketing" / ".versao_colecao")))
+# Intervalo mínimo entre leituras do arquivo de versão
+_VERSAO_RECHECK_SEGUNDOS = 5.0
+
+_lock_versao = threading.Lock()
+_versao_cache = (None, 0.0)  # (versão, lida_em)
+
+
+def versao_colecao() -> str:
+    """Versão atual da coleção RAG (relida do disco no máximo a cada poucos segundos)."""
+    global _versao_cache
+    versao, lida_em = _versao_cache
+    agora = time.monotonic()
+    if versao is not None and agora - lida_em < _VERSAO_RECHECK_SEGUNDOS:
+        return versao
+    try:
+        versao = RAG_VERSAO_ARQUIVO.read_text(encoding="utf-8").strip() or "0"
+    except OSError:
+        versao = "0"
+    with _lock_versao:
+        _versao_cache = (versao, agora)
+    return versao
+
+
+def registrar_nova_versao() -> str:
+    """Marca a coleção como alterada (chamado ao fim de cada ingestão)."""
+    global _versao_cache
+    versao = str(time.time_ns())
+    RAG_VERSAO_ARQUIVO.parent.mkdir(parents=True, exist_ok=True)
+    RAG_VERSAO_ARQUIVO.write_text(versao, encoding="utf-8")
+    with _lock_versao:
+        _versao_cache = (versao, time.monotonic())
+    return versao
+
+
+def normalizar_consulta(query: str) -> str:
+    s = unicodedata.normalize("NFKC", query or "").lower()
+    s = re.sub(r"\s+", " ", s).strip()
+    return s.rstrip(" ?!.")
+
+
+class CacheRecuperacao:
+    """Cache LRU com TTL dos trechos recuperados, invalidado pela versão da coleção."""
+
+    def __init__(self, tamanho: int = RAG_CACHE_TAMANHO, ttl: float = RAG_CACHE_TTL,
+                 similaridade: float = RAG_CACHE_SIMILARIDADE):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.similaridade = similaridade
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (criado_em, trechos, vetor)
+        self._versao: Optional[str] = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.acertos_similares = 0
+        self.faltas = 0
+
+    @property
+    def usa_similaridade(self) -> bool:
+        return self.similaridade > 0
+
+    def obter(self, query: str) -> Optional[List[str]]:
+        """Busca exata pela consulta normalizada."""
+        chave = normalizar_consulta(query)
+        with self._lock:
+            self._verificar_versao()
+            entrada = self._entradas.get(chave)
+            if entrada is not None and not self._expirada(entrada):
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._entradas[chave]
+            if not self.usa_similaridade:
+                self.faltas += 1
+        return None
+
+    def obter_similar(self, vetor: Sequence[float]) -> Optional[List[str]]:
+        """Busca a entrada mais parecida pelo embedding da consulta (se habilitado)."""
+        if not self.usa_similaridade:
+            return None
+        alvo = _normalizar_vetor(vetor)
+        with self._lock:
+            self._verificar_versao()
+            melhor, melhor_score = None, self.similaridade
+            for chave, entrada in self._entradas.items():
+                if entrada[2] is None or self._expirada(entrada):
+                    continue
+                score = float(np.dot(alvo, entrada[2]))
+                if score >= melhor_score:
+                    melhor, melhor_score = chave, score
+            if melhor is None:
+                self.faltas += 1
+                return None
+            self._entradas.move_to_end(melhor)
+            self.acertos_similares += 1
+            return self._entradas[melhor][1]
+
+    def guardar(self, query: str, trechos: List[str], vetor: Optional[Sequence[float]] = None):
+        if not trechos:
+            # Coleção vazia ou fora do ar: não guarda "sem contexto" para a consulta (nem para as parecidas)
+            return
+        chave = normalizar_consulta(query)
+        vetor_norm = _normalizar_vetor(vetor) if vetor is not None and self.usa_similaridade else None
+        with self._lock:
+            self._verificar_versao()
+            self._entradas[chave] = (time.monotonic(), list(trechos), vetor_norm)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def _expirada(self, entrada) -> bool:
+        return self.ttl > 0 and time.monotonic() - entrada[0] > self.ttl
+
+    def _verificar_versao(self):
+        versao = versao_colecao()
+        if versao != self._versao:
+            self._entradas.clear()
+            self._versao = versao
+
+
+def _normalizar_vetor(vetor: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(vetor, dtype=np.float32)
+    norma = float(np.linalg.norm(arr))
+    return arr / norma if norma else arr
+
+
+# Instância compartilhada pelo processo
+cache_recuperacao = CacheRecuperacao()
+registrar_cache("rag", lambda: {
+    "hit": cache_recuperacao.acertos,
+    "hit_similar": cache_recuperacao.acertos_similares,
+    "miss": cache_recuperacao.faltas,
+})
@@ -0,0 +1,142 @@
+# rag_embeddings.py
+"""Serviço de embeddings das consultas do RAG.
+
+O QdrantVectorStore codifica cada consulta na thread da requisição, uma de cada
+vez. Este serviço fica entre o vector store e os modelos:
+
+- memoiza (texto -> vetor denso / vetor esparso) num LRU limitado;
+- agrupa as consultas densas que chegam ao mesmo tempo em micro-lotes
+  (até ``EMBED_LOTE_MAX`` textos, esperando no máximo ``EMBED_ESPERA_MAX_MS``),
+  pois o sentence-transformers em CPU é bem mais eficiente em lote.
+
+O modelo esparso (BM25) é só tokenização e não se beneficia de lote: apenas é
+memoizado. ``embed_documents`` (ingestão) vai direto para os modelos.
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, List
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_LOTE_MAX = int(os.getenv("EMBED_LOTE_MAX", "32"))
+EMBED_ESPERA_MAX_MS = float(os.getenv("EMBED_ESPERA_MAX_MS", "10"))
+EMBED_CACHE_TAMANHO = int(os.getenv("EMBED_CACHE_TAMANHO", "2048"))
+
+
+class _LRU:
+    def __init__(self, tamanho: int):
+        self.tamanho = tamanho
+        self._dados: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str):
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is not None:
+                self._dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave: str, valor):
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho:
+                self._dados.popitem(last=False)
+
+
+class ServicoEmbeddings:
+    """Agrupa e memoiza as consultas aos modelos denso e esparso."""
+
+    def __init__(self, denso: Embeddings, esparso, lote_max: int = EMBED_LOTE_MAX,
+                 espera_max_ms: float = EMBED_ESPERA_MAX_MS, tamanho_cache: int = EMBED_CACHE_TAMANHO):
+        self.denso = denso
+        self.esparso = esparso
+        self.lote_max = lote_max
+        self.espera_max = espera_max_ms / 1000.0
+        self._cache_denso = _LRU(tamanho_cache)
+        self._cache_esparso = _LRU(tamanho_cache)
+        self._fila: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def vetor_denso(self, texto: str) -> List[float]:
+        vetor = self._cache_denso.obter(texto)
+        if vetor is not None:
+            return vetor
+        futuro: Future = Future()
+        self._iniciar_worker()
+        self._fila.put((texto, futuro))
+        return futuro.result()
+
+    def vetor_esparso(self, texto: str):
+        vetor = self._cache_esparso.obter(texto)
+        if vetor is None:
+            vetor = self.esparso.embed_query(texto)
+            self._cache_esparso.guardar(texto, vetor)
+        return vetor
+
+    def _iniciar_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name="rag-embeddings", daemon=True)
+                self._worker.start()
+
+    def _loop(self):
+        while True:
+            lote = [self._fila.get()]
+            # Junta o que chegar dentro da janela de espera, até o tamanho máximo do lote
+            try:
+                while len(lote) < self.lote_max:
+                    lote.append(self._fila.get(timeout=self.espera_max))
+            except queue.Empty:
+                pass
+            self._processar(lote)
+
+    def _processar(self, lote):
+        pendentes = {}
+        for texto, futuro in lote:
+            pendentes.setdefault(texto, []).append(futuro)
+        textos = list(pendentes)
+        try:
+            vetores = self.denso.embed_documents(textos)
+        except Exception as e:
+            for futuros in pendentes.values():
+                for futuro in futuros:
+                    futuro.set_exception(e)
+            return
+        for texto, vetor in zip(textos, vetores):
+            self._cache_denso.guardar(texto, vetor)
+            for futuro in pendentes[texto]:
+                futuro.set_result(vetor)
+
+
+class EmbeddingDensoServico(Embeddings):
+    """Adaptador LangChain: consultas passam pelo serviço; documentos vão direto ao modelo."""
+
+    def __init__(self, servico: ServicoEmbeddings):
+        self.servico = servico
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.servico.denso.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.servico.vetor_denso(text)
+
+
+def criar_adaptador_esparso(servico: ServicoEmbeddings):
+    """Cria o adaptador esparso (a classe base vem do langchain_qdrant, importado sob demanda)."""
+    from langchain_qdrant.sparse_embeddings import SparseEmbeddings
+
+    class EmbeddingEsparsoServico(SparseEmbeddings):
+        def embed_documents(self, texts):
+            return servico.esparso.embed_documents(texts)
+
+        def embed_query(self, text):
+            return servico.vetor_esparso(text)
+
+    return EmbeddingEsparsoServico()
@@ -0,0 +1,85 @@
+# runnables_registry.py
+"""Registro de runnables de longa duração (LLMs, cadeias e executores).
+
+Cada runnable é construído uma única vez, na primeira vez em que é pedido, e
+reutilizado por todas as requisições (e threads) seguintes, mantendo os
+clientes HTTP e conexões com o provedor de LLM abertos. Se a configuração
+relevante mudar (ex.: GROQ_API_KEY), as instâncias são descartadas e
+reconstruídas sob demanda; ``rebuild()`` força o mesmo manualmente.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class RunnableRegistry:
+    """Cache thread-safe de runnables construídos a partir de factories registradas."""
+
+    def __init__(self, config_keys: Iterable[str] = ("GROQ_API_KEY",)):
+        self.config_keys = tuple(config_keys)
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._config: Optional[Tuple] = None
+        self._listeners = []
+
+    def register(self, name: str, factory: Callable[[], Any], replace: bool = True):
+        """Registra (ou substitui) a factory de um runnable. Substituir descarta a instância atual.
+        Com ``replace=False`` uma factory já registrada é mantida."""
+        with self._lock:
+            if name in self._factories and not replace:
+                return
+            if self._factories.get(name) is not factory:
+                self._factories[name] = factory
+                self._instances.pop(name, None)
+
+    def has(self, name: str) -> bool:
+        return name in self._factories
+
+    def get(self, name: str) -> Any:
+        """Retorna a instância pronta, construindo-a na primeira chamada."""
+        self._check_config()
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                factory = self._factories.get(name)
+                if factory is None:
+                    raise KeyError(f"Runnable '{name}' não registrado.")
+                print(f"Construindo runnable '{name}'...")
+                instance = factory()
+                self._instances[name] = instance
+            return instance
+
+    def rebuild(self, name: Optional[str] = None):
+        """Descarta uma instância (ou todas) para que seja reconstruída no próximo ``get``."""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(name)
+
+    def on_rebuild(self, callback: Callable[[Optional[str]], None]):
+        """Registra um callback chamado sempre que instâncias forem descartadas."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _check_config(self):
+        atual = tuple(os.getenv(k) for k in self.config_keys)
+        if atual == self._config:
+            return
+        with self._lock:
+            mudou = self._config is not None and atual != self._config
+            self._config = atual
+        if mudou:
+            print("Configuração alterada: reconstruindo runnables.")
+            self.rebuild()
+
+
+# Instância compartilhada pelo processo
+registry = RunnableRegistry()
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Os módulos dos agentes são importados pelo nome, como em marttin/agent/ai_service.py
+AGENTS_DIR = Path(__file__).resolve().parents[1] / "agents"
+if str(AGENTS_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENTS_DIR))
@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import agent_roteador
+from agent_roteador import SimpleAgentExecutor
+
+
+def _ferramenta(nome, segundos):
+    return SimpleNamespace(name=nome, func=lambda arg: time.sleep(segundos) or f"{nome}:{arg}")
+
+
+def _executor(monkeypatch, threads, timeouts, *ferramentas):
+    monkeypatch.setattr(agent_roteador, "_pool_ferramentas", ThreadPoolExecutor(max_workers=threads))
+    executor = SimpleAgentExecutor(agent=None, tools=list(ferramentas), timeouts=timeouts)
+    monkeypatch.setattr(executor, "_decidir", lambda payload: (payload["chamadas"], None))
+    return executor
+
+
+def _resultados(executor, chamadas):
+    return [r for _, r in executor.invoke({"chamadas": chamadas})["intermediate_steps"]]
+
+
+def test_prazo_conta_do_inicio_da_ferramenta(monkeypatch):
+    # Com uma thread, "rapida" espera "lenta" na fila; o prazo dela só começa quando ela roda
+    executor = _executor(monkeypatch, 1, {"lenta": 1, "rapida": 0.3},
+                         _ferramenta("lenta", 0.3), _ferramenta("rapida", 0.1))
+    assert _resultados(executor, [("lenta", "a"), ("rapida", "b")]) == ["lenta:a", "rapida:b"]
+
+
+def test_timeout_na_execucao_e_na_fila(monkeypatch):
+    executor = _executor(monkeypatch, 1, {"travada": 0.1, "rapida": 0.1},
+                         _ferramenta("travada", 0.5), _ferramenta("rapida", 0))
+    travada, rapida, ausente = _resultados(executor, [("travada", "a"), ("rapida", "b"), ("sumiu", "c")])
+    assert "excedeu o tempo limite" in travada
+    assert "não iniciou" in rapida
+    assert "não encontrada" in ausente
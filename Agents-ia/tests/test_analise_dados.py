@@ -0,0 +1,51 @@
+import pandas as pd
+
+from analise_dados import MotorAnalitico, detectar_colunas
+
+
+def _vendas():
+    return pd.DataFrame({
+        "data_venda": ["05/01/2024", "20/01/2024", "03/02/2024", "15/02/2024", "28/02/2024",
+                       "02/03/2024", "10/03/2024", "25/03/2024"],
+        "cliente": ["Ana", "Bia", "Ana", "Caio", "Bia", "Duda", "Ana", "Eva"],
+        "canal": ["Loja", "Loja", "Instagram", "Loja", "Loja", "Instagram", "Loja", "Loja"],
+        "valor": [100.0, 50.0, 200.0, 25.0, 75.0, 40.0, 60.0, 100.0],
+        "pedido_id": [1, 2, 3, 4, 5, 6, 7, 8],
+    })
+
+
+def test_detecta_colunas():
+    assert detectar_colunas(_vendas()) == {
+        "data": "data_venda", "valor": "valor", "canal": "canal", "cliente": "cliente"}
+
+
+def test_serie_mensal_e_variacao():
+    m = MotorAnalitico(_vendas()).metricas()
+    assert m["serie_mensal"] == [
+        {"mes": "2024-01", "registros": 2, "valor": 150.0},
+        {"mes": "2024-02", "registros": 3, "valor": 300.0},
+        {"mes": "2024-03", "registros": 3, "valor": 200.0},
+    ]
+    assert m["ultimo_mes"]["mes"] == "2024-03"
+    assert m["ultimo_mes"]["variacao_pct"] == -33.33
+    assert m["periodo"] == {"inicio": "2024-01-05", "fim": "2024-03-25"}
+
+
+def test_meses_sem_vendas_entram_zerados():
+    df = _vendas()
+    df = df[~df["data_venda"].str.contains("/02/")]
+    serie = MotorAnalitico(df).metricas()["serie_mensal"]
+    assert [(p["mes"], p["registros"], p["valor"]) for p in serie] == [
+        ("2024-01", 2, 150.0), ("2024-02", 0, 0.0), ("2024-03", 3, 200.0)]
+
+
+def test_novos_clientes_no_ultimo_mes():
+    m = MotorAnalitico(_vendas()).metricas()
+    # Duda e Eva compram pela primeira vez em março; Ana já comprava
+    assert m["novos_clientes_ultimo_mes"] == 2
+    assert m["clientes_distintos"] == 5
+
+
+def test_novos_clientes_com_colunas_categoricas():
+    df = _vendas().astype({"cliente": "category", "data_venda": "category"})
+    assert MotorAnalitico(df).novos_clientes() == 2
@@ -0,0 +1,67 @@
+import asyncio
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_core.prompts import ChatPromptTemplate
+
+import cache_llm
+from cache_llm import CacheLLM, astream_com_cache, sem_cache_llm, veio_do_cache
+
+
+def _geracao(texto):
+    return [ChatGeneration(message=AIMessage(content=texto))]
+
+
+def test_chave_separa_prompt_e_configuracao_do_modelo(tmp_path):
+    cache = CacheLLM(tmp_path / "c.sqlite3")
+    cache.update("prompt", "modelo-a", _geracao("resposta"))
+    acerto = cache.lookup("prompt", "modelo-a")
+    assert acerto[0].text == "resposta" and veio_do_cache(acerto[0].message)
+    assert cache.lookup("prompt", "modelo-b") is None
+    assert cache.lookup("outro prompt", "modelo-a") is None
+    assert (cache.acertos, cache.faltas) == (1, 2)
+
+
+def test_ttl_e_descarte_das_menos_acessadas(tmp_path, monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache_llm.time, "time", lambda: agora[0])
+    monkeypatch.setattr(cache_llm, "_LIMPEZA_A_CADA", 1)
+    cache = CacheLLM(tmp_path / "c.sqlite3", ttl=60, max_entradas=2)
+    cache.update("p1", "m", _geracao("r1"))
+    agora[0] += 1
+    cache.update("p2", "m", _geracao("r2"))
+    agora[0] += 1
+    assert cache.lookup("p1", "m") is not None  # p1 passa a ser a mais acessada
+    cache.update("p3", "m", _geracao("r3"))
+    assert cache.lookup("p2", "m") is None
+    assert cache.lookup("p1", "m") is not None
+
+    agora[0] += 61
+    assert cache.lookup("p3", "m") is None
+
+
+def test_sem_cache_llm_nao_le_nem_grava(tmp_path):
+    cache = CacheLLM(tmp_path / "c.sqlite3")
+    cache.update("p", "m", _geracao("r"))
+    with sem_cache_llm():
+        assert cache.lookup("p", "m") is None
+        cache.update("p2", "m", _geracao("r2"))
+    assert cache.ignoradas == 1
+    assert cache.lookup("p2", "m") is None
+
+
+def test_stream_usa_a_mesma_chave_do_invoke(tmp_path):
+    cache = CacheLLM(tmp_path / "c.sqlite3")
+    llm = GenericFakeChatModel(messages=iter(["um dois três", "outra resposta"]), cache=cache)
+    cadeia = ChatPromptTemplate.from_messages([("human", "{pergunta}")]) | llm
+
+    async def juntar(entrada):
+        return [t async for t in astream_com_cache(cadeia, entrada)]
+
+    assert len(asyncio.run(juntar({"pergunta": "oi"}))) > 1  # falta: stream do modelo
+    assert asyncio.run(juntar({"pergunta": "oi"})) == ["um dois três"]  # acerto: um único trecho
+    assert cadeia.invoke({"pergunta": "oi"}).content == "um dois três"
+
+    with sem_cache_llm():
+        assert asyncio.run(juntar({"pergunta": "oi"})) != ["um dois três"]
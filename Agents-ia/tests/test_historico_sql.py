@@ -0,0 +1,48 @@
+import json
+import sqlite3
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+
+from historico_sql import HistoricoJanelado
+
+
+def test_le_so_as_ultimas_k_mensagens_em_ordem(tmp_path):
+    conexao = f"sqlite:///{tmp_path / 'chat.db'}"
+    historico = HistoricoJanelado("s1", conexao, k=3)
+    for i in range(4):
+        historico.add_messages([HumanMessage(f"p{i}"), AIMessage(f"r{i}")])
+    HistoricoJanelado("s2", conexao, k=3).add_messages([HumanMessage("outra sessão")])
+
+    mensagens = historico.messages
+    assert [m.content for m in mensagens] == ["r2", "p3", "r3"]
+    assert [type(m) for m in mensagens] == [AIMessage, HumanMessage, AIMessage]
+
+    historico.clear()
+    assert historico.messages == []
+    assert [m.content for m in HistoricoJanelado("s2", conexao).messages] == ["outra sessão"]
+
+
+def test_le_tabela_no_formato_do_sql_chat_message_history(tmp_path):
+    # Tabela e JSON como o SQLChatMessageHistory grava (sem o índice por sessão)
+    banco = tmp_path / "legado.db"
+    with sqlite3.connect(banco) as conn:
+        conn.execute("CREATE TABLE message_store (id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT)")
+        conn.executemany("INSERT INTO message_store (session_id, message) VALUES (?, ?)", [
+            ("s1", json.dumps(message_to_dict(HumanMessage("oi")))),
+            ("s1", json.dumps(message_to_dict(AIMessage("olá")))),
+        ])
+    historico = HistoricoJanelado("s1", f"sqlite:///{banco}", k=10)
+    assert [m.content for m in historico.messages] == ["oi", "olá"]
+    with sqlite3.connect(banco) as conn:
+        indices = {linha[1] for linha in conn.execute("PRAGMA index_list(message_store)")}
+    assert "ix_message_store_session_id_id" in indices
+
+
+def test_le_banco_gravado_pelo_sql_chat_message_history(tmp_path):
+    historicos = pytest.importorskip("langchain_community.chat_message_histories")
+    pytest.importorskip("greenlet")  # o SQLChatMessageHistory cria também um engine assíncrono
+    conexao = f"sqlite:///{tmp_path / 'chat.db'}"
+    antigo = historicos.SQLChatMessageHistory(session_id="s1", connection=conexao)
+    antigo.add_messages([HumanMessage("oi"), AIMessage("olá"), HumanMessage("tudo bem?")])
+    assert [m.content for m in HistoricoJanelado("s1", conexao, k=2).messages] == ["olá", "tudo bem?"]
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from indice_local import IndiceLocal
+
+
+class _Denso:
+    def embed_query(self, query):
+        return [1.0, 0.0]
+
+
+class _Esparso:
+    def embed_query(self, query):
+        return SimpleNamespace(indices=[7], values=[1.0])
+
+
+def _esparso(indices, valores):
+    return SimpleNamespace(indices=indices, values=valores)
+
+
+def _indice(tmp_path):
+    # doc0: 1º só no denso; doc2: 1º só no esparso; doc1: 2º nos dois; f*: intermediários no denso
+    textos = ["doc0", "doc1", "f1", "f2", "f3", "doc2"]
+    densos = [[1, 0], [0.9, 0.436], [0.5, 0.866], [0.5, 0.866], [0.5, 0.866], [-1, 0]]
+    esparsos = [_esparso([1], [1.0]), _esparso([7], [0.5]), _esparso([1], [1.0]),
+                _esparso([1], [1.0]), _esparso([1], [1.0]), _esparso([7], [2.0])]
+    IndiceLocal.salvar(tmp_path, textos, [{"i": i} for i in range(len(textos))], densos, esparsos)
+    return IndiceLocal(tmp_path, _Denso(), _Esparso())
+
+
+def test_fusao_rrf_favorece_quem_aparece_nos_dois_rankings(tmp_path):
+    indice = _indice(tmp_path)
+    resultado = [d.page_content for d in indice.similarity_search("consulta", k=3)]
+    assert resultado == ["doc1", "doc2", "doc0"]
+
+
+def test_ranking_esparso_ignora_documentos_sem_o_termo(tmp_path):
+    indice = _indice(tmp_path)
+    ranking = [indice.documentos[i]["page_content"] for i in indice._ranking_esparso("consulta", 10)]
+    assert ranking == ["doc2", "doc1"]
+
+
+
+def test_corpus_vazio_gera_indice_vazio(tmp_path):
+    assert IndiceLocal.salvar(tmp_path, [], [], [], []) == 0
+    indice = IndiceLocal(tmp_path, _Denso(), _Esparso())
+    assert indice.similarity_search("consulta", k=3) == []
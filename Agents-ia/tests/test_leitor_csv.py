@@ -0,0 +1,38 @@
+import pandas as pd
+
+from leitor_csv import detectar_formato, ler_csv
+
+
+def test_csv_brasileiro(tmp_path):
+    caminho = tmp_path / "vendas.csv"
+    caminho.write_bytes(
+        "data;cliente;canal;valor\n"
+        "01/02/2024;José;Loja;1.234,56\n"
+        "02/02/2024;Ana;Loja;99,90\n"
+        "03/02/2024;José;Instagram;10,00\n"
+        "04/02/2024;Ana;Loja;2.000,00\n".encode("cp1252")
+    )
+    assert detectar_formato(str(caminho)) == {"encoding": "cp1252", "sep": ";", "decimal": ",", "thousands": "."}
+
+    df = ler_csv(str(caminho))
+    assert list(df.columns) == ["data", "cliente", "canal", "valor"]
+    assert df["valor"].dtype == "float64"
+    assert round(df["valor"].sum(), 2) == 3344.46
+    assert df["cliente"].tolist() == ["José", "Ana", "José", "Ana"]
+    assert isinstance(df["cliente"].dtype, pd.CategoricalDtype)
+
+
+def test_csv_americano(tmp_path):
+    caminho = tmp_path / "sales.csv"
+    caminho.write_text(
+        "date,customer,amount,quantity\n"
+        "2024-01-02,Ann,1234.56,3\n"
+        "2024-01-03,Bob,10.5,1\n"
+        "2024-01-04,Carl,7.25,2\n",
+        encoding="utf-8",
+    )
+    assert detectar_formato(str(caminho)) == {"encoding": "utf-8-sig", "sep": ",", "decimal": ".", "thousands": None}
+
+    df = ler_csv(str(caminho))
+    assert round(df["amount"].sum(), 2) == 1252.31
+    assert df["quantity"].dtype == "int8"
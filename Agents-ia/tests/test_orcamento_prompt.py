@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from orcamento_prompt import (
+    LIMITES_ESTRATEGISTA, SEPARADOR_TRECHOS, ajustar_entrada_estrategista, contar_tokens, tokens_mensagens,
+)
+
+
+def _texto(palavras):
+    return " ".join(f"palavra{i % 50}" for i in range(palavras))
+
+
+def _entrada():
+    return {
+        "consulta_cliente": _texto(2000),
+        "chat_history": [SystemMessage("resumo da conversa")] + [
+            (HumanMessage if i % 2 == 0 else AIMessage)(_texto(100)) for i in range(60)],
+        "dados_pesquisa": SEPARADOR_TRECHOS.join(_texto(400) for _ in range(8)),
+        "dados_planilha": _texto(3000),
+        "dados_api": _texto(500),
+    }
+
+
+def _tamanho(chave, valor):
+    return tokens_mensagens(valor) if chave == "chat_history" else contar_tokens(valor)
+
+
+def test_cada_secao_fica_no_seu_teto():
+    entrada = ajustar_entrada_estrategista(_entrada(), orcamento=100_000)
+    for chave, limite in LIMITES_ESTRATEGISTA.items():
+        assert 0 < _tamanho(chave, entrada[chave]) <= limite, chave
+    # Mensagens antigas saem antes do resumo; trechos inteiros saem antes do corte do texto
+    assert isinstance(entrada["chat_history"][0], SystemMessage)
+    assert entrada["chat_history"][-1].content == _entrada()["chat_history"][-1].content
+    assert len(entrada["dados_pesquisa"].split(SEPARADOR_TRECHOS)) < 8
+
+
+def test_orcamento_total_reduz_por_prioridade():
+    entrada = ajustar_entrada_estrategista(_entrada(), orcamento=3000, fixo=500)
+    tamanhos = {chave: _tamanho(chave, entrada[chave]) for chave in LIMITES_ESTRATEGISTA}
+    assert sum(tamanhos.values()) <= 2500
+    for chave, limite in LIMITES_ESTRATEGISTA.items():
+        assert tamanhos[chave] <= limite, chave
+    # A pergunta do cliente não é reduzida além do próprio teto
+    assert tamanhos["consulta_cliente"] > LIMITES_ESTRATEGISTA["consulta_cliente"] - 50
+
+
+def test_entrada_pequena_nao_muda():
+    entrada = {"consulta_cliente": "Como aumentar as vendas?", "chat_history": [HumanMessage("oi")],
+               "dados_pesquisa": "trecho", "dados_planilha": "", "dados_api": "IPCA 4,5%"}
+    assert ajustar_entrada_estrategista(entrada) == entrada
@@ -1,9 +1,8 @@
-import os
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict
-from langchain_core.messages import HumanMessage, AIMessage
+from asgiref.sync import sync_to_async
+from typing import Dict
 
 # Garantir que possamos importar o pacote de agentes (Agents-ia/agents)
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -15,58 +14,126 @@ if str(AGENTS_DIR) not in sys.path:
 load_dotenv(BASE_DIR / ".env")
 
 # Importações tardias após configurar path e env
-from main import get_graph_app  # type: ignore
+from main import get_graph_app, anode_roteador, astream_estrategista  # type: ignore
+from agent_rag import aquecer_rag  # type: ignore
+from agente_dados import analisar_planilha, ler_planilha  # type: ignore
+from dashboard_kpis import DashboardPlanilha, gerar_insights, insights_basicos  # type: ignore
+from runnables_registry import registry  # type: ignore
+from cache_planilhas import cache_planilhas  # type: ignore
+from django.conf import settings
+
+from .conversation_store import conversation_store
 
 
 class AIService:
-    def __init__(self):
+    def __init__(self, store=None):
         self.app = get_graph_app()
-        self.chat_history: List = []
-
-    def _to_lc_messages(self) -> List:
-        msgs = []
-        for m in self.chat_history:
-            role = m.get("role")
-            content = m.get("content", "")
-            if role == "user":
-                msgs.append(HumanMessage(content=content))
-            else:
-                msgs.append(AIMessage(content=content))
-        return msgs
-
-    def run_ai_consultor(self, pergunta: str, arquivo: str | None = None, pergunta_sobre_arquivo: str | None = None) -> Dict[str, str]:
-        entrada = pergunta
-        if arquivo:
-            pergunta_arquivo = pergunta_sobre_arquivo or "Forneça um resumo e estatísticas principais."
-            entrada += (
-                f"\n\nAdicionalmente, use a ferramenta Analisador_de_Planilhas com a seguinte entrada: "
-                f"'{arquivo};{pergunta_arquivo}'"
-            )
-
-        state = self.app.invoke({
-            "input": entrada,
-            "chat_history": self._to_lc_messages(),
+        # Histórico isolado por sessão (ver conversation_store)
+        self.store = store or conversation_store
+
+    @staticmethod
+    def _montar_entrada(arquivo: str | None, pergunta_sobre_arquivo: str | None) -> str:
+        """Entrada ``caminho;pergunta`` do Analisador de Planilhas. ``arquivo`` já deve ter passado
+        por ``planilha_do_usuario``; vai num campo próprio do estado, fora do texto do usuário."""
+        if not arquivo:
+            return ""
+        return f"{arquivo};{pergunta_sobre_arquivo or 'Forneça um resumo e estatísticas principais.'}"
+
+    @staticmethod
+    def _estado_inicial(pergunta: str, entrada_planilha: str, chat_history) -> Dict:
+        return {
+            "input": pergunta,
+            "entrada_planilha": entrada_planilha,
+            "chat_history": chat_history,
             "dados_pesquisa": "",
             "dados_api": "",
             "dados_planilha": ""
-        })
-
-        resposta = state.get("resposta_final", "")
-        # Atualiza histórico
-        self.chat_history.append({"role": "user", "content": pergunta})
-        self.chat_history.append({"role": "assistant", "content": resposta})
+        }
 
+    @staticmethod
+    def _resultado(state) -> Dict[str, str]:
         # Sugestão de follow-up simples (pode ser aprimorada via LLM no futuro)
         follow_up = "Posso aprofundar em algum ponto, por exemplo público-alvo, canais ou projeção de resultados?"
 
         return {
-            "resposta_final": resposta,
+            "resposta_final": state.get("resposta_final", ""),
             "dados_pesquisa": state.get("dados_pesquisa", ""),
             "dados_api": state.get("dados_api", ""),
             "dados_planilha": state.get("dados_planilha", ""),
             "follow_up": follow_up,
         }
 
+    def run_ai_consultor(self, pergunta: str, arquivo: str | None = None, pergunta_sobre_arquivo: str | None = None,
+                         session_key: str | None = None, user_id: int | None = None,
+                         gravar_historico: bool = True) -> Dict[str, str]:
+        """Executa o grafo de agentes. Sem ``session_key`` a chamada é avulsa: não usa nem grava histórico.
+        Com ``gravar_historico=False`` o histórico é lido, mas o turno fica a cargo de quem chama."""
+        entrada_planilha = self._montar_entrada(arquivo, pergunta_sobre_arquivo)
+        history = self.store.history(session_key) if session_key else []
+
+        state = self.app.invoke(self._estado_inicial(pergunta, entrada_planilha, history))
+
+        resposta = state.get("resposta_final", "")
+        # Atualiza histórico da sessão
+        if session_key and gravar_historico:
+            self.store.add_turn(session_key, pergunta, resposta, user_id=user_id)
+        return self._resultado(state)
+
+    async def arun_ai_consultor(self, pergunta: str, arquivo: str | None = None, pergunta_sobre_arquivo: str | None = None,
+                                session_key: str | None = None, user_id: int | None = None) -> Dict[str, str]:
+        """Versão assíncrona de ``run_ai_consultor`` (grafo via ``ainvoke``), para views ASGI."""
+        entrada_planilha = self._montar_entrada(arquivo, pergunta_sobre_arquivo)
+        history = await sync_to_async(self.store.history)(session_key) if session_key else []
+
+        state = await self.app.ainvoke(self._estado_inicial(pergunta, entrada_planilha, history))
+
+        resposta = state.get("resposta_final", "")
+        if session_key:
+            await sync_to_async(self.store.add_turn)(session_key, pergunta, resposta, user_id=user_id)
+        return self._resultado(state)
+
+    async def astream_ai_consultor(self, pergunta: str, arquivo: str | None = None, pergunta_sobre_arquivo: str | None = None,
+                                   session_key: str | None = None, user_id: int | None = None):
+        """Executa o roteador e transmite a resposta do estrategista em trechos de texto, à medida que o LLM gera."""
+        entrada_planilha = self._montar_entrada(arquivo, pergunta_sobre_arquivo)
+        history = await sync_to_async(self.store.history)(session_key) if session_key else []
+
+        state = self._estado_inicial(pergunta, entrada_planilha, history)
+        state.update(await anode_roteador(state))
+        partes = []
+        async for trecho in astream_estrategista(state):
+            partes.append(trecho)
+            yield trecho
+
+        resposta = "".join(partes)
+        if session_key:
+            await sync_to_async(self.store.add_turn)(session_key, pergunta, resposta, user_id=user_id)
+
+    def analisar_planilha(self, arquivo: str, pergunta: str) -> str:
+        """Pergunta direta ao Analisador de Planilhas, sem passar pelo roteador."""
+        return analisar_planilha(f"{arquivo};{pergunta}")
+
+    def preprocessar_planilha(self, arquivo: str, sha: str | None = None) -> Dict:
+        """Lê a planilha uma vez (gerando a cópia colunar do cache) e retorna suas dimensões."""
+        df = ler_planilha(arquivo, sha=sha)
+        copia = cache_planilhas.copia_em_disco(sha) if sha else None
+        return {'rows': int(df.shape[0]), 'columns': int(df.shape[1]), 'parsed_path': str(copia) if copia else None}
+
+    def dashboard_planilha(self, arquivo: str) -> Dict:
+        """Seções numéricas do dashboard calculadas da planilha (Pandas, sem LLM) e insights básicos."""
+        dados = DashboardPlanilha(ler_planilha(arquivo)).dados()
+        dados["insights"] = insights_basicos(dados)
+        return dados
+
+    def dashboard_insights(self, arquivo: str) -> list:
+        """Insights do dashboard escritos pelo LLM a partir dos números já calculados."""
+        df = ler_planilha(arquivo)
+        return gerar_insights(registry.get("llm_dados"), df, DashboardPlanilha(df).dados())
+
 
 # Instância reutilizável
 ai_service = AIService()
+
+# Warm-up opcional do RAG (modelos de embedding + Qdrant) em segundo plano
+if getattr(settings, 'RAG_WARMUP', False):
+    aquecer_rag(em_segundo_plano=True)
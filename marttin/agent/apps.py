@@ -1,6 +1,18 @@
+import sys
+from pathlib import Path
+
 from django.apps import AppConfig
 
+# Pacote de agentes (Agents-ia/agents), importado pelos módulos pelo nome
+AGENTS_DIR = Path(__file__).resolve().parents[2] / "Agents-ia" / "agents"
+
 
 class AgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent'
+
+    def ready(self):
+        # Antes dos middlewares, que importam ``metricas`` sem passar pelo ai_service
+        if str(AGENTS_DIR) not in sys.path:
+            sys.path.append(str(AGENTS_DIR))
+        from . import signals  # noqa: F401
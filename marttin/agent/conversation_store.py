@@ -0,0 +1,164 @@
+"""Histórico de conversas do chat, isolado por sessão.
+
+Cada sessão guarda em memória apenas a janela das últimas mensagens e um resumo
+das anteriores. As sessões "quentes" ficam num LRU limitado; as demais são
+descartadas da memória e recarregadas do banco (``ChatMessage``) quando voltam
+a ser usadas. Assim o custo por requisição depende do tamanho da janela, e não
+do total de mensagens já trocadas.
+
+Com vários workers, cada processo tem a sua cópia da sessão. A leitura do
+histórico é uma única consulta pelo índice ``(session_key, -id)`` que traz a
+janela, as mensagens anteriores usadas no resumo e o id da última mensagem; se
+esse id difere do da cópia em memória (outro worker gravou ou apagou
+mensagens), a sessão é remontada com essas mesmas linhas, sem nova consulta.
+O resumo cobre sempre as ``window`` mensagens anteriores à janela, então é o
+mesmo em qualquer worker.
+"""
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+from django.conf import settings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from .models import ChatMessage
+
+DEFAULTS = {
+    'HOT_SESSIONS': 500,        # sessões mantidas em memória (LRU)
+    'WINDOW': 10,               # mensagens recentes enviadas ao LLM
+    'SUMMARY_MAX_CHARS': 1200,  # tamanho máximo do resumo; 0 desativa
+    'SUMMARY_SNIPPET_CHARS': 200,
+}
+
+
+def summarize_extractive(summary: str, message: Dict[str, str], max_chars: int, snippet_chars: int = 200) -> str:
+    """Resumo padrão (sem LLM): acrescenta um trecho da mensagem que saiu da janela
+    e mantém apenas os últimos ``max_chars`` caracteres."""
+    label = 'Usuário' if message.get('role') == 'user' else 'Assistente'
+    snippet = ' '.join((message.get('content') or '').split())[:snippet_chars]
+    merged = f"{summary}\n{label}: {snippet}" if summary else f"{label}: {snippet}"
+    return merged[-max_chars:]
+
+
+@dataclass
+class _Session:
+    messages: Deque[Dict[str, str]]
+    anteriores: Deque[Dict[str, str]]  # mensagens que saíram da janela e entram no resumo
+    summary: str = ''
+    ultimo_id: Optional[int] = None  # id da última ChatMessage refletida na janela
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ConversationStore:
+    """Store de histórico por sessão com LRU em memória e persistência no banco."""
+
+    def __init__(self, hot_sessions: Optional[int] = None, window: Optional[int] = None,
+                 summary_max_chars: Optional[int] = None,
+                 summarizer: Optional[Callable[[str, Dict[str, str], int], str]] = None):
+        conf = {**DEFAULTS, **getattr(settings, 'CHAT_HISTORY', {})}
+        self.hot_sessions = hot_sessions if hot_sessions is not None else conf['HOT_SESSIONS']
+        self.window = window if window is not None else conf['WINDOW']
+        self.summary_max_chars = summary_max_chars if summary_max_chars is not None else conf['SUMMARY_MAX_CHARS']
+        self.snippet_chars = conf['SUMMARY_SNIPPET_CHARS']
+        self.summarizer = summarizer or (
+            lambda summary, msg, max_chars: summarize_extractive(summary, msg, max_chars, self.snippet_chars)
+        )
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Leitura ---
+    def history(self, session_key: str) -> List[BaseMessage]:
+        """Retorna o resumo (se houver) e a janela recente como mensagens LangChain."""
+        session = self._get_session(session_key)
+        with session.lock:
+            summary = session.summary
+            messages = list(session.messages)
+        msgs: List[BaseMessage] = []
+        if summary:
+            msgs.append(SystemMessage(content=f"Resumo da conversa anterior:\n{summary}"))
+        for m in messages:
+            if m['role'] == 'user':
+                msgs.append(HumanMessage(content=m['content']))
+            else:
+                msgs.append(AIMessage(content=m['content']))
+        return msgs
+
+    # --- Escrita ---
+    def add_turn(self, session_key: str, pergunta: str, resposta: str, user_id: Optional[int] = None):
+        """Registra uma troca (pergunta + resposta) no banco e na cópia em memória da sessão."""
+        novas = [{'role': 'user', 'content': pergunta}, {'role': 'assistant', 'content': resposta}]
+        criadas = ChatMessage.objects.bulk_create([
+            ChatMessage(session_key=session_key, user_id=user_id, role=m['role'], content=m['content'])
+            for m in novas
+        ])
+        ids = [m.pk for m in criadas]
+        with self._lock:
+            session = self._sessions.get(session_key)
+        if session is None:
+            return  # a próxima leitura carrega do banco
+        with session.lock:
+            if None not in ids and session.ultimo_id is not None and ids[0] == session.ultimo_id + 1:
+                # Ids seguidos: nenhum outro worker gravou nesta sessão entre a cópia e este turno
+                for m in novas:
+                    self._push(session, m)
+                session.ultimo_id = ids[-1]
+            else:
+                session.ultimo_id = None  # remonta na próxima leitura
+
+    def clear(self, session_key: str):
+        """Remove o histórico da sessão (memória e banco)."""
+        with self._lock:
+            self._sessions.pop(session_key, None)
+        ChatMessage.objects.filter(session_key=session_key).delete()
+
+    # --- Internos ---
+    def _push(self, session: _Session, message: Dict[str, str]):
+        if len(session.messages) == session.messages.maxlen:
+            session.anteriores.append(session.messages[0])
+            session.summary = self._resumir(session.anteriores)
+        session.messages.append(message)
+
+    def _resumir(self, anteriores) -> str:
+        summary = ''
+        if self.summary_max_chars:
+            for m in anteriores:
+                summary = self.summarizer(summary, m, self.summary_max_chars)
+        return summary
+
+    def _get_session(self, session_key: str) -> _Session:
+        # Uma consulta: janela, mensagens do resumo e id da última mensagem
+        limite = self.window * 2 if self.summary_max_chars else self.window
+        recentes = list(
+            ChatMessage.objects.filter(session_key=session_key)
+            .order_by('-id')
+            .values('id', 'role', 'content')[:limite]
+        )
+        ultimo_id = recentes[0]['id'] if recentes else 0
+        with self._lock:
+            vista = self._sessions.get(session_key)
+            if vista is not None:
+                self._sessions.move_to_end(session_key)
+        if vista is not None and vista.ultimo_id == ultimo_id:
+            return vista
+
+        # Sessão fria ou alterada por outro worker: remonta com as linhas já lidas
+        session = self._montar(recentes)
+        with self._lock:
+            self._sessions[session_key] = session
+            self._sessions.move_to_end(session_key)
+            while len(self._sessions) > self.hot_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def _montar(self, recentes: List[Dict]) -> _Session:
+        janela = max(self.window, 1)
+        session = _Session(messages=deque(maxlen=janela), anteriores=deque(maxlen=janela))
+        for m in reversed(recentes):
+            self._push(session, {'role': m['role'], 'content': m['content']})
+        session.ultimo_id = recentes[0]['id'] if recentes else 0
+        return session
+
+
+# Instância reutilizável
+conversation_store = ConversationStore()
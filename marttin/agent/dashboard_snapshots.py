@@ -0,0 +1,214 @@
+"""Snapshots do dashboard por usuário (stale-while-revalidate).
+
+O último payload calculado de cada usuário fica no cache do Django e no banco
+(``DashboardSnapshot``) e é devolvido na hora. Quando a entrada mudou (nova
+planilha enviada, perfil da ``Company`` alterado) ou o snapshot passou de
+``MAX_AGE``, o payload antigo continua sendo servido (marcado com
+``stale=True``) enquanto um recálculo roda em segundo plano. Há um snapshot
+por planilha, então alternar entre planilhas não refaz o cálculo. Sem snapshot
+(primeiro acesso a uma planilha), as páginas HTML não esperam pelo cálculo; a
+API de dados aguarda o mesmo recálculo em andamento em vez de iniciar outro.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ChatMessage, Company, DashboardSnapshot, FileUpload, MarketingAnalysis
+from .uploads import EXTENSOES_PLANILHA
+
+DEFAULTS = {
+    'MAX_AGE': 900,
+    'CACHE_TIMEOUT': 3600,
+    'WORKERS': 2,
+}
+
+# Dados de demonstração do dashboard (quando o usuário ainda não enviou planilha)
+DASHBOARD_DEMO = {
+    "kpis": {"faturamento_mes": 125430, "novos_clientes": 87, "cac": 62.5},
+    "cashflow": {
+        "labels": [f"D{i}" for i in range(1, 13)],
+        "entradas": [12,9,14,11,16,13,18,14,17,15,19,18],
+        "saidas":   [9,8,11,10,12,12,13,12,14,13,15,14]
+    },
+    "channels": {"labels": ["Loja Online","Marketplace","Instagram","WhatsApp"], "values": [46,28,17,9]},
+    "latest_sales": [
+        {"id":1,"data":"2025-10-25","cliente":"Maria Oliveira","canal":"Loja Online","valor":1290.00,"status":"Pago"},
+        {"id":2,"data":"2025-10-25","cliente":"João Lima","canal":"Marketplace","valor":349.90,"status":"Pago"},
+        {"id":3,"data":"2025-10-24","cliente":"Aline Souza","canal":"Instagram","valor":179.00,"status":"Pendente"},
+    ],
+    "insights": [
+        {"icon":"lightbulb","title":"Campanhas com melhor ROI","text":"Direcione mais orçamento para Instagram Ads (CAC -15%)."},
+        {"icon":"graph-up","title":"Fluxo de caixa","text":"Previsão de pico de despesas nos próximos 10 dias; considere antecipar recebíveis."}
+    ]
+}
+
+
+def planilha_mais_recente(user) -> Optional[str]:
+    """Caminho da última planilha enviada pelo usuário."""
+    for caminho in (FileUpload.objects.filter(user_id=user.id).exclude(file_path='')
+                    .values_list('file_path', flat=True)[:10]):
+        if Path(caminho).suffix.lower() in EXTENSOES_PLANILHA and os.path.isfile(caminho):
+            return caminho
+    # Uploads antigos, gravados como BASE_DIR/uploads/user<id>_<timestamp>_<nome>
+    upload_dir = Path(settings.BASE_DIR) / 'uploads'
+    candidatos = [
+        p for p in upload_dir.glob(f"user{user.id}_*")
+        if p.suffix.lower() in EXTENSOES_PLANILHA and p.is_file()
+    ]
+    if not candidatos:
+        return None
+    return str(max(candidatos, key=lambda p: p.stat().st_mtime))
+
+
+def estatisticas_usuario(user) -> Dict[str, int]:
+    """Contagens reais exibidas no dashboard."""
+    return {
+        'conversations': ChatMessage.objects.filter(user=user, role='user').count(),
+        'analyses': MarketingAnalysis.objects.filter(company__user=user).count(),
+        # Ideias de conteúdo ainda não são persistidas
+        'content_ideas': 0,
+    }
+
+
+class DashboardSnapshots:
+    """Serve o último dashboard de cada usuário e o recalcula em segundo plano quando necessário."""
+
+    def __init__(self, max_age: Optional[float] = None, cache_timeout: Optional[int] = None,
+                 workers: Optional[int] = None):
+        conf = {**DEFAULTS, **getattr(settings, 'DASHBOARD_SNAPSHOT', {})}
+        self.max_age = max_age if max_age is not None else conf['MAX_AGE']
+        self.cache_timeout = cache_timeout if cache_timeout is not None else conf['CACHE_TIMEOUT']
+        self._pool = ThreadPoolExecutor(max_workers=workers or conf['WORKERS'], thread_name_prefix='dashboard')
+        self._em_andamento: Dict[Tuple[int, str], Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(user_id: int, arquivo: Optional[str]) -> str:
+        # Um snapshot por planilha: alternar entre duas planilhas não recalcula a cada troca
+        origem = hashlib.sha256((arquivo or '').encode('utf-8')).hexdigest()[:16]
+        return f"dashboard:snapshot:{user_id}:{origem}"
+
+    @staticmethod
+    def _impressao(user_id: int, arquivo: Optional[str]) -> str:
+        """Identifica a entrada do cálculo: planilha (caminho, mtime, tamanho) e perfil da empresa."""
+        partes = [arquivo or '']
+        if arquivo:
+            try:
+                st = os.stat(arquivo)
+                partes += [str(st.st_mtime_ns), str(st.st_size)]
+            except OSError:
+                partes.append('ausente')
+        atualizada = Company.objects.filter(user_id=user_id).values_list('updated_at', flat=True).first()
+        partes.append(atualizada.isoformat() if atualizada else '')
+        return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+    # --- Leitura ---
+    def _snapshot(self, user_id: int, arquivo: Optional[str]) -> Optional[Dict]:
+        snap = cache.get(self._chave(user_id, arquivo))
+        if snap is None:
+            registro = DashboardSnapshot.objects.filter(user_id=user_id, source_path=arquivo or '').first()
+            if registro is None:
+                return None
+            snap = {
+                'payload': registro.payload,
+                'source_path': registro.source_path,
+                'fingerprint': registro.fingerprint,
+                'computed_at': registro.computed_at.timestamp(),
+            }
+            cache.set(self._chave(user_id, arquivo), snap, self.cache_timeout)
+        return snap
+
+    def obter(self, user, file_path: Optional[str] = None, esperar: bool = True) -> Optional[Dict]:
+        """Payload do dashboard do usuário; ``file_path`` escolhe outra planilha que não a mais recente.
+
+        Sem snapshot da planilha, agenda o cálculo e, com ``esperar=False``, retorna ``None`` na hora
+        (páginas HTML); caso contrário aguarda o cálculo, reaproveitando o que já estiver em andamento.
+        """
+        arquivo = file_path or planilha_mais_recente(user)
+        snap = self._snapshot(user.id, arquivo)
+        if snap is None:
+            futuro = self.agendar(user.id, arquivo)
+            return futuro.result() if esperar else None
+
+        desatualizado = (
+            snap['fingerprint'] != self._impressao(user.id, arquivo)
+            or timezone.now().timestamp() - snap['computed_at'] > self.max_age
+        )
+        if desatualizado:
+            self.agendar(user.id, arquivo)
+        return {**snap['payload'], 'stale': desatualizado}
+
+    # --- Escrita ---
+    def recalcular(self, user_id: int, arquivo: Optional[str]) -> Dict:
+        """Calcula o payload, grava no banco e no cache e o retorna."""
+        from django.contrib.auth.models import User
+        from .ai_service import ai_service
+
+        impressao = self._impressao(user_id, arquivo)
+        if arquivo:
+            payload = ai_service.dashboard_planilha(arquivo)
+            payload['insights_pendentes'] = True
+        else:
+            payload = {**DASHBOARD_DEMO, 'is_demo': True}
+        payload['stats'] = estatisticas_usuario(User(id=user_id))
+
+        registro, _ = DashboardSnapshot.objects.update_or_create(
+            user_id=user_id, source_path=arquivo or '',
+            defaults={'payload': payload, 'fingerprint': impressao},
+        )
+        cache.set(self._chave(user_id, arquivo), {
+            'payload': payload,
+            'source_path': arquivo or '',
+            'fingerprint': impressao,
+            'computed_at': registro.computed_at.timestamp(),
+        }, self.cache_timeout)
+        return {**payload, 'stale': False}
+
+    def guardar_insights(self, user_id: int, file_path: Optional[str], insights) -> None:
+        """Anexa ao snapshot os insights do LLM (calculados à parte, pois são lentos)."""
+        snap = self._snapshot(user_id, file_path)
+        if snap is None:
+            return
+        payload = {**snap['payload'], 'insights': insights, 'insights_pendentes': False}
+        DashboardSnapshot.objects.filter(user_id=user_id, source_path=file_path or '').update(payload=payload)
+        cache.set(self._chave(user_id, file_path), {**snap, 'payload': payload}, self.cache_timeout)
+
+    def agendar(self, user_id: int, arquivo: Optional[str] = None) -> Future:
+        """Enfileira um recálculo em segundo plano (no máximo um por usuário e planilha ao mesmo tempo)."""
+        chave = (user_id, arquivo or '')
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            if futuro is None:
+                futuro = self._em_andamento[chave] = self._pool.submit(
+                    self._recalcular_em_segundo_plano, user_id, arquivo)
+        return futuro
+
+    def _recalcular_em_segundo_plano(self, user_id: int, arquivo: Optional[str]) -> Dict:
+        close_old_connections()
+        try:
+            return self.recalcular(user_id, arquivo)
+        except Exception as e:
+            print(f"⚠️ Falha ao recalcular o dashboard do usuário {user_id}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop((user_id, arquivo or ''), None)
+            close_old_connections()
+
+    def invalidar(self, user_id: int) -> None:
+        """Chamado quando a entrada do usuário muda: recalcula em segundo plano a partir da planilha mais recente."""
+        from django.contrib.auth.models import User
+
+        self.agendar(user_id, planilha_mais_recente(User(id=user_id)))
+
+
+# Instância reutilizável
+dashboard_snapshots = DashboardSnapshots()
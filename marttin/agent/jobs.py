@@ -0,0 +1,211 @@
+"""Fila de tarefas de IA no banco de dados.
+
+Requisições pesadas (chat, análise de planilha, insights do dashboard) viram um
+``Job`` e retornam o id em milissegundos; o cliente consulta
+``/api/jobs/<id>/`` até a tarefa terminar. Um ou mais workers
+(``python manage.py run_jobs``) retiram as tarefas da fila: a reserva é um
+``UPDATE ... WHERE status='pending'`` condicional, então vários workers podem
+consumir a mesma fila sem executar a mesma tarefa duas vezes. Tarefas presas
+em "running" por mais de ``STALE_AFTER`` (worker que caiu) voltam para a fila
+até ``MAX_ATTEMPTS``.
+
+Com ``EAGER = None`` (padrão) a tarefa roda numa thread do próprio servidor
+enquanto nenhum worker der sinal de vida (``JobWorker``) nos últimos
+``HEARTBEAT_TIMEOUT`` segundos, então ``runserver`` sozinho continua atendendo
+chat, insights e uploads; ``True``/``False`` forçam um dos modos.
+"""
+import contextlib
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Job, JobWorker
+
+DEFAULTS = {
+    'EAGER': None,
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 2,
+    'STALE_AFTER': 600,
+    'HEARTBEAT_TIMEOUT': 30,
+}
+
+TAREFAS: Dict[str, Callable[[Job], Dict]] = {}
+
+
+def config() -> Dict:
+    return {**DEFAULTS, **getattr(settings, 'JOBS', {})}
+
+
+def tarefa(kind: str):
+    """Registra a função que executa as tarefas do tipo ``kind`` (recebe o Job, retorna o resultado)."""
+    def decorador(func):
+        TAREFAS[kind] = func
+        return func
+    return decorador
+
+
+def enfileirar(kind: str, payload: Dict, user=None) -> Job:
+    if kind not in TAREFAS:
+        raise ValueError(f"Tipo de tarefa desconhecido: '{kind}'")
+    job = Job.objects.create(kind=kind, payload=payload, user=user)
+    if executar_no_servidor():
+        transaction.on_commit(lambda: threading.Thread(
+            target=_executar_em_thread, args=(job.pk,), name='job-eager', daemon=True).start())
+    return job
+
+
+def executar_no_servidor() -> bool:
+    """``EAGER`` explícito ou, com ``EAGER = None``, nenhum worker ativo."""
+    eager = config()['EAGER']
+    return not worker_ativo() if eager is None else bool(eager)
+
+
+def sinal_de_vida(worker: str):
+    JobWorker.objects.update_or_create(name=worker, defaults={'last_seen': timezone.now()})
+
+
+def encerrar_worker(worker: str):
+    JobWorker.objects.filter(name=worker).delete()
+
+
+def worker_ativo() -> bool:
+    limite = timezone.now() - timedelta(seconds=config()['HEARTBEAT_TIMEOUT'])
+    return JobWorker.objects.filter(last_seen__gte=limite).exists()
+
+
+def _executar_em_thread(job_id):
+    close_old_connections()
+    try:
+        job = reservar(job_id=job_id, worker='eager')
+        if job is not None:
+            executar(job)
+    finally:
+        close_old_connections()
+
+
+def nome_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def liberar_abandonadas() -> int:
+    """Devolve à fila (ou marca como falha) tarefas cujo worker parou no meio."""
+    conf = config()
+    limite = timezone.now() - timedelta(seconds=conf['STALE_AFTER'])
+    presas = Job.objects.filter(status='running', started_at__lt=limite)
+    falhas = presas.filter(attempts__gte=conf['MAX_ATTEMPTS']).update(
+        status='failed', error='Tarefa abandonada pelo worker.', finished_at=timezone.now())
+    return falhas + presas.filter(attempts__lt=conf['MAX_ATTEMPTS']).update(status='pending', worker='')
+
+
+def reservar(worker: Optional[str] = None, job_id=None) -> Optional[Job]:
+    """Reserva a próxima tarefa da fila (ou a tarefa ``job_id``) para este worker."""
+    worker = worker or nome_worker()
+    pendentes = Job.objects.filter(status='pending')
+    if job_id is not None:
+        pendentes = pendentes.filter(pk=job_id)
+    for candidato in pendentes.order_by('created_at').values_list('pk', 'attempts')[:5]:
+        pk, tentativas = candidato
+        reservou = Job.objects.filter(pk=pk, status='pending').update(
+            status='running', worker=worker, started_at=timezone.now(), attempts=tentativas + 1)
+        if reservou:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def executar(job: Job) -> Job:
+    """Executa a tarefa já reservada e grava o resultado ou o erro."""
+    try:
+        job.result = TAREFAS[job.kind](job)
+        job.status = 'done'
+        job.error = ''
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = 'pending' if job.attempts < config()['MAX_ATTEMPTS'] and _reexecutavel(e) else 'failed'
+    job.finished_at = timezone.now() if job.status != 'pending' else None
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    return job
+
+
+def _reexecutavel(e: Exception) -> bool:
+    # Erros de entrada não mudam ao tentar de novo; falhas de rede/provedor podem mudar
+    return not isinstance(e, (ValueError, KeyError, TypeError))
+
+
+def processar_proximo(worker: Optional[str] = None) -> Optional[Job]:
+    job = reservar(worker)
+    return executar(job) if job is not None else None
+
+
+def status_json(job: Job) -> Dict:
+    return {
+        'id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'result': job.result if job.status == 'done' else None,
+        'error': job.error if job.status == 'failed' else '',
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# --- Tarefas ---
+@tarefa('chat')
+def _tarefa_chat(job: Job) -> Dict:
+    from cache_llm import sem_cache_llm  # type: ignore
+    from .ai_service import ai_service
+    from .utils.markdown_utils import render_markdown
+
+    p = job.payload
+    with (sem_cache_llm() if p.get('no_cache') else contextlib.nullcontext()):
+        result = ai_service.run_ai_consultor(
+            p['message'], p.get('file_path'), p.get('file_question'),
+            session_key=p.get('session_key'), user_id=job.user_id, gravar_historico=False,
+        )
+    response = result.get('resposta_final') or 'Sem resposta.'
+    resultado = {'response': response, 'response_html': render_markdown(response)}
+    # Último passo: uma falha antes dele reexecuta a tarefa sem gravar o turno duas vezes
+    if p.get('session_key'):
+        ai_service.store.add_turn(p['session_key'], p['message'], result.get('resposta_final', ''), user_id=job.user_id)
+    return resultado
+
+
+@tarefa('planilha')
+def _tarefa_planilha(job: Job) -> Dict:
+    from .ai_service import ai_service
+
+    return {'response': ai_service.analisar_planilha(job.payload['file_path'], job.payload['question'])}
+
+
+@tarefa('parse_upload')
+def _tarefa_parse_upload(job: Job) -> Dict:
+    from .models import FileUpload
+    from .uploads import processar_upload
+
+    upload = processar_upload(FileUpload.objects.get(pk=job.payload['upload_id']))
+    return {'parse_status': upload.parse_status, 'rows': upload.rows, 'columns': upload.columns,
+            'error': upload.parse_error}
+
+
+@tarefa('dashboard_insights')
+def _tarefa_dashboard_insights(job: Job) -> Dict:
+    from .ai_service import ai_service
+    from .dashboard_snapshots import dashboard_snapshots
+
+    file_path = job.payload['file_path']
+    insights = ai_service.dashboard_insights(file_path)
+    if job.user_id:
+        dashboard_snapshots.guardar_insights(job.user_id, file_path, insights)
+    return {'insights': insights}
+
+
+@tarefa('dashboard_refresh')
+def _tarefa_dashboard_refresh(job: Job) -> Dict:
+    from .dashboard_snapshots import dashboard_snapshots
+
+    return dashboard_snapshots.recalcular(job.user_id, job.payload.get('file_path'))
@@ -0,0 +1,65 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from agent import jobs
+
+
+class Command(BaseCommand):
+    help = "Worker da fila de tarefas de IA (agent.jobs). Rode um ou mais processos ao lado do servidor web."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Tarefas executadas em paralelo neste processo.')
+        parser.add_argument('--once', action='store_true', help='Processa o que houver na fila e encerra.')
+
+    def handle(self, *args, **options):
+        parar = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: parar.set())
+
+        intervalo = jobs.config()['POLL_INTERVAL']
+        intervalo_limpeza = jobs.config()['STALE_AFTER'] / 10
+        intervalo_sinal = jobs.config()['HEARTBEAT_TIMEOUT'] / 3
+        processo = f"{socket.gethostname()}:{os.getpid()}"
+        # Sinal de vida antes da primeira tarefa: o servidor deixa de executar tarefas por conta própria
+        jobs.sinal_de_vida(processo)
+        ultimo_sinal = time.monotonic()
+        self.stdout.write(f"Worker de tarefas iniciado ({options['concurrency']} em paralelo). Ctrl+C para encerrar.")
+
+        def loop():
+            worker = jobs.nome_worker()
+            ultima_limpeza = 0.0
+            while not parar.is_set():
+                if time.monotonic() - ultima_limpeza > intervalo_limpeza:
+                    # Recupera tarefas de workers que caíram no meio da execução
+                    jobs.liberar_abandonadas()
+                    ultima_limpeza = time.monotonic()
+                close_old_connections()
+                job = jobs.processar_proximo(worker)
+                if job is not None:
+                    self.stdout.write(f"[{job.status}] {job.kind} {job.pk} {job.error}".rstrip())
+                elif options['once']:
+                    break
+                else:
+                    parar.wait(intervalo)
+            close_old_connections()
+
+        threads = [threading.Thread(target=loop, name=f'job-worker-{i}') for i in range(max(options['concurrency'], 1))]
+        for t in threads:
+            t.start()
+        # join com timeout para o sinal ser tratado na thread principal, que também renova o sinal de vida
+        # (mesmo com todas as threads ocupadas em tarefas longas)
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=0.5)
+            if time.monotonic() - ultimo_sinal > intervalo_sinal:
+                jobs.sinal_de_vida(processo)
+                ultimo_sinal = time.monotonic()
+        jobs.encerrar_worker(processo)
+        close_old_connections()
+        self.stdout.write("Worker encerrado.")
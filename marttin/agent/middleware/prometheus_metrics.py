@@ -0,0 +1,48 @@
+"""Latência das requisições por view, exposta junto das métricas dos agentes em ``/metrics``."""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Direto do pacote de agentes: carregar o middleware não deve montar o grafo (ver AgentConfig.ready)
+from metricas import registro_metricas
+
+DURACAO_REQUISICAO = registro_metricas.histograma(
+    "marttin_http_request_seconds", "Duração das requisições HTTP por view.", ("view", "method", "status"))
+
+
+def _nome_view(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<nao_resolvida>"
+
+
+class PrometheusMetricsMiddleware:
+    """Mede o tempo até a resposta (para streaming, até o início do corpo)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        self._observar(request, response, inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        self._observar(request, response, inicio)
+        return response
+
+    @staticmethod
+    def _observar(request, response, inicio: float):
+        DURACAO_REQUISICAO.observar(
+            time.perf_counter() - inicio,
+            view=_nome_view(request), method=request.method, status=response.status_code,
+        )
@@ -0,0 +1,163 @@
+"""Limite de requisições por usuário/IP (token bucket) com orçamento separado para as views que chamam o LLM.
+
+Cada cliente (usuário autenticado ou, sem login, o IP) tem um balde geral, que
+vale para todas as requisições, e um balde ``LLM`` consumido só pelas views de
+``LLM_VIEWS`` (cada uma com o seu custo: uma mensagem de chat gera pelo menos
+duas chamadas ao LLM). Anônimos usam o orçamento ``LLM_ANONIMO``, menor.
+
+Os baldes ficam num SQLite local em modo WAL, compartilhado pelos processos do
+servidor; a leitura e a atualização de um balde acontecem na mesma transação
+(``BEGIN IMMEDIATE``). Requisição sem saldo recebe 429 com ``Retry-After`` sem
+chegar à view. Se o SQLite falhar, a requisição passa (não derruba o site).
+"""
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from metricas import registro_metricas
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DB_PATH': None,  # padrão: BASE_DIR/rate_limit.sqlite3
+    'GERAL': {'CAPACITY': 120, 'PER_SECOND': 2.0},
+    'LLM': {'CAPACITY': 12, 'PER_SECOND': 0.2},
+    'LLM_ANONIMO': {'CAPACITY': 4, 'PER_SECOND': 0.05},
+    # view -> fichas do balde LLM consumidas por requisição
+    'LLM_VIEWS': {
+        'agent:chat_api': 2,
+        'agent:chat_stream_api': 2,
+        'agent:jobs_api': 2,
+        'agent:dashboard_insights_api': 1,
+        'agent:dashboard_data_api': 1,
+    },
+    'EXEMPT_VIEWS': [],
+    # Cabeçalho com o IP real atrás de um proxy confiável (ex.: 'HTTP_X_FORWARDED_FOR')
+    'CLIENT_IP_HEADER': None,
+    # Proxies confiáveis na frente do Django: cada um acrescenta um IP à direita do cabeçalho,
+    # então o IP do cliente é o N-ésimo a partir da direita (os da esquerda o cliente pode forjar)
+    'TRUSTED_PROXY_HOPS': 1,
+}
+
+# Intervalo entre limpezas dos baldes parados (já cheios de novo)
+_LIMPEZA_SEGUNDOS = 600
+
+REQUISICOES_LIMITADAS = registro_metricas.contador(
+    "marttin_rate_limited_total", "Requisições recusadas (429) por orçamento.", ("orcamento",))
+
+
+def config() -> Dict:
+    conf = {**DEFAULTS, **getattr(settings, 'RATE_LIMIT', {})}
+    if not conf['DB_PATH']:
+        conf['DB_PATH'] = Path(settings.BASE_DIR) / 'rate_limit.sqlite3'
+    return conf
+
+
+class BaldesSQLite:
+    """Token buckets persistidos em SQLite (uma conexão por thread)."""
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        self._local = threading.local()
+        self._ultima_limpeza = 0.0
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS baldes ('
+                'chave TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL, cheio_em REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def consumir(self, chave: str, capacidade: float, por_segundo: float, custo: float = 1) -> float:
+        """Retira ``custo`` fichas do balde; retorna 0 se conseguiu ou os segundos até haver saldo."""
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            linha = conn.execute('SELECT fichas, atualizado FROM baldes WHERE chave = ?', (chave,)).fetchone()
+            fichas = capacidade if linha is None else min(capacidade, linha[0] + (agora - linha[1]) * por_segundo)
+            espera = 0.0
+            if fichas >= custo:
+                fichas -= custo
+            else:
+                espera = (min(custo, capacidade) - fichas) / por_segundo
+            cheio_em = agora + (capacidade - fichas) / por_segundo
+            conn.execute(
+                'INSERT INTO baldes (chave, fichas, atualizado, cheio_em) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(chave) DO UPDATE SET fichas = excluded.fichas, '
+                'atualizado = excluded.atualizado, cheio_em = excluded.cheio_em',
+                (chave, fichas, agora, cheio_em),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if agora - self._ultima_limpeza > _LIMPEZA_SEGUNDOS:
+            self._ultima_limpeza = agora
+            # Balde que já encheu de novo equivale a um balde inexistente
+            conn.execute('DELETE FROM baldes WHERE cheio_em < ?', (agora,))
+        return espera
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """Recusa com 429 as requisições de clientes sem saldo no balde geral ou no do LLM."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.conf = config()
+        self.baldes = BaldesSQLite(self.conf['DB_PATH'])
+
+    def _cliente(self, request) -> str:
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"u{user.pk}"
+        ip = None
+        if self.conf['CLIENT_IP_HEADER']:
+            ips = [p.strip() for p in request.META.get(self.conf['CLIENT_IP_HEADER'], '').split(',') if p.strip()]
+            saltos = max(1, int(self.conf['TRUSTED_PROXY_HOPS']))
+            if len(ips) >= saltos:
+                ip = ips[-saltos]
+        return f"ip{ip or request.META.get('REMOTE_ADDR', '')}"
+
+    def _orcamentos(self, request, view_name: str):
+        cliente = self._cliente(request)
+        yield 'GERAL', f"geral:{cliente}", 1
+        custo = self.conf['LLM_VIEWS'].get(view_name)
+        if custo:
+            orcamento = 'LLM' if cliente.startswith('u') else 'LLM_ANONIMO'
+            yield orcamento, f"llm:{cliente}", custo
+
+    def process_view(self, request, view_func, view_args, view_kwargs) -> Optional[JsonResponse]:
+        if not self.conf['ENABLED']:
+            return None
+        view_name = request.resolver_match.view_name if request.resolver_match else ''
+        if view_name in self.conf['EXEMPT_VIEWS']:
+            return None
+        for orcamento, chave, custo in self._orcamentos(request, view_name):
+            limite = self.conf[orcamento]
+            try:
+                espera = self.baldes.consumir(chave, limite['CAPACITY'], limite['PER_SECOND'], custo)
+            except sqlite3.Error as e:
+                print(f"⚠️ Rate limit indisponível ({e}); requisição liberada.")
+                return None
+            if espera:
+                REQUISICOES_LIMITADAS.inc(orcamento=orcamento)
+                response = JsonResponse({
+                    'status': 'error',
+                    'message': 'Muitas requisições. Aguarde alguns instantes e tente novamente.',
+                }, status=429)
+                response['Retry-After'] = str(max(1, math.ceil(espera)))
+                return response
+        return None
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0002_company_annual_revenue_company_competitive_advantage_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatMessage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("session_key", models.CharField(max_length=64, verbose_name="Sessão")),
+                (
+                    "role",
+                    models.CharField(
+                        choices=[("user", "Usuário"), ("assistant", "Assistente")],
+                        max_length=16,
+                    ),
+                ),
+                ("content", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_messages",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mensagem do Chat",
+                "verbose_name_plural": "Mensagens do Chat",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["session_key", "-id"], name="chatmsg_session_recent_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0003_chatmessage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                (
+                    "source_path",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=500,
+                        verbose_name="Planilha de origem",
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(blank=True, default="", max_length=64),
+                ),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dashboard_snapshot",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Snapshot do Dashboard",
+                "verbose_name_plural": "Snapshots do Dashboard",
+            },
+        ),
+    ]
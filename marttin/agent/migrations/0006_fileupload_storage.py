@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0005_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fileupload",
+            name="columns",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Colunas"
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="file_path",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=500,
+                verbose_name="Caminho no servidor",
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="parse_error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="parse_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("pending", "Aguardando processamento"),
+                    ("done", "Processado"),
+                    ("failed", "Falhou"),
+                ],
+                default="",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="parsed_path",
+            field=models.CharField(
+                blank=True, default="", max_length=500, verbose_name="Arquivo colunar"
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="rows",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Linhas"
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="sha256",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="fileupload",
+            name="size",
+            field=models.PositiveBigIntegerField(
+                blank=True, null=True, verbose_name="Tamanho (bytes)"
+            ),
+        ),
+    ]
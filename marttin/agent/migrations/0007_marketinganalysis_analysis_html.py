@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0006_fileupload_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="marketinganalysis",
+            name="analysis_html",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
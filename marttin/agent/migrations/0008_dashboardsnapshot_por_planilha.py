@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0007_marketinganalysis_analysis_html"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dashboardsnapshot",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="dashboard_snapshots",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dashboardsnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("user", "source_path"),
+                name="dashboard_snapshot_user_source_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("agent", "0008_dashboardsnapshot_por_planilha"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobWorker",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("last_seen", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Worker de tarefas",
+                "verbose_name_plural": "Workers de tarefas",
+            },
+        ),
+    ]
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -76,8 +77,12 @@ class MarketingAnalysis(models.Model):
     current_strategy = models.TextField(verbose_name='Estratégia Atual')
     goals = models.TextField(verbose_name='Objetivos de Marketing')
     analysis_result = models.JSONField(verbose_name='Resultado da Análise', null=True, blank=True)
+    # HTML das seções em Markdown de analysis_result, gerado ao salvar
+    analysis_html = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    HTML_SECTIONS = ('insights', 'recommendations', 'growth_strategies', 'next_steps')
+
     class Meta:
         verbose_name = 'Análise de Marketing'
         verbose_name_plural = 'Análises de Marketing'
@@ -86,11 +91,44 @@ class MarketingAnalysis(models.Model):
     def __str__(self):
         return f'Análise - {self.company.business_name} - {self.created_at.strftime("%d/%m/%Y")}'
 
+    def render_html(self):
+        from .utils.markdown_utils import render_markdown
+
+        result = self.analysis_result or {}
+        self.analysis_html = {
+            key: str(render_markdown(result.get(key) or '')) for key in self.HTML_SECTIONS
+        }
+
+    def save(self, *args, **kwargs):
+        self.render_html()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'analysis_result' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'analysis_html'}
+        super().save(*args, **kwargs)
+
 class FileUpload(models.Model):
+    PARSE_STATUS_CHOICES = [
+        ('pending', 'Aguardando processamento'),
+        ('done', 'Processado'),
+        ('failed', 'Falhou'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='file_uploads')
     file_name = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # Armazenamento endereçado por conteúdo (ver agent/uploads.py)
+    file_path = models.CharField(max_length=500, blank=True, default='', verbose_name='Caminho no servidor')
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Tamanho (bytes)')
+
+    # Pré-processamento em segundo plano (planilha convertida para formato colunar)
+    rows = models.PositiveIntegerField(null=True, blank=True, verbose_name='Linhas')
+    columns = models.PositiveIntegerField(null=True, blank=True, verbose_name='Colunas')
+    parsed_path = models.CharField(max_length=500, blank=True, default='', verbose_name='Arquivo colunar')
+    parse_status = models.CharField(max_length=16, choices=PARSE_STATUS_CHOICES, blank=True, default='')
+    parse_error = models.TextField(blank=True, default='')
+
     class Meta:
         ordering = ['-uploaded_at']
         verbose_name = 'Arquivo Enviado'
@@ -98,3 +136,86 @@ class FileUpload(models.Model):
 
     def __str__(self):
         return self.file_name
+
+class ChatMessage(models.Model):
+    ROLE_CHOICES = [
+        ('user', 'Usuário'),
+        ('assistant', 'Assistente'),
+    ]
+
+    session_key = models.CharField(max_length=64, verbose_name='Sessão')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_messages', null=True, blank=True)
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['session_key', '-id'], name='chatmsg_session_recent_idx')]
+        verbose_name = 'Mensagem do Chat'
+        verbose_name_plural = 'Mensagens do Chat'
+
+    def __str__(self):
+        return f'{self.session_key} [{self.role}]'
+
+class DashboardSnapshot(models.Model):
+    """Último payload calculado do dashboard de cada usuário e planilha (servido enquanto é recalculado)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_snapshots')
+    payload = models.JSONField(default=dict)
+    source_path = models.CharField(max_length=500, blank=True, default='', verbose_name='Planilha de origem')
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'source_path'], name='dashboard_snapshot_user_source_uniq'),
+        ]
+        verbose_name = 'Snapshot do Dashboard'
+        verbose_name_plural = 'Snapshots do Dashboard'
+
+    def __str__(self):
+        return f'Dashboard - {self.user} - {self.computed_at:%d/%m/%Y %H:%M}'
+
+class Job(models.Model):
+    """Tarefa de IA executada fora da requisição pelo worker (python manage.py run_jobs)."""
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('running', 'Em execução'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    kind = models.CharField(max_length=50, verbose_name='Tipo')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='job_status_created_idx')]
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+
+    def __str__(self):
+        return f'{self.kind} [{self.status}]'
+
+
+class JobWorker(models.Model):
+    """Sinal de vida de um processo ``run_jobs``; sem nenhum recente, as tarefas rodam no próprio servidor."""
+    name = models.CharField(max_length=100, primary_key=True)
+    last_seen = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Worker de tarefas'
+        verbose_name_plural = 'Workers de tarefas'
+
+    def __str__(self):
+        return self.name
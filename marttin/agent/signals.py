@@ -0,0 +1,25 @@
+"""Recalcula o snapshot do dashboard quando a entrada do usuário muda e apaga uploads sem uso."""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Company, FileUpload
+
+
+@receiver(post_save, sender=FileUpload)
+@receiver(post_save, sender=Company)
+def invalidar_dashboard(sender, instance, **kwargs):
+    from .dashboard_snapshots import dashboard_snapshots
+
+    if sender is FileUpload and instance.parse_status == 'pending':
+        return  # a tarefa parse_upload lê a planilha; o dashboard é recalculado quando ela terminar
+    user_id = instance.user_id
+    transaction.on_commit(lambda: dashboard_snapshots.invalidar(user_id))
+
+
+@receiver(post_delete, sender=FileUpload)
+def apagar_blob_sem_uso(sender, instance, **kwargs):
+    from .uploads import remover_blob_sem_uso
+
+    caminho = instance.file_path
+    transaction.on_commit(lambda: remover_blob_sem_uso(caminho))
@@ -48,6 +48,7 @@ function addMessage(content, isUser = false, isHtml = false) {
   requestAnimationFrame(() => {
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
   });
+  return contentDiv;
 }
 
 function showTyping() {
@@ -64,6 +65,108 @@ function hideTyping() {
   el.classList.remove('show');
 }
 
+function parseSseEvent(raw) {
+  let event = 'message';
+  let data = '';
+  raw.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data += line.slice(5).trim();
+  });
+  try {
+    return { event, data: data ? JSON.parse(data) : {} };
+  } catch (e) {
+    return { event, data: {} };
+  }
+}
+
+// Resposta transmitida via SSE: mostra o texto conforme chega e substitui por HTML renderizado pelo servidor
+async function streamMessage(url, message) {
+  const resp = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': window.csrfToken || (document.querySelector('[name=csrfmiddlewaretoken]')?.value || '') },
+    body: JSON.stringify({ message, conversation_history: conversationHistory })
+  });
+  const contentType = resp.headers.get('Content-Type') || '';
+  if (!resp.ok || !resp.body || !contentType.startsWith('text/event-stream')) {
+    // O servidor recusou o stream sem processar a mensagem: a API JSON pode ser usada
+    const err = new Error('stream indisponível');
+    err.fallback = true;
+    throw err;
+  }
+
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let html = '';
+  let pending = '';
+  let full = '';
+  let contentDiv = null;
+
+  const paint = () => {
+    if (!contentDiv) {
+      hideTyping();
+      contentDiv = addMessage('', false, true);
+    }
+    contentDiv.innerHTML = html;
+    if (pending) {
+      const tail = document.createElement('p');
+      tail.textContent = pending;
+      contentDiv.appendChild(tail);
+    }
+    const messagesContainer = document.getElementById('chatMessages');
+    if (messagesContainer) messagesContainer.scrollTop = messagesContainer.scrollHeight;
+  };
+
+  while (true) {
+    let chunk;
+    try {
+      chunk = await reader.read();
+    } catch (e) {
+      // Stream aceito: o servidor segue processando (e salva) a mensagem mesmo sem o cliente,
+      // então não reenvia pela API JSON; mostra o trecho recebido com o erro
+      pending += (full ? '\n\n' : '') + 'A conexão foi interrompida antes do fim da resposta.';
+      paint();
+      break;
+    }
+    const { value, done } = chunk;
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buffer.indexOf('\n\n')) !== -1) {
+      const ev = parseSseEvent(buffer.slice(0, idx));
+      buffer = buffer.slice(idx + 2);
+      if (ev.event === 'token') {
+        full += ev.data.text || '';
+        pending += ev.data.text || '';
+      } else if (ev.event === 'html') {
+        html += ev.data.html || '';
+        const cut = pending.lastIndexOf('\n\n');
+        pending = cut === -1 ? '' : pending.slice(cut + 2);
+      } else if (ev.event === 'done') {
+        pending = '';
+      } else if (ev.event === 'error') {
+        pending = 'Desculpe, ocorreu um erro: ' + (ev.data.error || 'Tente novamente.');
+      }
+      paint();
+    }
+  }
+  conversationHistory.push({ role: 'assistant', content: full });
+}
+
+// Consulta o status de uma tarefa da fila (/api/jobs/<id>/) até terminar
+async function waitJob(statusUrl, timeoutMs = 180000) {
+  const limit = Date.now() + timeoutMs;
+  while (Date.now() < limit) {
+    await new Promise((r) => setTimeout(r, 1500));
+    const resp = await fetch(statusUrl);
+    const data = await resp.json();
+    if (!data.success) return data;
+    if (data.job.status === 'done') return { success: true, ...data.job.result };
+    if (data.job.status === 'failed') return { success: false, error: data.job.error };
+  }
+  return { success: false, error: 'A resposta demorou demais. Tente novamente.' };
+}
+
 async function sendMessage() {
   const input = document.getElementById('messageInput');
   const sendButton = document.getElementById('sendButton');
@@ -85,13 +188,28 @@ async function sendMessage() {
   showTyping();
 
   try {
+    const streamUrl = container.dataset.streamUrl;
+    if (streamUrl && window.ReadableStream) {
+      try {
+        await streamMessage(streamUrl, message);
+        return;
+      } catch (e) {
+        // Só segue para a API JSON se o servidor recusou o stream; com a requisição já
+        // aceita (ou em falha de rede), reenviar duplicaria a chamada ao LLM e o histórico
+        if (!e.fallback) throw e;
+      }
+    }
     const apiUrl = container.dataset.apiUrl;
     const resp = await fetch(apiUrl, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json', 'X-CSRFToken': window.csrfToken || (document.querySelector('[name=csrfmiddlewaretoken]')?.value || '') },
-      body: JSON.stringify({ message, conversation_history: conversationHistory })
+      body: JSON.stringify({ message, conversation_history: conversationHistory, async: true })
     });
-    const data = await resp.json();
+    let data = await resp.json();
+    if (data.success && data.job_id) {
+      // Usuário logado: a mensagem virou uma tarefa da fila; aguarda o resultado
+      data = await waitJob(data.status_url);
+    }
 
     hideTyping();
 
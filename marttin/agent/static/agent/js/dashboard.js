@@ -3,9 +3,67 @@
   const $ = (sel, ctx=document) => ctx.querySelector(sel);
   const formatBRL = (n)=> new Intl.NumberFormat('pt-BR',{style:'currency',currency:'BRL'}).format(n);
 
+  function renderInsights(list){
+    const insights = $('#insightsContainer');
+    if (!insights) return;
+    insights.innerHTML = '';
+    (list||[]).forEach(i=>{
+      const div = document.createElement('div');
+      div.className = 'insight';
+      const iconMap = { 'lightbulb':'bi-lightbulb', 'graph-up':'bi-graph-up', 'cash':'bi-cash-coin' };
+      // Títulos e textos podem vir da planilha: sempre como texto, nunca como HTML
+      const icon = document.createElement('i');
+      icon.className = `bi ${iconMap[i.icon]||'bi-lightbulb'}`;
+      const body = document.createElement('div');
+      const title = document.createElement('strong');
+      title.textContent = i.title ?? '';
+      const text = document.createElement('p');
+      text.textContent = i.text ?? '';
+      body.append(title, text);
+      div.append(icon, body);
+      insights.appendChild(div);
+    });
+  }
+
+  const sleep = (ms)=> new Promise(r=>setTimeout(r, ms));
+
+  // Tarefa da fila (/api/jobs/): consulta o status até terminar
+  async function waitJob(statusUrl, timeoutMs=180000){
+    const limit = Date.now() + timeoutMs;
+    while (Date.now() < limit){
+      await sleep(1500);
+      const res = await fetch(statusUrl);
+      const json = await res.json();
+      if (!json.success) throw new Error(json.error||'Tarefa não encontrada');
+      if (json.job.status === 'done') return json.job.result;
+      if (json.job.status === 'failed') throw new Error(json.job.error||'Tarefa falhou');
+    }
+    throw new Error('Tempo esgotado aguardando a tarefa');
+  }
+
+  // Os insights do LLM rodam no worker da fila, fora da requisição web
+  async function loadInsights(filePath){
+    try{
+      const res = await fetch('/api/jobs/', {
+        method:'POST',
+        headers:{'Content-Type':'application/json'},
+        body: JSON.stringify({kind:'dashboard_insights', payload: filePath ? {file_path:filePath} : {}})
+      });
+      const json = await res.json();
+      if (!json.success) throw new Error(json.error||'Erro desconhecido');
+      const result = await waitJob(json.status_url);
+      renderInsights(result.insights);
+    }catch(e){
+      console.error('Dashboard insights error', e);
+    }
+  }
+
   async function loadData(){
+    // Repassa ?file_path= da página para a API
+    const filePath = new URLSearchParams(window.location.search).get('file_path');
+    const query = filePath ? `?file_path=${encodeURIComponent(filePath)}` : '';
     try{
-      const res = await fetch('/api/dashboard-data/');
+      const res = await fetch('/api/dashboard-data/' + query);
       const json = await res.json();
       if(!json.success) throw new Error(json.error||'Erro desconhecido');
       const d = json.data;
@@ -41,31 +99,35 @@
       const tbody = $('#latestSalesBody');
       if (tbody){
         tbody.innerHTML = '';
+        // Células vêm da planilha enviada: preenchidas com textContent
+        const cell = (text)=>{
+          const td = document.createElement('td');
+          td.textContent = text ?? '';
+          return td;
+        };
         (d.latest_sales||[]).forEach((r)=>{
           const tr = document.createElement('tr');
-          tr.innerHTML = `
-            <td>${r.id}</td>
-            <td>${(r.data||'').split('T')[0].split('-').reverse().join('/')}</td>
-            <td>${r.cliente}</td>
-            <td>${r.canal}</td>
-            <td>${formatBRL(r.valor||0)}</td>
-            <td><span class="status ${r.status==='Pago'?'ok':'pending'}">${r.status}</span></td>`;
+          const status = document.createElement('span');
+          status.className = `status ${r.status==='Pago'?'ok':'pending'}`;
+          status.textContent = r.status ?? '';
+          const statusTd = document.createElement('td');
+          statusTd.appendChild(status);
+          tr.append(
+            cell(r.id),
+            cell(String(r.data||'').split('T')[0].split('-').reverse().join('/')),
+            cell(r.cliente),
+            cell(r.canal),
+            cell(formatBRL(r.valor||0)),
+            statusTd
+          );
           tbody.appendChild(tr);
         });
       }
 
       // Insights
-      const insights = $('#insightsContainer');
-      if (insights){
-        insights.innerHTML = '';
-        (d.insights||[]).forEach(i=>{
-          const div = document.createElement('div');
-          div.className = 'insight';
-          const iconMap = { 'lightbulb':'bi-lightbulb', 'graph-up':'bi-graph-up', 'cash':'bi-cash-coin' };
-          div.innerHTML = `<i class="bi ${iconMap[i.icon]||'bi-lightbulb'}"></i><div><strong>${i.title}</strong><p>${i.text}</p></div>`;
-          insights.appendChild(div);
-        });
-      }
+      renderInsights(d.insights);
+      // Números vêm da planilha na hora; os insights do LLM chegam depois
+      if (d.insights_pendentes) loadInsights(filePath);
     }catch(e){
       console.error('Dashboard load error', e);
     }
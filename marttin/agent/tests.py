@@ -1,3 +1,227 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from agent import jobs
+
+from agent.conversation_store import ConversationStore
+from agent.middleware.rate_limiting import RateLimitMiddleware
+from agent.models import ChatMessage, FileUpload, Job
+from agent.uploads import planilha_do_usuario, salvar_upload
+
+
+class ConversationStoreTests(TestCase):
+    def test_outro_worker_grava_na_sessao(self):
+        # Dois stores simulam dois workers servindo a mesma sessão
+        a = ConversationStore(window=4, summary_max_chars=0)
+        b = ConversationStore(window=4, summary_max_chars=0)
+        a.add_turn('user:1', 'p1', 'r1')
+        self.assertEqual([m.content for m in b.history('user:1')], ['p1', 'r1'])
+
+        b.add_turn('user:1', 'p2', 'r2')
+        self.assertEqual([m.content for m in a.history('user:1')], ['p1', 'r1', 'p2', 'r2'])
+
+        a.add_turn('user:1', 'p3', 'r3')
+        self.assertEqual([m.content for m in b.history('user:1')], ['p2', 'r2', 'p3', 'r3'])
+
+    def test_resumo_igual_em_qualquer_worker(self):
+        a = ConversationStore(window=4, summary_max_chars=500)
+        for i in range(8):
+            a.add_turn('user:3', f'p{i}', f'r{i}')
+            a.history('user:3')
+        b = ConversationStore(window=4, summary_max_chars=500)
+        self.assertEqual([m.content for m in b.history('user:3')], [m.content for m in a.history('user:3')])
+        self.assertIn('p5', b.history('user:3')[0].content)
+        self.assertNotIn('p3', b.history('user:3')[0].content)
+
+    def test_uma_consulta_por_leitura_e_por_turno(self):
+        a = ConversationStore(window=4, summary_max_chars=500)
+        a.add_turn('user:4', 'p1', 'r1')
+        a.history('user:4')
+        with self.assertNumQueries(1):
+            a.history('user:4')
+        with self.assertNumQueries(1):
+            a.add_turn('user:4', 'p2', 'r2')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(a.history('user:4')), 4)
+
+    def test_sessao_apagada_por_outro_worker(self):
+        a = ConversationStore(window=4, summary_max_chars=0)
+        a.add_turn('user:2', 'p1', 'r1')
+        ChatMessage.objects.filter(session_key='user:2').delete()
+        self.assertEqual(a.history('user:2'), [])
+
+
+@override_settings(RATE_LIMIT={'ENABLED': False})
+class PlanilhaDoUsuarioTests(TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.dono = User.objects.create_user('dono', password='x')
+        self.outro = User.objects.create_user('outro', password='x')
+        self.caminho = str(self.dir / 'vendas.csv')
+        Path(self.caminho).write_text('data,valor\n2024-01-01,10\n', encoding='utf-8')
+        FileUpload.objects.create(user=self.dono, file_name='vendas.csv', file_path=self.caminho)
+
+    def test_so_o_dono_acessa_a_planilha(self):
+        self.assertEqual(planilha_do_usuario(self.dono, self.caminho), self.caminho)
+        self.assertIsNone(planilha_do_usuario(self.outro, self.caminho))
+        self.assertIsNone(planilha_do_usuario(self.dono, '/etc/passwd'))
+
+    def test_apis_do_dashboard_recusam_arquivo_de_outro_usuario(self):
+        self.client.force_login(self.outro)
+        for url in ('/api/dashboard-data/', '/api/dashboard-insights/'):
+            for caminho in (self.caminho, '/etc/hosts.csv'):
+                resposta = self.client.get(url, {'file_path': caminho})
+                self.assertEqual(resposta.status_code, 404, (url, caminho))
+
+
+@override_settings(JOBS={'EAGER': False})
+class ArmazenamentoDeUploadsTests(TestCase):
+    def setUp(self):
+        base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base)
+        configuracao = override_settings(BASE_DIR=base)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        # O recálculo do dashboard roda em outra thread; aqui só importa se ele é pedido
+        invalidar = mock.patch('agent.dashboard_snapshots.dashboard_snapshots.invalidar')
+        self.invalidar = invalidar.start()
+        self.addCleanup(invalidar.stop)
+
+    def test_blob_compartilhado_sai_com_o_ultimo_upload(self):
+        a = User.objects.create_user('a', password='x')
+        b = User.objects.create_user('b', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            ua = salvar_upload(a, SimpleUploadedFile('notas.txt', b'mesmo conteudo'))
+            ub = salvar_upload(b, SimpleUploadedFile('copia.txt', b'mesmo conteudo'))
+        self.assertEqual(ua.file_path, ub.file_path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()  # apagar a conta remove os uploads em cascata
+        self.assertTrue(Path(ub.file_path).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            ub.delete()
+        self.assertFalse(Path(ub.file_path).exists())
+
+    def test_planilha_pendente_nao_recalcula_o_dashboard(self):
+        user = User.objects.create_user('u', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = salvar_upload(user, SimpleUploadedFile('vendas.csv', b'data,valor\n2024-01-01,10\n'))
+        self.assertEqual(upload.parse_status, 'pending')
+        self.invalidar.assert_not_called()
+        self.assertTrue(Job.objects.filter(kind='parse_upload').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.parse_status = 'done'
+            upload.save(update_fields=['parse_status'])
+        self.invalidar.assert_called_once_with(user.pk)
+
+
+class ReservaDeTarefasTests(TestCase):
+    def test_dois_workers_nao_reservam_a_mesma_tarefa(self):
+        job = jobs.enfileirar('planilha', {'file_path': 'x.csv', 'question': '?'})
+        self.assertEqual(jobs.reservar('w1').pk, job.pk)
+        self.assertIsNone(jobs.reservar('w2'))
+        self.assertEqual(Job.objects.get(pk=job.pk).worker, 'w1')
+
+    def test_corrida_entre_a_leitura_e_a_reserva(self):
+        primeira = jobs.enfileirar('planilha', {'file_path': 'a.csv', 'question': '?'})
+        segunda = jobs.enfileirar('planilha', {'file_path': 'b.csv', 'question': '?'})
+        agora = timezone.now
+
+        def outro_worker_reserva_antes():
+            # w2 reserva a primeira tarefa depois que w1 já leu os candidatos da fila
+            Job.objects.filter(pk=primeira.pk).update(status='running', worker='w2')
+            relogio.side_effect = None
+            return agora()
+
+        with mock.patch('agent.jobs.timezone.now', side_effect=outro_worker_reserva_antes) as relogio:
+            relogio.return_value = agora()
+            reservada = jobs.reservar('w1')
+
+        self.assertEqual(reservada.pk, segunda.pk)
+        self.assertEqual(Job.objects.get(pk=primeira.pk).worker, 'w2')
+        self.assertEqual(Job.objects.get(pk=primeira.pk).attempts, 0)
+
+    @override_settings(RATE_LIMIT={'ENABLED': False})
+    def test_tarefa_de_planilha_exige_upload_do_usuario(self):
+        self.client.force_login(User.objects.create_user('u', password='x'))
+        resposta = self.client.post('/api/jobs/', {'kind': 'planilha', 'payload': {
+            'file_path': '/etc/passwd.csv', 'question': 'resuma'}}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 404)
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(RATE_LIMIT={'ENABLED': False})
+    def test_file_path_que_nao_e_texto(self):
+        self.client.force_login(User.objects.create_user('u', password='x'))
+        for payload in ({'file_path': 123, 'question': 'resuma'}, {'file_path': ['a.csv'], 'question': 'resuma'}):
+            resposta = self.client.post('/api/jobs/', {'kind': 'planilha', 'payload': payload},
+                                        content_type='application/json')
+            self.assertEqual(resposta.status_code, 400)
+
+    def test_sem_worker_ativo_executa_no_servidor(self):
+        self.assertTrue(jobs.executar_no_servidor())
+        jobs.sinal_de_vida('host:1')
+        self.assertFalse(jobs.executar_no_servidor())
+        with override_settings(JOBS={'EAGER': True}):
+            self.assertTrue(jobs.executar_no_servidor())
+        jobs.encerrar_worker('host:1')
+        self.assertTrue(jobs.executar_no_servidor())
+
+        jobs.sinal_de_vida('host:2')
+        with mock.patch('agent.jobs.timezone.now', return_value=timezone.now() + timedelta(seconds=60)):
+            self.assertTrue(jobs.executar_no_servidor())
+
+    def test_chat_reexecutado_grava_o_turno_uma_vez(self):
+        from agent.ai_service import ai_service
+
+        user = User.objects.create_user('u', password='x')
+        job = jobs.enfileirar('chat', {'message': 'oi', 'session_key': 'user:u'}, user=user)
+        with mock.patch.object(ai_service, 'run_ai_consultor', return_value={'resposta_final': 'olá'}), \
+                mock.patch('agent.utils.markdown_utils.render_markdown', side_effect=[ConnectionError('falhou'), '<p>olá</p>']):
+            self.assertEqual(jobs.executar(jobs.reservar('w1', job_id=job.pk)).status, 'pending')
+            self.assertEqual(jobs.executar(jobs.reservar('w1', job_id=job.pk)).status, 'done')
+        self.assertEqual(list(ChatMessage.objects.filter(session_key='user:u').values_list('content', flat=True)),
+                         ['oi', 'olá'])
+
+
+@override_settings(RATE_LIMIT={'ENABLED': False}, METRICS={'TOKEN': 's3gredo'})
+class MetricsViewTests(TestCase):
+    def test_exige_staff_ou_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer errado').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3gredo').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('comum', password='x'))
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.client.force_login(User.objects.create_user('admin', password='x', is_staff=True))
+        resposta = self.client.get('/metrics')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn(b'marttin_http_request_seconds', resposta.content)
+
+
+class RateLimitClienteTests(TestCase):
+    def _cliente(self, encaminhado, saltos=1):
+        conf = {'CLIENT_IP_HEADER': 'HTTP_X_FORWARDED_FOR', 'TRUSTED_PROXY_HOPS': saltos,
+                'DB_PATH': ':memory:'}
+        with override_settings(RATE_LIMIT=conf):
+            middleware = RateLimitMiddleware(lambda request: None)
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR=encaminhado, REMOTE_ADDR='10.0.0.1')
+        return middleware._cliente(request)
+
+    def test_ip_forjado_pelo_cliente_nao_muda_o_balde(self):
+        # O proxy acrescenta o IP real (203.0.113.7) à direita do que o cliente enviou
+        self.assertEqual(self._cliente('1.2.3.4, 203.0.113.7'), 'ip203.0.113.7')
+        self.assertEqual(self._cliente('5.6.7.8, 203.0.113.7'), 'ip203.0.113.7')
+
+    def test_varios_proxies_confiaveis(self):
+        self.assertEqual(self._cliente('1.2.3.4, 203.0.113.7, 10.0.0.2', saltos=2), 'ip203.0.113.7')
+        self.assertEqual(self._cliente('203.0.113.7', saltos=2), 'ip10.0.0.1')
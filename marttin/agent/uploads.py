@@ -0,0 +1,117 @@
+"""Armazenamento dos arquivos enviados pelos usuários.
+
+O upload é gravado em blocos num arquivo temporário enquanto o SHA-256 é
+calculado, e então movido para ``uploads/<sha[:2]>/<sha><ext>``: o mesmo
+conteúdo enviado de novo (pelo mesmo ou por outro usuário) reaproveita o
+arquivo já existente. Planilhas são convertidas em segundo plano (tarefa
+``parse_upload`` da fila em ``agent.jobs``) para o formato colunar do cache de
+planilhas, então as análises seguintes não releem o CSV/Excel original.
+
+Como o arquivo pode ser compartilhado, ele só é apagado do disco quando o
+último ``FileUpload`` que aponta para ele é removido (``remover_blob_sem_uso``,
+chamado pelo sinal ``post_delete``, inclusive ao apagar a conta).
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from .models import FileUpload
+
+EXTENSOES_PLANILHA = {'.csv', '.xlsx', '.xls'}
+
+
+def diretorio_uploads() -> Path:
+    return Path(settings.BASE_DIR) / 'uploads'
+
+
+def planilha_do_usuario(user, caminho: Optional[str]) -> Optional[str]:
+    """``caminho`` se for uma planilha enviada pelo próprio usuário; ``None`` para qualquer outro arquivo."""
+    if not caminho or not isinstance(caminho, str) or Path(caminho).suffix.lower() not in EXTENSOES_PLANILHA:
+        return None
+    if FileUpload.objects.filter(user_id=user.id, file_path=caminho).exists():
+        return caminho if os.path.isfile(caminho) else None
+    # Uploads antigos, gravados como BASE_DIR/uploads/user<id>_<timestamp>_<nome>
+    real = Path(caminho).resolve()
+    if real.parent == diretorio_uploads().resolve() and real.name.startswith(f"user{user.id}_") and real.is_file():
+        return caminho
+    return None
+
+
+def salvar_upload(user, arquivo) -> FileUpload:
+    """Grava o ``UploadedFile`` no armazenamento por conteúdo e registra o ``FileUpload``."""
+    base = diretorio_uploads()
+    tmp_dir = base / 'tmp'
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    ext = Path(arquivo.name).suffix.lower()
+    sha = hashlib.sha256()
+    tamanho = 0
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=ext)
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            for chunk in arquivo.chunks():
+                sha.update(chunk)
+                destino.write(chunk)
+                tamanho += len(chunk)
+        digest = sha.hexdigest()
+        final = base / digest[:2] / f"{digest}{ext}"
+        if final.exists():
+            os.remove(tmp)  # conteúdo já armazenado
+        else:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    upload = FileUpload(
+        user=user, file_name=arquivo.name, file_path=str(final), sha256=digest, size=tamanho,
+    )
+    if ext in EXTENSOES_PLANILHA:
+        # Mesmo conteúdo já processado antes: reaproveita o resultado
+        anterior = (FileUpload.objects.filter(sha256=digest, parse_status='done')
+                    .exclude(parsed_path='').first())
+        if anterior and os.path.exists(anterior.parsed_path):
+            upload.rows, upload.columns = anterior.rows, anterior.columns
+            upload.parsed_path, upload.parse_status = anterior.parsed_path, 'done'
+        else:
+            upload.parse_status = 'pending'
+    upload.save()
+
+    if upload.parse_status == 'pending':
+        from . import jobs
+        jobs.enfileirar('parse_upload', {'upload_id': upload.pk}, user=user)
+    return upload
+
+
+def remover_blob_sem_uso(caminho: str):
+    """Apaga o arquivo de ``uploads/`` se nenhum ``FileUpload`` aponta mais para ele."""
+    if not caminho or FileUpload.objects.filter(file_path=caminho).exists():
+        return
+    real = Path(caminho).resolve()
+    if diretorio_uploads().resolve() not in real.parents:
+        return  # só apaga o que está no armazenamento de uploads
+    try:
+        real.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"⚠️ Não foi possível apagar o upload {real}: {e}")
+
+
+def processar_upload(upload: FileUpload) -> FileUpload:
+    """Lê a planilha uma vez, gerando a cópia colunar, e grava linhas/colunas no ``FileUpload``."""
+    from .ai_service import ai_service
+
+    try:
+        info = ai_service.preprocessar_planilha(upload.file_path, upload.sha256)
+        upload.rows, upload.columns = info['rows'], info['columns']
+        upload.parsed_path = info['parsed_path'] or ''
+        upload.parse_status, upload.parse_error = 'done', ''
+    except Exception as e:
+        upload.parse_status, upload.parse_error = 'failed', str(e)
+    upload.save(update_fields=['rows', 'columns', 'parsed_path', 'parse_status', 'parse_error'])
+    return upload
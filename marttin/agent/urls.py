@@ -13,6 +13,9 @@ urlpatterns = [
     # Rotas do Agente IA
     path('chat/', views.chat_view, name='chat'),
     path('api/chat/', views.chat_api, name='chat_api'),
+    path('api/chat/stream/', views.chat_stream_api, name='chat_stream_api'),
+    path('api/jobs/', views.jobs_api, name='jobs_api'),
+    path('api/jobs/<uuid:job_id>/', views.job_status_api, name='job_status_api'),
     path('marketing-analysis/', views.marketing_analysis_view, name='marketing_analysis'),
     path('api/marketing-analysis/', views.marketing_analysis_api, name='marketing_analysis_api'),
     path('content-ideas/', views.content_ideas_view, name='content_ideas'),
@@ -24,9 +27,13 @@ urlpatterns = [
     path('api/register-company/', views.register_company, name='register_company'),
     path('api/get-company/', views.get_company, name='get_company'),
     path('api/dashboard-data/', views.dashboard_data_api, name='dashboard_data_api'),
+    path('api/dashboard-insights/', views.dashboard_insights_api, name='dashboard_insights_api'),
     path('perfil/', views.profile_view, name='profile'),
 
     # Minhas Análises (Caixa de Entrada) e Detalhe
     path('analises/', views.analyses_list_view, name='analyses'),
     path('analises/<int:analysis_id>/', views.analysis_detail_view, name='analysis_detail'),
+
+    # Métricas (Prometheus)
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,20 +1,37 @@
 # filepath: marttin/agent/utils/markdown_utils.py
+"""Renderização Markdown -> HTML seguro, única para views, templates e streaming.
+
+O mesmo pipeline (pré-processamento, Markdown, sanitização e linkify) atende a
+``render_markdown`` e ao filtro ``markdownify``. As instâncias de ``Markdown`` e
+do ``Cleaner`` do bleach (com o linkify no mesmo passo) são reaproveitadas, uma
+por thread, e o HTML resultante fica em um LRU em memória e no cache do Django,
+indexado pelo SHA-256 do texto.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
 from typing import Optional
+from django.core.cache import cache
 from django.utils.safestring import mark_safe
 import re
 import bleach
-from markdown import markdown
+from bleach.linkifier import LinkifyFilter
+from markdown import Markdown
 
 # Remoção de emojis
 _EMOJI_RE = re.compile(r"[\U0001F300-\U0001FAFF\U00002700-\U000027BF\U0001F1E6-\U0001F1FF\U00002600-\U000026FF\U00002B00-\U00002BFF\uFE0F]", flags=re.UNICODE)
 
+# Extensões: somente interpretação de Markdown, sem tema GitHub
 MD_EXTENSIONS = [
-    'extra',
-    'sane_lists',
-    'nl2br',
+    'extra',        # tabelas, fenced code, etc.
+    'sane_lists',   # listas mais previsíveis
+    'nl2br',        # quebra de linha simples vira <br>
+    'pymdownx.magiclink',  # autolink de URLs
 ]
 MD_EXTENSION_CONFIGS = {}
 
+# Conjuntos permitidos (sem JS/eventos)
 ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS.union({
     'p','pre','code','blockquote','hr','br','span','h1','h2','h3','h4','h5','h6',
     'ul','ol','li','strong','em','del','table','thead','tbody','tr','th','td','img','a','kbd'
@@ -28,24 +45,125 @@ ALLOWED_ATTRS = {
 }
 ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
 
+# Incrementar ao mudar o pipeline: invalida o HTML já cacheado
+RENDER_VERSION = 1
+CACHE_SIZE = 1024            # entradas no LRU em memória
+CACHE_TIMEOUT = 7 * 24 * 3600  # segundos no cache do Django
+
 
 def _preprocess(text: Optional[str]) -> str:
-    s = (text or '').replace('\r\n', '\n')
+    if not text:
+        return ''
+    s = text.replace('\r\n', '\n')
     # Remover emojis
     s = _EMOJI_RE.sub('', s)
+    # Normalizar asteriscos (full-width para ASCII)
+    s = s.replace('＊', '*')
+    # Converter ****texto**** -> **texto**
+    s = re.sub(r"\*{4}\s*([^\n*][^*]*?)\s*\*{4}", r"**\1**", s)
+    # Remover espaços internos em ** texto ** -> **texto**
+    # (sem colar em palavras vizinhas: "**a** e **b**" não vira "**a**e**b**")
+    s = re.sub(r"(?<![*\w])\*\*\s+([^*\n][^*\n]*?)\s+\*\*(?![*\w])", r"**\1**", s)
+    # Quebra antes de títulos em negrito terminando com ':'
+    s = re.sub(r"([^\n])((\*\*[^*]+?\*\*:)\s*)", r"\1\n\2", s)
     # Bullets unicode para listas Markdown
     s = re.sub(r"(?m)^[\t ]*[•·►»]\s+", "- ", s)
     s = re.sub(r"(?<!\n)[\t ]*[•·►»]\s+", "\n- ", s)
-    # Quebra antes de títulos em negrito terminando com ':'
-    s = re.sub(r"([^\n])((\*\*[^*]+?\*\*:)\s*)", r"\1\n\2", s)
     # Normalizar múltiplas quebras de linha
     s = re.sub(r"\n{3,}", "\n\n", s)
     return s
 
 
-def render_markdown(text: Optional[str]) -> str:
-    pre = _preprocess(text)
-    html = markdown(pre, extensions=MD_EXTENSIONS, extension_configs=MD_EXTENSION_CONFIGS, output_format='html5')
-    clean = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, protocols=ALLOWED_PROTOCOLS, strip=True)
-    clean = bleach.linkify(clean)
-    return mark_safe(clean)
+# Markdown e Cleaner não são thread-safe: uma instância de cada por thread
+_local = threading.local()
+
+
+def _renderers():
+    if not hasattr(_local, 'md'):
+        _local.md = Markdown(extensions=MD_EXTENSIONS, extension_configs=MD_EXTENSION_CONFIGS, output_format='html5')
+        _local.cleaner = bleach.Cleaner(
+            tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, protocols=ALLOWED_PROTOCOLS, strip=True,
+            filters=[partial(LinkifyFilter)],
+        )
+    return _local.md, _local.cleaner
+
+
+def _markdown_to_html(text: Optional[str]) -> str:
+    md, cleaner = _renderers()
+    html = md.reset().convert(_preprocess(text))
+    # Sanitiza e aplica linkify em um único passo
+    return cleaner.clean(html)
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+
+_html_cache = _LRU(CACHE_SIZE)
+
+
+def render_markdown(text: Optional[str], use_cache: bool = True) -> str:
+    """Markdown -> HTML seguro (marcado como safe). Textos repetidos vêm do cache."""
+    if not text:
+        return mark_safe('')
+    if not use_cache:
+        return mark_safe(_markdown_to_html(text))
+    key = f"md:{RENDER_VERSION}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+    html = _html_cache.get(key)
+    if html is None:
+        html = cache.get(key)
+        if html is None:
+            html = _markdown_to_html(text)
+            cache.set(key, html, CACHE_TIMEOUT)
+        _html_cache.set(key, html)
+    return mark_safe(html)
+
+
+class MarkdownStreamRenderer:
+    """Renderização incremental para respostas transmitidas token a token.
+
+    Acumula o texto recebido e só renderiza blocos completos (separados por linha
+    em branco e fora de blocos de código ```), devolvendo apenas o HTML novo.
+    Cada bloco é sanitizado como em ``render_markdown``.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta or ''
+        corte = self._ultimo_limite()
+        if corte <= 0:
+            return ''
+        pronto, self._buffer = self._buffer[:corte], self._buffer[corte:]
+        return render_markdown(pronto, use_cache=False)
+
+    def flush(self) -> str:
+        restante, self._buffer = self._buffer, ''
+        return render_markdown(restante, use_cache=False) if restante.strip() else ''
+
+    def _ultimo_limite(self) -> int:
+        # Último "\n\n" que não esteja dentro de um bloco de código aberto
+        pos = self._buffer.rfind('\n\n')
+        while pos != -1:
+            if self._buffer.count('```', 0, pos) % 2 == 0:
+                return pos + 2
+            pos = self._buffer.rfind('\n\n', 0, pos)
+        return 0
@@ -1,21 +1,30 @@
+import contextlib
 import random
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from django.utils.dateparse import parse_date
-from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.conf import settings
-import os
-from .models import Company, MarketingAnalysis, FileUpload
+from django.utils.crypto import constant_time_compare
+from asgiref.sync import sync_to_async
+from .models import Company, MarketingAnalysis, Job
+from . import jobs
+from .uploads import planilha_do_usuario, salvar_upload
 from .ai_service import ai_service
+from .dashboard_snapshots import DASHBOARD_DEMO, dashboard_snapshots, estatisticas_usuario, planilha_mais_recente
 # Adiciona utilitário para renderização Markdown segura
-from .utils.markdown_utils import render_markdown
+from .utils.markdown_utils import render_markdown, MarkdownStreamRenderer
+# Módulos de Agents-ia/agents (no sys.path desde AgentConfig.ready)
+from cache_llm import sem_cache_llm  # type: ignore
+from metricas import registro_metricas  # type: ignore
 
 # View principal (homepage)
 def index(request):
@@ -59,12 +68,13 @@ def logout_view(request):
 @login_required
 def dashboard_view(request):
     """Dashboard principal do usuário"""
+    # Sem snapshot pronto, a página não espera pela planilha: o recálculo segue em segundo plano
+    try:
+        stats = (dashboard_snapshots.obter(request.user, esperar=False) or {}).get('stats')
+    except Exception:
+        stats = None  # planilha inválida: o erro aparece na API de dados do dashboard
     context = {
-        'stats': {
-            'conversations': 0,
-            'analyses': 0,
-            'content_ideas': 0,
-        },
+        'stats': stats or estatisticas_usuario(request.user),
         'recent_activities': []
     }
     return render(request, 'agent/dashboard.html', context)
@@ -79,16 +89,22 @@ def chat_view(request):
     }
     return render(request, 'agent/chat.html', context)
 
+def chat_session_key(user):
+    """Chave do histórico de conversa do usuário autenticado."""
+    return f"user:{user.id}"
+
 # API do Chat (demo para não logados, completo para logados)
 @csrf_exempt
-def chat_api(request):
-    """API para enviar mensagens para o chat - Demo limitada para usuários não logados"""
+async def chat_api(request):
+    """API para enviar mensagens para o chat - Demo limitada para usuários não logados.
+    View assíncrona: sob ASGI a requisição aguarda o LLM sem prender um worker."""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             message = data.get('message', '').strip()
             arquivo = data.get('file_path')  # opcional
             pergunta_arquivo = data.get('file_question')  # opcional
+            sem_cache = bool(data.get('no_cache'))  # opcional: pede uma resposta nova, sem o cache do LLM
 
             if not message:
                 return JsonResponse({
@@ -96,9 +112,26 @@ def chat_api(request):
                     'error': 'Mensagem não pode estar vazia'
                 })
 
-            if request.user.is_authenticated:
+            erro = _file_path_invalido(arquivo)
+            if erro:
+                return erro
+            user = await request.auser()
+            if arquivo and not (user.is_authenticated and await sync_to_async(planilha_do_usuario)(user, arquivo)):
+                return _planilha_nao_encontrada()
+            if user.is_authenticated and data.get('async'):
+                # Modo fila: responde na hora com o id da tarefa; o cliente consulta /api/jobs/<id>/
+                job = await sync_to_async(jobs.enfileirar)('chat', {
+                    'message': message, 'file_path': arquivo, 'file_question': pergunta_arquivo,
+                    'session_key': chat_session_key(user), 'no_cache': sem_cache,
+                }, user=user)
+                return _job_aceito(job)
+            if user.is_authenticated:
                 try:
-                    result = ai_service.run_ai_consultor(message, arquivo, pergunta_arquivo)
+                    with (sem_cache_llm() if sem_cache else contextlib.nullcontext()):
+                        result = await ai_service.arun_ai_consultor(
+                            message, arquivo, pergunta_arquivo,
+                            session_key=chat_session_key(user), user_id=user.id,
+                        )
                     response = result.get('resposta_final') or 'Sem resposta.'
                 except Exception as e:
                     response = f"Erro ao processar a solicitação de IA: {e}"
@@ -135,6 +168,123 @@ def chat_api(request):
 
     return JsonResponse({'success': False, 'error': 'Método não permitido'})
 
+def _planilha_nao_encontrada():
+    return JsonResponse({"success": False, "error": "Planilha não encontrada"}, status=404)
+
+def _file_path_invalido(valor):
+    """Resposta 400 se ``file_path`` veio no JSON com outro tipo que não texto; ``None`` se está ok."""
+    if valor is None or isinstance(valor, str):
+        return None
+    return JsonResponse({"success": False, "error": "file_path deve ser um texto"}, status=400)
+
+def _job_aceito(job):
+    """Resposta 202 com o id da tarefa enfileirada e a URL de status."""
+    return JsonResponse({
+        'success': True,
+        'job_id': str(job.pk),
+        'status': job.status,
+        'status_url': reverse('agent:job_status_api', args=[job.pk]),
+    }, status=202)
+
+@login_required
+@csrf_exempt
+def jobs_api(request):
+    """Enfileira uma tarefa de IA. Corpo JSON: {"kind": "...", "payload": {...}}.
+    Tipos: chat (message, file_path?, file_question?, no_cache?), planilha (file_path, question),
+    dashboard_insights (file_path?) e dashboard_refresh (file_path?)."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+        kind = data.get('kind', '')
+        payload = data.get('payload') or {}
+        if not isinstance(payload, dict):
+            return JsonResponse({'success': False, 'error': 'payload deve ser um objeto'}, status=400)
+        erro = _file_path_invalido(payload.get('file_path'))
+        if erro:
+            return erro
+        # Tarefas só leem planilhas enviadas pelo próprio usuário
+        if payload.get('file_path') and not planilha_do_usuario(request.user, payload['file_path']):
+            return _planilha_nao_encontrada()
+        if kind == 'chat':
+            if not (payload.get('message') or '').strip():
+                return JsonResponse({'success': False, 'error': 'Mensagem não pode estar vazia'}, status=400)
+            payload['session_key'] = chat_session_key(request.user)
+        elif kind == 'planilha':
+            if not payload.get('file_path') or not payload.get('question'):
+                return JsonResponse({'success': False, 'error': 'Informe file_path e question'}, status=400)
+        elif kind in ('dashboard_insights', 'dashboard_refresh'):
+            payload['file_path'] = payload.get('file_path') or planilha_mais_recente(request.user)
+            if kind == 'dashboard_insights' and not payload['file_path']:
+                return JsonResponse({'success': False, 'error': 'Nenhuma planilha enviada'}, status=400)
+        else:
+            return JsonResponse({'success': False, 'error': f"Tipo de tarefa desconhecido: '{kind}'"}, status=400)
+        return _job_aceito(jobs.enfileirar(kind, payload, user=request.user))
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido'}, status=400)
+
+@login_required
+def job_status_api(request, job_id):
+    """Status e resultado de uma tarefa do usuário."""
+    try:
+        job = Job.objects.get(pk=job_id, user=request.user)
+    except Job.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Tarefa não encontrada'}, status=404)
+    return JsonResponse({'success': True, 'job': jobs.status_json(job)})
+
+def _sse(event, data):
+    """Formata um evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# API do Chat com streaming (SSE) da resposta do estrategista
+@csrf_exempt
+async def chat_stream_api(request):
+    """Transmite a resposta do chat como Server-Sent Events.
+    Eventos: ``token`` (texto bruto), ``html`` (blocos markdown já sanitizados), ``done`` e ``error``."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
+    try:
+        data = json.loads(request.body)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    message = data.get('message', '').strip()
+    if not message:
+        return JsonResponse({'success': False, 'error': 'Mensagem não pode estar vazia'})
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Faça login para usar o chat completo'}, status=401)
+    erro = _file_path_invalido(data.get('file_path'))
+    if erro:
+        return erro
+    if data.get('file_path') and not await sync_to_async(planilha_do_usuario)(user, data['file_path']):
+        return _planilha_nao_encontrada()
+
+    async def eventos():
+        renderer = MarkdownStreamRenderer()
+        try:
+            # no_cache: resposta nova, sem o cache do LLM (ex.: "gerar novamente")
+            with (sem_cache_llm() if data.get('no_cache') else contextlib.nullcontext()):
+                async for trecho in ai_service.astream_ai_consultor(
+                    message, data.get('file_path'), data.get('file_question'),
+                    session_key=chat_session_key(user), user_id=user.id,
+                ):
+                    yield _sse('token', {'text': trecho})
+                    html = renderer.feed(trecho)
+                    if html:
+                        yield _sse('html', {'html': html})
+            html = renderer.flush()
+            if html:
+                yield _sse('html', {'html': html})
+            yield _sse('done', {})
+        except Exception as e:
+            yield _sse('error', {'error': f"Erro ao processar a solicitação de IA: {e}"})
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # evita buffering em proxies (nginx)
+    return response
+
 # Análise de Marketing (requer login)
 @login_required
 def marketing_analysis_view(request):
@@ -618,67 +768,36 @@ def adjust_tone(idea, tone):
 @login_required
 @csrf_exempt
 def dashboard_data_api(request):
-    """API que fornece dados do dashboard via agente (Estrategista/Data Analyst).
-    Aceita opcionalmente ?file_path= para direcionar análise de planilha.
+    """API que fornece os dados do dashboard a partir do snapshot do usuário.
+    Os números vêm da planilha (?file_path= de um upload do usuário ou a última enviada), calculados com
+    Pandas e sem LLM; o snapshot é servido na hora e recalculado em segundo plano quando a planilha ou o
+    perfil mudam. Os insights escritos pelo LLM vêm depois, de dashboard_insights_api.
     """
+    file_path = request.GET.get('file_path')
+    if file_path and not planilha_do_usuario(request.user, file_path):
+        return _planilha_nao_encontrada()
     try:
-        file_path = request.GET.get('file_path')
-        prompt = (
-            "Você é o Estrategista do Marttin. Gere SOMENTE um JSON válido (sem texto extra) com este formato: "
-            "{"
-            "\"kpis\": {\"faturamento_mes\": number, \"novos_clientes\": number, \"cac\": number},"
-            " \"cashflow\": {\"labels\": string[], \"entradas\": number[], \"saidas\": number[]},"
-            " \"channels\": {\"labels\": string[], \"values\": number[]},"
-            " \"latest_sales\": [{\"id\": number, \"data\": string, \"cliente\": string, \"canal\": string, \"valor\": number, \"status\": string}],"
-            " \"insights\": [{\"icon\": string, \"title\": string, \"text\": string}]"
-            "}"
-            " Se uma planilha for fornecida, calcule KPIs a partir dela; caso contrário, use valores plausíveis."
-        )
-        result = ai_service.run_ai_consultor(prompt, arquivo=file_path, pergunta_sobre_arquivo=(
-            "Calcule faturamento do mês, novos clientes e CAC; gere séries de fluxo de caixa 30 dias e divisão por canal. "
-            "Retorne somente JSON no formato especificado."
-        ) if file_path else None)
-
-        raw = None
-        if result:
-            raw = result.get('resposta_final') or ''
-        data = None
-        if raw:
-            try:
-                data = json.loads(raw)
-            except Exception:
-                # Tenta extrair JSON entre chaves
-                try:
-                    start = raw.find('{')
-                    end = raw.rfind('}')
-                    if start != -1 and end != -1:
-                        data = json.loads(raw[start:end+1])
-                except Exception:
-                    data = None
-        if not data:
-            # Fallback demo seguro
-            data = {
-                "kpis": {"faturamento_mes": 125430, "novos_clientes": 87, "cac": 62.5},
-                "cashflow": {
-                    "labels": [f"D{i}" for i in range(1, 13)],
-                    "entradas": [12,9,14,11,16,13,18,14,17,15,19,18],
-                    "saidas":   [9,8,11,10,12,12,13,12,14,13,15,14]
-                },
-                "channels": {"labels": ["Loja Online","Marketplace","Instagram","WhatsApp"], "values": [46,28,17,9]},
-                "latest_sales": [
-                    {"id":1,"data":"2025-10-25","cliente":"Maria Oliveira","canal":"Loja Online","valor":1290.00,"status":"Pago"},
-                    {"id":2,"data":"2025-10-25","cliente":"João Lima","canal":"Marketplace","valor":349.90,"status":"Pago"},
-                    {"id":3,"data":"2025-10-24","cliente":"Aline Souza","canal":"Instagram","valor":179.00,"status":"Pendente"},
-                ],
-                "insights": [
-                    {"icon":"lightbulb","title":"Campanhas com melhor ROI","text":"Direcione mais orçamento para Instagram Ads (CAC -15%)."},
-                    {"icon":"graph-up","title":"Fluxo de caixa","text":"Previsão de pico de despesas nos próximos 10 dias; considere antecipar recebíveis."}
-                ]
-            }
+        data = dashboard_snapshots.obter(request.user, file_path)
         return JsonResponse({"success": True, "data": data})
     except Exception as e:
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
+@login_required
+def dashboard_insights_api(request):
+    """Insights do dashboard gerados pelo LLM sobre os números da planilha (?file_path= ou a última enviada)."""
+    file_path = request.GET.get('file_path')
+    if file_path and not planilha_do_usuario(request.user, file_path):
+        return _planilha_nao_encontrada()
+    file_path = file_path or planilha_mais_recente(request.user)
+    if not file_path:
+        return JsonResponse({"success": True, "insights": DASHBOARD_DEMO["insights"]})
+    try:
+        insights = ai_service.dashboard_insights(file_path)
+        dashboard_snapshots.guardar_insights(request.user.id, file_path, insights)
+        return JsonResponse({"success": True, "insights": insights})
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
 @login_required
 def profile_view(request):
     """Tela de Perfil para configurar dados padrão da empresa (base de contexto dos agentes)."""
@@ -705,18 +824,9 @@ def profile_view(request):
             if not data_file:
                 messages.error(request, 'Selecione um arquivo para enviar.')
                 return redirect('agent:profile')
-            # Persistir arquivo em diretório local "uploads"
+            # Armazena por conteúdo (SHA-256) e pré-processa a planilha em segundo plano
             try:
-                upload_dir = settings.BASE_DIR / 'uploads'
-                os.makedirs(upload_dir, exist_ok=True)
-                timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-                safe_name = f"user{request.user.id}_{timestamp}_" + data_file.name
-                dest_path = upload_dir / safe_name
-                with open(dest_path, 'wb+') as destination:
-                    for chunk in data_file.chunks():
-                        destination.write(chunk)
-                # Registrar histórico (exibimos nome original para o usuário)
-                FileUpload.objects.create(user=request.user, file_name=data_file.name)
+                salvar_upload(request.user, data_file)
                 messages.success(request, 'Arquivo enviado com sucesso.')
             except Exception as e:
                 messages.error(request, f'Falha no upload: {e}')
@@ -790,18 +900,32 @@ def analysis_detail_view(request, analysis_id: int):
         messages.error(request, 'Análise não encontrada.')
         return redirect('agent:analyses')
 
-    # Dados estruturados para as abas
-    result = analysis.analysis_result or {}
-    insights_text = result.get('insights', '')
-    recommendations = result.get('recommendations', '')
-    growth = result.get('growth_strategies', '')
-    next_steps = result.get('next_steps', '')
+    # HTML das abas, renderizado ao salvar a análise
+    if set(analysis.analysis_html or {}) != set(MarketingAnalysis.HTML_SECTIONS):
+        analysis.save(update_fields=['analysis_html'])
+    html = {key: mark_safe(value) for key, value in analysis.analysis_html.items()}
 
     context = {
         'analysis': analysis,
-        'insights_text': insights_text,
-        'recommendations': recommendations,
-        'growth': growth,
-        'next_steps': next_steps,
+        'insights_html': html['insights'],
+        'recommendations_html': html['recommendations'],
+        'growth_html': html['growth_strategies'],
+        'next_steps_html': html['next_steps'],
     }
     return render(request, 'agent/analysis_detail.html', context)
+
+
+def _metricas_autorizadas(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS', {}).get('TOKEN')
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+def metrics_view(request):
+    """Métricas do processo no formato de texto do Prometheus (staff ou token de settings.METRICS)."""
+    if not _metricas_autorizadas(request):
+        response = HttpResponse('Não autorizado', status=401, content_type='text/plain; charset=utf-8')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(registro_metricas.expor(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,11 +42,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'agent.middleware.prometheus_metrics.PrometheusMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'agent.middleware.rate_limiting.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,6 +72,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'marttin.wsgi.application'
 
+# Servidor ASGI (ex.: uvicorn marttin.asgi:application) para as views assíncronas do chat
+ASGI_APPLICATION = 'marttin.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -129,3 +135,45 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Histórico do chat por sessão (agent/conversation_store.py)
+CHAT_HISTORY = {
+    'HOT_SESSIONS': 500,        # sessões mantidas em memória (LRU)
+    'WINDOW': 10,               # mensagens recentes enviadas ao LLM
+    'SUMMARY_MAX_CHARS': 1200,  # resumo das mensagens antigas; 0 desativa
+}
+
+# Snapshots do dashboard por usuário (agent/dashboard_snapshots.py)
+DASHBOARD_SNAPSHOT = {
+    'MAX_AGE': 900,         # segundos até o snapshot ser recalculado mesmo sem mudanças
+    'CACHE_TIMEOUT': 3600,  # tempo no cache do Django (o banco guarda o último sempre)
+    'WORKERS': 2,           # threads de recálculo em segundo plano
+}
+
+# Fila de tarefas de IA (agent/jobs.py); o worker roda com: python manage.py run_jobs
+JOBS = {
+    'EAGER': None,           # None: no próprio servidor enquanto nenhum worker estiver ativo; True/False forçam
+    'HEARTBEAT_TIMEOUT': 30, # segundos sem sinal de vida até um worker ser considerado parado
+    'POLL_INTERVAL': 1.0,    # segundos entre consultas à fila quando ela está vazia
+    'MAX_ATTEMPTS': 2,       # tentativas por tarefa (inclui reexecução após queda do worker)
+    'STALE_AFTER': 600,      # segundos até uma tarefa "em execução" ser considerada abandonada
+}
+
+# Limite de requisições por usuário/IP (agent/middleware/rate_limiting.py)
+RATE_LIMIT = {
+    'ENABLED': True,
+    'GERAL': {'CAPACITY': 120, 'PER_SECOND': 2.0},       # todas as requisições
+    'LLM': {'CAPACITY': 12, 'PER_SECOND': 0.2},          # views que chamam o LLM (usuário logado)
+    'LLM_ANONIMO': {'CAPACITY': 4, 'PER_SECOND': 0.05},  # views que chamam o LLM (sem login, por IP)
+    'CLIENT_IP_HEADER': None,  # ex.: 'HTTP_X_FORWARDED_FOR' atrás de um proxy confiável
+    'TRUSTED_PROXY_HOPS': 1,   # proxies confiáveis que acrescentam IPs ao cabeçalho (conta da direita)
+}
+
+# Endpoint /metrics (Prometheus): liberado para usuários staff ou com "Authorization: Bearer <TOKEN>"
+METRICS = {
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),  # vazio: só staff
+}
+
+# Pré-carrega o RAG (embeddings + Qdrant) em segundo plano quando o serviço de IA é importado.
+# Por padrão o carregamento acontece só na primeira pesquisa, para manage.py/testes subirem rápido.
+RAG_WARMUP = False